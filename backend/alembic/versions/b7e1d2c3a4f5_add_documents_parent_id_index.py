@@ -0,0 +1,34 @@
+"""add documents parent_id index
+
+Revision ID: b7e1d2c3a4f5
+Revises: a9bcecbb3306
+Create Date: 2025-03-10 12:00:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "b7e1d2c3a4f5"
+down_revision: Union[str, None] = "a9bcecbb3306"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # Recursive tree queries join documents on parent_id at every level
+    op.create_index(
+        "ix_documents_parent_id",
+        "documents",
+        ["parent_id"],
+        unique=False,
+        if_not_exists=True,
+    )
+
+
+def downgrade() -> None:
+    op.drop_index("ix_documents_parent_id", table_name="documents", if_exists=True)
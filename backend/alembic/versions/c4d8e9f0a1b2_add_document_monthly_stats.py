@@ -0,0 +1,81 @@
+"""add document monthly stats
+
+Revision ID: c4d8e9f0a1b2
+Revises: b7e1d2c3a4f5
+Create Date: 2025-03-12 10:30:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "c4d8e9f0a1b2"
+down_revision: Union[str, None] = "b7e1d2c3a4f5"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        "document_monthly_stats",
+        sa.Column("id", sa.Integer(), nullable=False),
+        sa.Column("year", sa.Integer(), nullable=False),
+        sa.Column("month", sa.Integer(), nullable=False),
+        sa.Column("document_type", sa.String(length=50), nullable=False),
+        sa.Column("document_count", sa.Integer(), nullable=False),
+        sa.Column("total_amount", sa.Numeric(18, 2), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+        sa.UniqueConstraint(
+            "year", "month", "document_type", name="uq_monthly_stats_bucket"
+        ),
+    )
+    op.create_index(
+        op.f("ix_document_monthly_stats_id"),
+        "document_monthly_stats",
+        ["id"],
+        unique=False,
+    )
+
+    # Backfill from existing documents; malformed total_price values count as zero
+    op.execute(
+        r"""
+        INSERT INTO document_monthly_stats
+            (year, month, document_type, document_count, total_amount)
+        SELECT
+            EXTRACT(YEAR FROM created_date)::int,
+            EXTRACT(MONTH FROM created_date)::int,
+            document_type,
+            COUNT(*),
+            COALESCE(SUM(
+                CASE WHEN (dynamic_fields->>'total_price') ~ '^\s*-?[0-9]+(\.[0-9]+)?\s*$'
+                     THEN (dynamic_fields->>'total_price')::numeric
+                     ELSE 0
+                END
+            ), 0)
+        FROM documents
+        GROUP BY 1, 2, 3
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_index(
+        op.f("ix_document_monthly_stats_id"), table_name="document_monthly_stats"
+    )
+    op.drop_table("document_monthly_stats")
@@ -0,0 +1,104 @@
+"""add documents total_price and currency generated columns
+
+Revision ID: d5e6f7a8b9c0
+Revises: c4d8e9f0a1b2
+Create Date: 2025-03-14 09:15:00.000000
+
+"""
+
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "d5e6f7a8b9c0"
+down_revision: Union[str, None] = "c4d8e9f0a1b2"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+AMOUNT_PATTERN = r"^\s*-?[0-9]+(\.[0-9]+)?\s*$"
+
+
+def upgrade() -> None:
+    # Stored generated columns: malformed prices become NULL instead of failing casts
+    op.execute(
+        "ALTER TABLE documents ADD COLUMN total_price numeric "
+        "GENERATED ALWAYS AS (CASE WHEN (dynamic_fields->>'total_price') ~ '"
+        + AMOUNT_PATTERN
+        + "' THEN (dynamic_fields->>'total_price')::numeric END) STORED"
+    )
+    op.execute(
+        "ALTER TABLE documents ADD COLUMN currency varchar(10) "
+        "GENERATED ALWAYS AS "
+        "(NULLIF(upper(left(btrim(dynamic_fields->>'currency'), 10)), '')) STORED"
+    )
+    op.create_index(
+        "ix_documents_type_currency_total",
+        "documents",
+        ["document_type", "currency", "total_price"],
+        unique=False,
+    )
+
+    # Monthly buckets gain a currency dimension; rebuild them from documents
+    op.add_column(
+        "document_monthly_stats",
+        sa.Column(
+            "currency", sa.String(length=10), nullable=False, server_default="XXX"
+        ),
+    )
+    op.drop_constraint(
+        "uq_monthly_stats_bucket", "document_monthly_stats", type_="unique"
+    )
+    op.create_unique_constraint(
+        "uq_monthly_stats_bucket",
+        "document_monthly_stats",
+        ["year", "month", "document_type", "currency"],
+    )
+    op.execute("DELETE FROM document_monthly_stats")
+    op.execute(
+        """
+        INSERT INTO document_monthly_stats
+            (year, month, document_type, currency, document_count, total_amount)
+        SELECT
+            EXTRACT(YEAR FROM created_date)::int,
+            EXTRACT(MONTH FROM created_date)::int,
+            document_type,
+            COALESCE(currency, 'XXX'),
+            COUNT(*),
+            COALESCE(SUM(total_price), 0)
+        FROM documents
+        GROUP BY 1, 2, 3, 4
+        """
+    )
+
+
+def downgrade() -> None:
+    op.drop_constraint(
+        "uq_monthly_stats_bucket", "document_monthly_stats", type_="unique"
+    )
+    op.drop_column("document_monthly_stats", "currency")
+    op.create_unique_constraint(
+        "uq_monthly_stats_bucket",
+        "document_monthly_stats",
+        ["year", "month", "document_type"],
+    )
+    op.execute("DELETE FROM document_monthly_stats")
+    op.execute(
+        """
+        INSERT INTO document_monthly_stats
+            (year, month, document_type, document_count, total_amount)
+        SELECT
+            EXTRACT(YEAR FROM created_date)::int,
+            EXTRACT(MONTH FROM created_date)::int,
+            document_type,
+            COUNT(*),
+            COALESCE(SUM(total_price), 0)
+        FROM documents
+        GROUP BY 1, 2, 3
+        """
+    )
+    op.drop_index("ix_documents_type_currency_total", table_name="documents")
+    op.drop_column("documents", "currency")
+    op.drop_column("documents", "total_price")
@@ -0,0 +1,150 @@
+"""partition journal_entries by month
+
+Revision ID: e6f7a8b9c0d1
+Revises: d5e6f7a8b9c0
+Create Date: 2025-03-20 10:30:00.000000
+
+"""
+
+from datetime import date
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision: str = "e6f7a8b9c0d1"
+down_revision: Union[str, None] = "d5e6f7a8b9c0"
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# Monthly partitions created ahead of the current month; the application's
+# journal maintenance job keeps extending them
+MONTHS_AHEAD = 3
+COLUMNS = (
+    "id, event_type, document_id, details, user_id, ip_address, timestamp, "
+    "created_at, updated_at"
+)
+
+
+def _add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _create_partition(month: date) -> None:
+    name = f"journal_entries_y{month.year:04d}m{month.month:02d}"
+    op.execute(
+        f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF journal_entries FOR VALUES "
+        f"FROM ('{month.isoformat()}') TO ('{_add_months(month, 1).isoformat()}')"
+    )
+
+
+def upgrade() -> None:
+    bind = op.get_bind()
+    legacy = sa.inspect(bind).has_table("journal_entries")
+    if legacy:
+        # Tables created by create_all: keep the rows and the id sequence
+        op.execute("ALTER TABLE journal_entries RENAME TO journal_entries_legacy")
+        op.execute(
+            "ALTER TABLE journal_entries_legacy "
+            "RENAME CONSTRAINT journal_entries_pkey TO journal_entries_legacy_pkey"
+        )
+        op.execute("ALTER SEQUENCE IF EXISTS journal_entries_id_seq OWNED BY NONE")
+        op.execute("ALTER SEQUENCE IF EXISTS journal_entries_id_seq AS bigint")
+    op.execute("CREATE SEQUENCE IF NOT EXISTS journal_entries_id_seq AS bigint")
+
+    op.execute(
+        """
+        CREATE TABLE journal_entries (
+            id bigint NOT NULL DEFAULT nextval('journal_entries_id_seq'),
+            event_type varchar(50) NOT NULL,
+            document_id integer,
+            details json NOT NULL,
+            user_id integer,
+            ip_address varchar(45),
+            timestamp timestamptz NOT NULL DEFAULT now(),
+            created_at timestamptz NOT NULL DEFAULT now(),
+            updated_at timestamptz NOT NULL DEFAULT now(),
+            CONSTRAINT journal_entries_pkey PRIMARY KEY (id, timestamp)
+        ) PARTITION BY RANGE (timestamp)
+        """
+    )
+    op.execute("ALTER SEQUENCE journal_entries_id_seq OWNED BY journal_entries.id")
+    op.create_index(
+        "ix_journal_entries_document_id_timestamp",
+        "journal_entries",
+        ["document_id", sa.text("timestamp DESC"), sa.text("id DESC")],
+        unique=False,
+    )
+    op.execute(
+        "CREATE TABLE journal_entries_default PARTITION OF journal_entries DEFAULT"
+    )
+
+    current = date.today().replace(day=1)
+    first = current
+    if legacy:
+        oldest = bind.execute(
+            sa.text("SELECT min(timestamp) FROM journal_entries_legacy")
+        ).scalar()
+        if oldest is not None:
+            first = min(first, date(oldest.year, oldest.month, 1))
+    month = first
+    while month <= _add_months(current, MONTHS_AHEAD):
+        _create_partition(month)
+        month = _add_months(month, 1)
+
+    if legacy:
+        op.execute(
+            f"INSERT INTO journal_entries ({COLUMNS}) "
+            f"SELECT {COLUMNS} FROM journal_entries_legacy"
+        )
+        op.execute("DROP TABLE journal_entries_legacy")
+
+
+def downgrade() -> None:
+    op.execute("ALTER SEQUENCE journal_entries_id_seq OWNED BY NONE")
+    op.execute("ALTER TABLE journal_entries RENAME TO journal_entries_partitioned")
+    op.execute(
+        "ALTER TABLE journal_entries_partitioned "
+        "RENAME CONSTRAINT journal_entries_pkey TO journal_entries_partitioned_pkey"
+    )
+    op.create_table(
+        "journal_entries",
+        sa.Column(
+            "id",
+            sa.BigInteger(),
+            server_default=sa.text("nextval('journal_entries_id_seq')"),
+            nullable=False,
+        ),
+        sa.Column("event_type", sa.String(length=50), nullable=False),
+        sa.Column("document_id", sa.Integer(), nullable=True),
+        sa.Column("details", sa.JSON(), nullable=False),
+        sa.Column("user_id", sa.Integer(), nullable=True),
+        sa.Column("ip_address", sa.String(length=45), nullable=True),
+        sa.Column("timestamp", sa.DateTime(timezone=True), nullable=False),
+        sa.Column(
+            "created_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.Column(
+            "updated_at",
+            sa.DateTime(timezone=True),
+            server_default=sa.text("now()"),
+            nullable=False,
+        ),
+        sa.PrimaryKeyConstraint("id"),
+    )
+    op.execute(
+        f"INSERT INTO journal_entries ({COLUMNS}) "
+        f"SELECT {COLUMNS} FROM journal_entries_partitioned"
+    )
+    op.execute("DROP TABLE journal_entries_partitioned CASCADE")
+    op.execute("ALTER SEQUENCE journal_entries_id_seq OWNED BY journal_entries.id")
+    for column in ("event_type", "document_id", "user_id", "timestamp"):
+        op.create_index(
+            f"ix_journal_entries_{column}", "journal_entries", [column], unique=False
+        )
@@ -2,20 +2,35 @@
 Core application functionality and configuration.
 """
 
-from .config import Settings, get_settings
-from .dependencies import get_current_user, get_current_active_user
+from .cache import QueryCache
+from .config import Settings, get_settings, on_settings_reload, reload_settings
+from .dependencies import SettingsDep, get_current_user, get_current_active_user
 from .events import create_start_app_handler, create_stop_app_handler
 from .exceptions import APIError, NotFoundError, ValidationError, AuthenticationError
 from .journal import Journal
-from .logging import setup_logging, get_logger, ContextLogger
-from .metrics import Metrics, timing, metrics
+from .logging import (
+    setup_logging,
+    stop_logging,
+    get_logger,
+    logging_stats,
+    lazy,
+    ContextLogger,
+    LogSampler,
+)
+from .metrics import Metrics, Registry, registry, timing, metrics
 from .middleware import setup_middleware
+from .responses import FastJSONResponse
 
 __all__ = [
+    # Cache
+    "QueryCache",
     # Config
     "Settings",
     "get_settings",
+    "reload_settings",
+    "on_settings_reload",
     # Dependencies
+    "SettingsDep",
     "get_current_user",
     "get_current_active_user",
     # Event handlers
@@ -30,12 +45,20 @@ __all__ = [
     "Journal",
     # Logging
     "setup_logging",
+    "stop_logging",
     "get_logger",
     "ContextLogger",
+    "logging_stats",
+    "lazy",
+    "LogSampler",
     # Metrics
     "Metrics",
+    "Registry",
+    "registry",
     "timing",
     "metrics",
     # Middleware
     "setup_middleware",
+    # Responses
+    "FastJSONResponse",
 ]
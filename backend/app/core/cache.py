@@ -0,0 +1,257 @@
+"""
+Query result caching with TTL and tag-based invalidation.
+
+Entries live in a bounded in-process LRU in front of a backend that
+stores tag versions (and, for shared backends, the entries themselves).
+Every cache key is namespaced by the current versions of its tags, so
+invalidating a tag is a single version bump: entries written before it
+become unreachable in every worker, including entries whose load raced
+with the invalidation.
+
+A load started after an invalidation can still read pre-write data from
+a lagging read replica. Callers loading from a replica pass a `settle`
+window: results loaded that soon after the last invalidation of their
+tags are returned but not stored.
+"""
+
+import asyncio
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+
+class InMemoryBackend:
+    """
+    Process-local backend with the same interface as the shared backends.
+
+    Used when no CACHE_BACKEND_URL is configured, and as a local stand-in
+    for a shared backend in development and tests.
+    """
+
+    def __init__(self):
+        self._values: Dict[str, Tuple[Optional[float], Any]] = {}
+
+    async def get(self, key: str) -> Any:
+        item = self._values.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._values.pop(key, None)
+            return None
+        return value
+
+    async def get_many(self, keys: List[str]) -> List[Any]:
+        return [await self.get(key) for key in keys]
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._values[key] = (expires_at, value)
+
+    async def incr(self, key: str) -> int:
+        value = int(await self.get(key) or 0) + 1
+        self._values[key] = (None, value)
+        return value
+
+    async def close(self) -> None:
+        self._values.clear()
+
+
+class RedisBackend:
+    """Shared backend on Redis, so every worker sees the same entries and tags."""
+
+    def __init__(self, url: str):
+        try:
+            from redis import asyncio as redis_asyncio
+        except ImportError as e:
+            raise RuntimeError(
+                "Redis cache backend requires the 'redis' package: pip install redis"
+            ) from e
+        self._client = redis_asyncio.from_url(url)
+
+    async def get(self, key: str) -> Any:
+        raw = await self._client.get(key)
+        return json.loads(raw) if raw is not None else None
+
+    async def get_many(self, keys: List[str]) -> List[Any]:
+        if not keys:
+            return []
+        raws = await self._client.mget(keys)
+        return [json.loads(raw) if raw is not None else None for raw in raws]
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None) -> None:
+        await self._client.set(
+            key, json.dumps(value), ex=int(ttl) if ttl else None
+        )
+
+    async def incr(self, key: str) -> int:
+        return await self._client.incr(key)
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+
+def create_backend(url: Optional[str]) -> Any:
+    """Create a cache backend from a URL (memory:// or redis://)."""
+    if not url or url.startswith("memory://"):
+        return InMemoryBackend()
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisBackend(url)
+    raise ValueError(f"Unsupported cache backend URL: {url}")
+
+
+class QueryCache:
+    """
+    Two-tier TTL cache for expensive query results.
+
+    Args:
+        namespace: Prefix for all keys of this cache
+        ttl: Time to live of entries, in seconds
+        max_entries: Size of the in-process LRU tier
+        backend: Tag-version store and, if shared, second entry tier
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        ttl: float = 30.0,
+        max_entries: int = 1024,
+        backend: Optional[Any] = None,
+    ):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.backend = backend or InMemoryBackend()
+        self._shared = not isinstance(self.backend, InMemoryBackend)
+        self._local: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self.hits = 0
+        self.misses = 0
+        self.unsettled = 0
+
+    def _tag_key(self, tag: str) -> str:
+        return f"{self.namespace}:tag:{tag}"
+
+    def _invalidated_key(self, tag: str) -> str:
+        return f"{self.namespace}:invalidated:{tag}"
+
+    async def _versioned_key(self, key: str, tags: List[str]) -> Tuple[str, float]:
+        """
+        Namespace a key by the current versions of its tags.
+
+        Returns:
+            The key and the epoch time of the last invalidation of its tags
+            (0 if they were never invalidated)
+        """
+        if not tags:
+            return f"{self.namespace}:{key}", 0.0
+        values = await self.backend.get_many(
+            [self._tag_key(tag) for tag in tags]
+            + [self._invalidated_key(tag) for tag in tags]
+        )
+        versions, invalidated = values[: len(tags)], values[len(tags) :]
+        suffix = ".".join(str(version or 0) for version in versions)
+        last_invalidated = max(float(at or 0) for at in invalidated)
+        return f"{self.namespace}:{key}@{suffix}", last_invalidated
+
+    def _local_get(self, full_key: str) -> Tuple[bool, Any]:
+        item = self._local.get(full_key)
+        if item is None:
+            return False, None
+        expires_at, value = item
+        if expires_at <= time.monotonic():
+            del self._local[full_key]
+            return False, None
+        self._local.move_to_end(full_key)
+        return True, value
+
+    def _local_set(self, full_key: str, value: Any) -> None:
+        self._local[full_key] = (time.monotonic() + self.ttl, value)
+        self._local.move_to_end(full_key)
+        while len(self._local) > self.max_entries:
+            self._local.popitem(last=False)
+
+    async def get_or_load(
+        self,
+        key: str,
+        loader: Callable[[], Awaitable[Any]],
+        tags: Iterable[str] = (),
+        settle: float = 0.0,
+    ) -> Any:
+        """
+        Return the cached value for a key, loading and storing it on a miss.
+
+        Concurrent misses for the same key share a single load.
+
+        Args:
+            key: Cache key, unique within the namespace
+            loader: Coroutine function computing the value
+            tags: Tags whose invalidation drops the entry
+            settle: Seconds after an invalidation of the tags during which
+                loaded values are not stored, for loaders reading from a
+                replica that may not have replayed the write yet
+        """
+        full_key, invalidated_at = await self._versioned_key(key, list(tags))
+        found, value = self._local_get(full_key)
+        if found:
+            self.hits += 1
+            return value
+        if self._shared:
+            value = await self.backend.get(full_key)
+            if value is not None:
+                self.hits += 1
+                self._local_set(full_key, value)
+                return value
+
+        pending = self._inflight.get(full_key)
+        if pending is not None:
+            return await asyncio.shield(pending)
+        self.misses += 1
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[full_key] = future
+        try:
+            value = await loader()
+            if settle and time.time() - invalidated_at < settle:
+                self.unsettled += 1
+            else:
+                self._local_set(full_key, value)
+                if self._shared:
+                    await self.backend.set(full_key, value, self.ttl)
+            future.set_result(value)
+            return value
+        except BaseException as e:
+            future.set_exception(e)
+            # Mark retrieved so an unobserved failure is not reported at GC
+            future.exception()
+            raise
+        finally:
+            self._inflight.pop(full_key, None)
+
+    async def invalidate_tags(self, tags: Iterable[str]) -> None:
+        """Invalidate every entry stored under any of the given tags."""
+        unique = sorted(set(tags))
+        now = time.time()
+        for tag in unique:
+            await self.backend.incr(self._tag_key(tag))
+            await self.backend.set(self._invalidated_key(tag), now)
+        if unique:
+            logger.debug("Cache %s invalidated tags: %s", self.namespace, unique)
+
+    def clear_local(self) -> None:
+        """Drop the in-process tier."""
+        self._local.clear()
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss counters for monitoring."""
+        return {
+            "namespace": self.namespace,
+            "entries": len(self._local),
+            "hits": self.hits,
+            "misses": self.misses,
+            "unsettled": self.unsettled,
+            "shared": self._shared,
+        }
@@ -1,12 +1,21 @@
 """
 Application configuration management.
+
+There is a single Settings instance, returned by the cached
+`get_settings()` and exported as `settings`. `reload_settings()` re-reads
+the .env files and the environment and updates that instance in place,
+so modules holding a reference see new values; components that copied
+values at startup (log levels, pool and cache limits) register a
+listener with `on_settings_reload` to apply them.
 """
 
 import os
 import logging
-from typing import List
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Set
+from pydantic import ValidationError
 from pydantic_settings import BaseSettings, SettingsConfigDict
-from dotenv import load_dotenv
+from dotenv import dotenv_values
 
 # Set up logging
 logger = logging.getLogger(__name__)
@@ -14,8 +23,30 @@ logger = logging.getLogger(__name__)
 # Load .env explicitly from project root
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 ENV_FILE_PATH = os.path.join(BASE_DIR, ".env")
-logger.debug("Loading .env from: %s", ENV_FILE_PATH)
-load_dotenv(dotenv_path=ENV_FILE_PATH, verbose=True)
+
+# Variables exported from the .env file, as opposed to the real environment
+_env_file_keys: Set[str] = set()
+
+
+def _load_env_file() -> None:
+    """
+    Export the .env file to os.environ without overriding real variables.
+
+    Variables exported by a previous call are updated, or removed when they
+    are no longer in the file, so reloading picks up edits of the file.
+    """
+    logger.debug("Loading .env from: %s", ENV_FILE_PATH)
+    values = dotenv_values(ENV_FILE_PATH)
+    for key in _env_file_keys - values.keys():
+        os.environ.pop(key, None)
+        _env_file_keys.discard(key)
+    for key, value in values.items():
+        if value is not None and (key in _env_file_keys or key not in os.environ):
+            os.environ[key] = value
+            _env_file_keys.add(key)
+
+
+_load_env_file()
 
 
 class Settings(BaseSettings):
@@ -37,6 +68,40 @@ class Settings(BaseSettings):
     DB_POOL_SIZE: int = 5
     DB_MAX_OVERFLOW: int = 10
     DB_NAME: str = "contracts_db"
+    DB_POOL_ADAPTIVE: bool = False
+    DB_POOL_MIN_OVERFLOW: int = 0
+    DB_POOL_MAX_OVERFLOW_LIMIT: int = 40
+    DB_POOL_WAIT_TARGET_MS: float = 50.0
+    DB_POOL_TUNE_INTERVAL: float = 15.0
+    DATABASE_REPLICA_URLS: List[str] = []
+    DB_READ_YOUR_WRITES_SECONDS: float = 5.0
+    DB_REPLICA_RETRY_SECONDS: float = 30.0
+    DB_REPLICA_HEALTH_INTERVAL: float = 10.0
+    DB_REPLICA_MAX_LAG_SECONDS: Optional[float] = None
+
+    # Profiling
+    SPAN_SAMPLE_RATE: float = 1.0  # share of @timed calls recorded
+    PROFILE_SAMPLE_RATE: float = 0.01  # share of @profile calls run under cProfile
+    QUERY_PROFILER_ENABLED: bool = True
+    SLOW_QUERY_THRESHOLD_MS: float = 200.0
+    EXPLAIN_SAMPLE_RATE: float = 0.1  # share of slow SELECTs re-run with EXPLAIN
+    SLOW_QUERY_BUFFER_SIZE: int = 50
+
+    # Caching
+    CACHE_BACKEND_URL: Optional[str] = None  # memory:// or redis://host:6379/1
+    STATS_CACHE_TTL: float = 30.0
+    STATS_CACHE_MAX_ENTRIES: int = 1024
+
+    # Statistics aggregation
+    STATS_AGGREGATE_KEYS: List[str] = [
+        "buyer",
+        "seller",
+        "buyer_name",
+        "supplier_name",
+        "currency",
+    ]
+    STATS_AGGREGATE_MAX_ROWS: int = 1000
+    STATS_STATEMENT_TIMEOUT_MS: int = 5000
 
     # CORS
     cors_origins: List[str] = ["*"]
@@ -44,10 +109,40 @@ class Settings(BaseSettings):
     cors_allow_methods: List[str] = ["*"]
     cors_allow_headers: List[str] = ["*"]
 
+    # Tracing
+    TRACING_ENABLED: bool = True
+    TRACE_SAMPLE_RATE: float = 1.0  # share of new traces recorded
+    TRACE_EXPORTERS: List[str] = ["memory"]  # memory, file, otlp
+    TRACE_BUFFER_SIZE: int = 2000  # spans kept by the memory exporter
+    TRACE_FILE: str = "logs/traces.jsonl"
+    OTLP_TRACES_ENDPOINT: str = "http://localhost:4318/v1/traces"
+
+    # Audit journal
+    JOURNAL_QUEUE_SIZE: int = 10000  # entries buffered before writers wait
+    JOURNAL_BATCH_SIZE: int = 500
+    JOURNAL_FLUSH_INTERVAL: float = 1.0  # seconds
+    JOURNAL_SPILL_FILE: str = "logs/journal_spill.jsonl"  # failed batches
+    JOURNAL_PARTITIONS_AHEAD: int = 3  # monthly partitions created in advance
+    JOURNAL_RETENTION_MONTHS: int = 12  # 0 keeps every partition
+    JOURNAL_ARCHIVE_DIR: str = "archive/journal"
+    JOURNAL_MAINTENANCE_INTERVAL: float = 3600.0  # seconds
+
+    # Metrics
+    # Shared by all workers; emptied by scripts/reset_metrics.py in start.sh
+    METRICS_MULTIPROC_DIR: Optional[str] = None
+
     # Logging
     LOG_LEVEL: str = "INFO"
     LOG_DIR: str = "logs"
     LOG_FILE: str = "logs.txt"
+    LOG_QUEUE_SIZE: int = 10000
+    # Sampling of DEBUG/INFO records; keys are logger names or
+    # "logger.name:function" callsites, e.g. {"app.services.stats_service": 0.1}
+    LOG_SAMPLE_RATES: Dict[str, float] = {}
+    LOG_RATE_LIMITS: Dict[str, int] = {"app.services": 50}  # per callsite
+    LOG_RATE_LIMIT_WINDOW: float = 1.0
+    LOG_SAMPLING_MAX_LEVEL: str = "INFO"
+    LOG_STREAM_POLL_INTERVAL: float = 1.0  # seconds between /admin/logs/stream reads
 
     # File Storage
     upload_dir: str = "uploads"
@@ -83,11 +178,71 @@ class Settings(BaseSettings):
         )
 
 
+@lru_cache
 def get_settings() -> Settings:
-    """Get settings instance without caching."""
+    """Get the shared settings instance."""
     return Settings()
 
 
+SettingsListener = Callable[[Dict[str, Any]], None]
+_listeners: List[SettingsListener] = []
+_version = 1
+
+
+def on_settings_reload(listener: SettingsListener) -> SettingsListener:
+    """
+    Register a callable receiving the changed fields after a reload.
+
+    Can be used as a decorator.
+    """
+    _listeners.append(listener)
+    return listener
+
+
+def settings_version() -> int:
+    """Number incremented by every reload that changed a value."""
+    return _version
+
+
+def reload_settings() -> Dict[str, Any]:
+    """
+    Re-read the configuration and update the shared instance in place.
+
+    Invalid configuration is logged and leaves the current values alone.
+
+    Returns:
+        Changed fields and their new values
+    """
+    global _version
+    _load_env_file()
+    try:
+        fresh = Settings()
+    except (ValidationError, ValueError) as e:
+        logger.error("Settings reload rejected: %s", e)
+        return {}
+    current = get_settings()
+    changed = {}
+    for name in Settings.model_fields:
+        value = getattr(fresh, name)
+        if getattr(current, name) != value:
+            setattr(current, name, value)
+            changed[name] = value
+    if not changed:
+        logger.info("Settings reloaded, nothing changed")
+        return changed
+    _version += 1
+    # Names only: values may be secrets
+    logger.info(
+        "Settings reloaded (version %d): %s", _version, ", ".join(sorted(changed))
+    )
+    for listener in _listeners:
+        try:
+            listener(changed)
+        except Exception as e:
+            logger.error("Settings listener %r failed: %s", listener, e, exc_info=True)
+    return changed
+
+
 # Export settings instance
 settings = get_settings()
 logger.info("Application settings initialized")
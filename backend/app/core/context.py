@@ -0,0 +1,49 @@
+"""
+Request-scoped context shared with code outside the request handlers.
+"""
+
+import asyncio
+from contextvars import ContextVar
+from typing import Any, Dict, Optional
+
+# ASGI scope of the request being served by the current task
+current_scope: ContextVar[Optional[Dict[str, Any]]] = ContextVar(
+    "current_scope", default=None
+)
+
+# Innermost open tracing span and request ID of the current task
+current_trace_span: ContextVar[Optional[Any]] = ContextVar(
+    "current_trace_span", default=None
+)
+request_id: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Authenticated user of the current request, set by get_current_user
+current_user_id: ContextVar[Optional[int]] = ContextVar(
+    "current_user_id", default=None
+)
+
+# Tasks serving HTTP requests and their scopes, for samplers that run outside
+# the event loop thread and cannot read the tasks' context variables
+request_tasks: Dict["asyncio.Task", Dict[str, Any]] = {}
+
+
+def route_of(scope: Optional[Dict[str, Any]]) -> str:
+    """
+    Route template of an ASGI scope, e.g. "/documents/{document_id}".
+
+    Routing stores the matched route in the scope, so the template is known
+    once the request reached its handler. Falls back to the raw path before
+    that, and to "-" outside of requests.
+    """
+    if scope is None:
+        return "-"
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    if path:
+        return path
+    return scope.get("path", "-")
+
+
+def current_route() -> str:
+    """Route template of the request served by the current task."""
+    return route_of(current_scope.get())
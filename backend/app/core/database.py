@@ -2,23 +2,86 @@
 Database configuration using SQLAlchemy for async operations.
 """
 
-from typing import AsyncGenerator, Any, Dict
+from contextlib import asynccontextmanager
+from typing import (
+    AsyncGenerator,
+    AsyncIterator,
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Optional,
+)
 from datetime import datetime
 import logging
-from sqlalchemy import DateTime, func
+import time
+from fastapi import Request, Response
+from sqlalchemy import DateTime, event, func
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
-from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column
-from .config import settings
+from sqlalchemy.orm import DeclarativeBase, Mapped, Session, mapped_column
+from .config import on_settings_reload, settings
+from .pool_metrics import InstrumentedAsyncQueuePool, pool_monitor
+from .query_profiler import QueryProfiler
+from .replicas import ReplicaRouter, READ_YOUR_WRITES_COOKIE
 
 logger = logging.getLogger(__name__)
 
 engine = create_async_engine(
     settings.DATABASE_URL,
     echo=settings.DEBUG,
+    poolclass=InstrumentedAsyncQueuePool,
     pool_size=settings.DB_POOL_SIZE,
     max_overflow=settings.DB_MAX_OVERFLOW,
     pool_pre_ping=True,
 )
+pool_monitor.register("primary", engine.pool)
+
+# Optional read replicas; reads fall back to the primary engine without them
+replica_router = ReplicaRouter(
+    engine,
+    [
+        create_async_engine(
+            url,
+            echo=settings.DEBUG,
+            poolclass=InstrumentedAsyncQueuePool,
+            pool_size=settings.DB_POOL_SIZE,
+            max_overflow=settings.DB_MAX_OVERFLOW,
+            pool_pre_ping=True,
+        )
+        for url in settings.DATABASE_REPLICA_URLS
+    ],
+    retry_after=settings.DB_REPLICA_RETRY_SECONDS,
+    max_lag=settings.DB_REPLICA_MAX_LAG_SECONDS,
+)
+for _index, _replica in enumerate(replica_router.replicas):
+    pool_monitor.register(f"replica-{_index}", _replica.pool)
+
+# Statement timing and slow-query plan sampling for every engine
+query_profiler = QueryProfiler(
+    slow_threshold=settings.SLOW_QUERY_THRESHOLD_MS / 1000,
+    explain_sample_rate=settings.EXPLAIN_SAMPLE_RATE,
+    buffer_size=settings.SLOW_QUERY_BUFFER_SIZE,
+)
+query_profiler.enabled = settings.QUERY_PROFILER_ENABLED
+for _engine in (engine, *replica_router.replicas):
+    query_profiler.attach(_engine)
+
+
+@on_settings_reload
+def _apply_database_settings(changed: Dict[str, Any]) -> None:
+    """Apply reloaded pool, profiler and echo settings."""
+    if "DB_MAX_OVERFLOW" in changed and not settings.DB_POOL_ADAPTIVE:
+        pool_monitor.set_max_overflow(settings.DB_MAX_OVERFLOW)
+    for name in ("DB_POOL_SIZE", "DATABASE_URL", "DATABASE_REPLICA_URLS"):
+        if name in changed:
+            logger.warning("%s changes take effect after a restart", name)
+    query_profiler.slow_threshold = settings.SLOW_QUERY_THRESHOLD_MS / 1000
+    query_profiler.explain_sample_rate = settings.EXPLAIN_SAMPLE_RATE
+    query_profiler.enabled = settings.QUERY_PROFILER_ENABLED
+    if "DEBUG" in changed:
+        for _engine in (engine, *replica_router.replicas):
+            _engine.echo = settings.DEBUG
 
 
 class Base(DeclarativeBase):
@@ -52,17 +115,59 @@ AsyncSessionLocal = async_sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False, autoflush=False
 )
 
+# HTTP methods whose requests get read-only transactions
+READ_ONLY_METHODS = frozenset({"GET", "HEAD", "OPTIONS"})
+
+# Session.info key of the callbacks waiting for the transaction to commit
+_AFTER_COMMIT_KEY = "after_commit"
+
 
-async def get_db() -> AsyncGenerator[AsyncSession, None]:
+@event.listens_for(Session, "after_begin")
+def _mark_transaction_read_only(session, transaction, connection) -> None:
+    """Open transactions of read-only sessions with SET TRANSACTION READ ONLY."""
+    if session.info.get("read_only"):
+        connection.exec_driver_sql("SET TRANSACTION READ ONLY")
+
+
+def after_commit(session: AsyncSession, callback: Callable[[], Awaitable[Any]]) -> None:
     """
-    Dependency for getting async database session.
+    Run a side effect once the session's transaction has committed.
 
-    Yields:
-        AsyncSession: Active database session
+    For effects that must not happen for writes that are rolled back, such
+    as audit entries and cache invalidation. Callbacks run in order after
+    the unit of work (or `release_connection`) commits and are discarded
+    when the transaction rolls back. A failing callback is logged; the
+    commit stands.
+    """
+    session.info.setdefault(_AFTER_COMMIT_KEY, []).append(callback)
+
+
+@event.listens_for(Session, "after_rollback")
+def _discard_after_commit(session) -> None:
+    session.info.pop(_AFTER_COMMIT_KEY, None)
+
+
+async def _run_after_commit(session: AsyncSession) -> None:
+    for callback in session.info.pop(_AFTER_COMMIT_KEY, []):
+        try:
+            await callback()
+        except Exception as e:
+            logger.error("After-commit callback failed: %s", e, exc_info=True)
+
+
+@asynccontextmanager
+async def _unit_of_work(session: AsyncSession) -> AsyncIterator[AsyncSession]:
+    """
+    Commit the session's transaction on success, roll back on error.
+
+    Services only flush; this is the single commit of a request, followed
+    by the callbacks registered with `after_commit`.
     """
-    session = AsyncSessionLocal()
     try:
         yield session
+        if session.in_transaction():
+            await session.commit()
+        await _run_after_commit(session)
     except Exception as e:
         logger.error("Database session error: %s", str(e), exc_info=True)
         await session.rollback()
@@ -71,6 +176,92 @@ async def get_db() -> AsyncGenerator[AsyncSession, None]:
         await session.close()
 
 
+async def get_db(
+    request: Request, response: Response
+) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Unit-of-work dependency: one session and transaction per request.
+
+    FastAPI caches the dependency per request, so every handler and
+    sub-dependency asking for it shares the same session. GET, HEAD and
+    OPTIONS requests get read-only transactions. The pool connection is
+    checked out lazily on the first query and returned as soon as the
+    transaction ends, either through `release_connection` or when the
+    handler returns, so requests that are not doing DB work do not hold one.
+
+    Always uses the primary. When replicas are configured, write requests
+    open a read-your-writes window for the client (see get_read_db).
+
+    Yields:
+        AsyncSession: Active database session
+    """
+    read_only = request.method in READ_ONLY_METHODS
+    if not read_only and replica_router.replicas:
+        # Set up front: headers added after the handler returns are not sent
+        window = settings.DB_READ_YOUR_WRITES_SECONDS
+        response.set_cookie(
+            READ_YOUR_WRITES_COOKIE,
+            f"{time.time() + window:.3f}",
+            max_age=int(window) + 1,
+            httponly=True,
+            samesite="lax",
+        )
+    async with _unit_of_work(
+        AsyncSessionLocal(info={"read_only": read_only})
+    ) as session:
+        yield session
+
+
+def _primary_until(request: Request) -> Optional[float]:
+    """Read the end of the client's read-your-writes window from its cookie."""
+    value = request.cookies.get(READ_YOUR_WRITES_COOKIE)
+    try:
+        return float(value) if value else None
+    except ValueError:
+        return None
+
+
+async def get_read_db(request: Request) -> AsyncGenerator[AsyncSession, None]:
+    """
+    Read-only session routed to a healthy replica when one is configured.
+
+    For endpoints that only read (listings, statistics). Clients that
+    wrote within DB_READ_YOUR_WRITES_SECONDS read from the primary, and a
+    replica failing with a connection error is taken out of rotation.
+
+    Yields:
+        AsyncSession: Read-only database session
+    """
+    bind = replica_router.engine_for_read(_primary_until(request))
+    session = AsyncSessionLocal(
+        bind=bind, info={"read_only": True, "replica": bind is not engine}
+    )
+    async with _unit_of_work(session):
+        try:
+            yield session
+        except DBAPIError as e:
+            if bind is not engine and e.connection_invalidated:
+                replica_router.mark_unhealthy(bind, str(e.orig))
+            raise
+        except OSError as e:
+            if bind is not engine:
+                replica_router.mark_unhealthy(bind, str(e))
+            raise
+
+
+async def release_connection(session: AsyncSession) -> None:
+    """
+    End the current transaction so its pool connection is returned now.
+
+    For handlers that finish their DB work early and continue with slow
+    non-DB work (rendering, conversion). Loaded objects stay usable since
+    sessions do not expire on commit.
+    """
+    if session.in_transaction():
+        await session.commit()
+    await _run_after_commit(session)
+
+
 # Add synchronous wrapper for FastAPI compatibility
 def get_db_sync():
     """Synchronous wrapper for get_db."""
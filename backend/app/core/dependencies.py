@@ -2,26 +2,33 @@
 Common dependencies for FastAPI endpoints.
 """
 
-from typing import AsyncGenerator, Optional
+from typing import Annotated, AsyncGenerator, Optional
 from fastapi import Depends, HTTPException, status
 from fastapi.security import OAuth2PasswordBearer
 from jose import JWTError, jwt
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from .config import Settings
+from .config import Settings, get_settings
+from .context import current_user_id
 from .database import get_db
 from app.models.user import User
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
+# The shared, reloadable settings instance
+SettingsDep = Annotated[Settings, Depends(get_settings)]
+
 
 async def get_current_user(
-    token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)
+    app_settings: SettingsDep,
+    token: str = Depends(oauth2_scheme),
+    db: AsyncSession = Depends(get_db),
 ) -> User:
     """
     Get current authenticated user.
 
     Args:
+        app_settings: Application settings
         token: JWT token
         db: Database session
 
@@ -38,7 +45,7 @@ async def get_current_user(
     )
     try:
         payload = jwt.decode(
-            token, Settings.SECRET_KEY, algorithms=[Settings.ALGORITHM]
+            token, app_settings.SECRET_KEY, algorithms=[app_settings.algorithm]
         )
         username: str = payload.get("sub")
         if username is None:
@@ -46,11 +53,11 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
 
-    result = await db.execute(select(User).where(User.username == username))
     result = await db.execute(select(User).where(User.username == username))
     user = result.scalars().first()
     if user is None:
         raise credentials_exception
+    current_user_id.set(user.id)
     return user
 
 
@@ -2,10 +2,33 @@
 Application event handlers.
 """
 
-from typing import Callable
+import asyncio
+import logging
+import os
+import signal
+from typing import Any, Callable, Dict, Optional
 from fastapi import FastAPI
 from sqlalchemy.ext.asyncio import AsyncEngine
-from app.core.database import engine
+from app.core.config import on_settings_reload, reload_settings, settings
+from app.core.database import engine, query_profiler, replica_router
+from app.core.journal import journal_writer
+from app.core.journal_partitions import journal_maintenance
+from app.core.logging import stop_logging
+from app.core.metrics import registry
+from app.core.pool_metrics import pool_monitor
+from app.core.tracing import tracer
+
+logger = logging.getLogger(__name__)
+
+# Settings read when the adaptive pool tuner starts
+POOL_TUNER_SETTINGS = {
+    "DB_POOL_ADAPTIVE",
+    "DB_POOL_MIN_OVERFLOW",
+    "DB_POOL_MAX_OVERFLOW_LIMIT",
+    "DB_POOL_WAIT_TARGET_MS",
+    "DB_POOL_TUNE_INTERVAL",
+}
+_tuner_restart: Optional[asyncio.Task] = None
 
 
 async def close_db_connection(app: FastAPI, engine: AsyncEngine) -> None:
@@ -13,6 +36,55 @@ async def close_db_connection(app: FastAPI, engine: AsyncEngine) -> None:
     await engine.dispose()
 
 
+def start_pool_tuner() -> None:
+    pool_monitor.start_tuner(
+        interval=settings.DB_POOL_TUNE_INTERVAL,
+        wait_target=settings.DB_POOL_WAIT_TARGET_MS / 1000,
+        min_overflow=settings.DB_POOL_MIN_OVERFLOW,
+        max_overflow=settings.DB_POOL_MAX_OVERFLOW_LIMIT,
+    )
+
+
+async def _restart_pool_tuner() -> None:
+    await pool_monitor.stop_tuner()
+    if settings.DB_POOL_ADAPTIVE:
+        start_pool_tuner()
+    else:
+        pool_monitor.set_max_overflow(settings.DB_MAX_OVERFLOW)
+
+
+@on_settings_reload
+def _apply_pool_tuner_settings(changed: Dict[str, Any]) -> None:
+    global _tuner_restart
+    if not changed.keys() & POOL_TUNER_SETTINGS:
+        return
+    if not pool_monitor.tuner_running and "DB_POOL_ADAPTIVE" not in changed:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    _tuner_restart = loop.create_task(_restart_pool_tuner())
+
+
+def _install_reload_handler() -> None:
+    """Reload settings on SIGHUP, where the platform has it."""
+    if not hasattr(signal, "SIGHUP"):
+        return
+    try:
+        asyncio.get_running_loop().add_signal_handler(signal.SIGHUP, reload_settings)
+    except (NotImplementedError, RuntimeError) as e:
+        logger.warning("Settings reload on SIGHUP unavailable: %s", e)
+
+
+def _remove_reload_handler() -> None:
+    if hasattr(signal, "SIGHUP"):
+        try:
+            asyncio.get_running_loop().remove_signal_handler(signal.SIGHUP)
+        except (NotImplementedError, RuntimeError):
+            pass
+
+
 def create_start_app_handler(app: FastAPI) -> Callable:
     """
     Create startup event handler.
@@ -25,8 +97,24 @@ def create_start_app_handler(app: FastAPI) -> Callable:
     """
 
     async def start_app() -> None:
-        # Add startup tasks here if needed (e.g., initializing metrics)
-        pass
+        stale = registry.store.stale_pids()
+        if stale:
+            logger.error(
+                "Metrics directory holds values of exited processes %s, from a "
+                "previous run or crashed workers; their counters are added to "
+                "this run's. Run scripts/reset_metrics.py before starting the "
+                "server.",
+                stale,
+            )
+            for pid in stale:
+                registry.store.mark_process_dead(pid)
+        replica_router.start_health_checks(settings.DB_REPLICA_HEALTH_INTERVAL)
+        journal_writer.start()
+        journal_maintenance.start(settings.JOURNAL_MAINTENANCE_INTERVAL)
+        query_profiler.start()
+        if settings.DB_POOL_ADAPTIVE:
+            start_pool_tuner()
+        _install_reload_handler()
 
     return start_app
 
@@ -43,6 +131,15 @@ def create_stop_app_handler(app: FastAPI) -> Callable:
     """
 
     async def stop_app() -> None:
+        _remove_reload_handler()
+        await pool_monitor.stop_tuner()
+        await journal_maintenance.stop()
+        await journal_writer.stop()
+        await query_profiler.stop()
+        await replica_router.close()
         await close_db_connection(app, engine)
+        registry.store.mark_process_dead(os.getpid())
+        tracer.shutdown()
+        stop_logging()
 
     return stop_app
@@ -1,84 +1,316 @@
 """
 Audit logging and journaling functionality.
+
+Events are not written on the caller's session. `Journal.log_event` puts
+them on a bounded in-memory queue and `JournalWriter` bulk-inserts them
+in batches from a background task, so audit writes neither add latency
+to business transactions nor fail them. Batches that cannot be written
+after retries are appended to a JSON lines spill file instead of being
+lost.
 """
 
-from datetime import datetime
-from typing import Any, Dict, Optional
+import asyncio
+import base64
+import json
+import os
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional, Tuple
+from sqlalchemy import and_, insert, or_
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from app.models.journal import JournalEntry
+from app.core.config import settings
+from app.core.context import current_scope, current_user_id
+from app.core.database import AsyncSessionLocal
+from app.core.jsonpatch import Patch
 from app.core.logging import get_logger
+from app.core.metrics import registry
 
 logger = get_logger(__name__)
 
+journal_entries = registry.counter(
+    "app_journal_entries_total",
+    "Audit journal entries by outcome (written, spilled, dropped)",
+    ("outcome",),
+)
+journal_batch_size = registry.histogram(
+    "app_journal_batch_size",
+    "Entries per audit journal bulk insert",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500),
+)
+
+WRITE_ATTEMPTS = 3
+_STOP = object()
+
+
+class JournalWriter:
+    """
+    Background batch writer of audit journal entries.
+
+    Args:
+        queue_size: Entries buffered before `submit` waits for the writer
+        batch_size: Entries per bulk insert
+        flush_interval: Seconds an entry waits at most before a flush
+        spill_file: File receiving batches that could not be written
+    """
+
+    def __init__(
+        self,
+        queue_size: int = 10000,
+        batch_size: int = 500,
+        flush_interval: float = 1.0,
+        spill_file: Optional[str] = None,
+    ):
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.spill_file = spill_file
+        self._queue: Optional[asyncio.Queue] = None
+        self._task: Optional[asyncio.Task] = None
+
+    @property
+    def running(self) -> bool:
+        return self._task is not None
+
+    def start(self) -> None:
+        """Start the flusher on the running loop."""
+        if self._task is None:
+            self._queue = asyncio.Queue(maxsize=self.queue_size)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Write every queued entry, then stop the flusher."""
+        if self._task is None:
+            return
+        # The flusher drains the queue up to the marker; cancelling it could
+        # interrupt an insert that already committed
+        await self._queue.put(_STOP)
+        task, self._task = self._task, None
+        await task
+        remaining = []
+        while not self._queue.empty():
+            remaining.append(self._queue.get_nowait())
+        for start in range(0, len(remaining), self.batch_size):
+            await self._write(remaining[start : start + self.batch_size])
+        logger.info("Journal writer stopped")
+
+    async def submit(self, row: Dict[str, Any]) -> None:
+        """
+        Queue an entry for writing.
+
+        Only waits when the queue is full, i.e. when the database cannot
+        keep up. Without a running flusher the entry is written directly.
+        """
+        if self._task is None:
+            await self._write([row])
+            return
+        await self._queue.put(row)
+
+    def pending(self) -> int:
+        return self._queue.qsize() if self._queue is not None else 0
+
+    async def _run(self) -> None:
+        stopping = False
+        while not stopping:
+            row = await self._queue.get()
+            if row is _STOP:
+                break
+            batch = [row]
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    row = await asyncio.wait_for(self._queue.get(), timeout)
+                except asyncio.TimeoutError:
+                    break
+                if row is _STOP:
+                    stopping = True
+                    break
+                batch.append(row)
+            await self._write(batch)
+
+    async def _write(self, batch: List[Dict[str, Any]]) -> None:
+        """Flush a batch; a failure loses the batch, never the flusher."""
+        try:
+            await self._flush(batch)
+        except Exception as e:
+            journal_entries.labels(outcome="dropped").inc(len(batch))
+            logger.error("Dropped %d journal entries: %s", len(batch), e, exc_info=True)
+
+    async def _flush(self, batch: List[Dict[str, Any]]) -> None:
+        for attempt in range(1, WRITE_ATTEMPTS + 1):
+            try:
+                async with AsyncSessionLocal() as session:
+                    await session.execute(insert(JournalEntry), batch)
+                    await session.commit()
+                journal_entries.labels(outcome="written").inc(len(batch))
+                journal_batch_size.observe(len(batch))
+                return
+            except Exception as e:
+                logger.warning(
+                    "Journal batch of %d entries failed (attempt %d/%d): %s",
+                    len(batch),
+                    attempt,
+                    WRITE_ATTEMPTS,
+                    e,
+                )
+                if attempt < WRITE_ATTEMPTS:
+                    await asyncio.sleep(0.5 * 2**attempt)
+        self._spill(batch)
+
+    def _spill(self, batch: List[Dict[str, Any]]) -> None:
+        if not self.spill_file:
+            journal_entries.labels(outcome="dropped").inc(len(batch))
+            logger.error("Dropped %d journal entries", len(batch))
+            return
+        os.makedirs(os.path.dirname(self.spill_file) or ".", exist_ok=True)
+        with open(self.spill_file, "a", encoding="utf-8") as f:
+            for row in batch:
+                f.write(json.dumps(row, default=str) + "\n")
+        journal_entries.labels(outcome="spilled").inc(len(batch))
+        logger.error("Spilled %d journal entries to %s", len(batch), self.spill_file)
+
+
+journal_writer = JournalWriter(
+    queue_size=settings.JOURNAL_QUEUE_SIZE,
+    batch_size=settings.JOURNAL_BATCH_SIZE,
+    flush_interval=settings.JOURNAL_FLUSH_INTERVAL,
+    spill_file=settings.JOURNAL_SPILL_FILE,
+)
+
 
 class Journal:
     """Audit journal for tracking system events."""
 
     @staticmethod
     async def log_event(
-        db: AsyncSession,
         event_type: str,
         user_id: Optional[int],
         document_id: Optional[int],
         details: Dict[str, Any],
         ip_address: Optional[str] = None,
-    ) -> JournalEntry:
+    ) -> None:
         """
         Log an event to the audit journal.
 
+        The entry is written asynchronously by the journal writer, outside
+        of the caller's transaction.
+
         Args:
-            db: Database session
             event_type: Type of event (create, update, delete, etc.)
             user_id: ID of user performing action
             document_id: ID of document being modified
             details: Additional event details
             ip_address: IP address of request
+        """
+        await journal_writer.submit(
+            {
+                "event_type": event_type,
+                "user_id": user_id,
+                "document_id": document_id,
+                "details": details,
+                "ip_address": ip_address,
+                "timestamp": datetime.now(timezone.utc),
+            }
+        )
 
-        Returns:
-            Created journal entry
+    @staticmethod
+    async def log_document_change(
+        event_type: str, document_id: int, patch: Patch, **details: Any
+    ) -> None:
+        """
+        Journal a document change as a JSON Patch.
+
+        The user and client address are taken from the current request,
+        if any.
+
+        Args:
+            event_type: create, update or delete
+            document_id: ID of the changed document
+            patch: Changes of the document's fields
+            details: Additional event details
         """
-        entry = JournalEntry(
-            event_type=event_type,
-            user_id=user_id,
-            document_id=document_id,
-            details=details,
-            ip_address=ip_address,
-            timestamp=datetime.utcnow(),
+        scope = current_scope.get()
+        client = scope.get("client") if scope is not None else None
+        await Journal.log_event(
+            event_type,
+            current_user_id.get(),
+            document_id,
+            {"patch": patch, **details},
+            ip_address=client[0] if client else None,
         )
-        try:
-            db.add(entry)
-            await db.commit()
-            await db.refresh(entry)
-            logger.info(
-                "Audit event logged",
-                extra={
-                    "event_type": event_type,
-                    "user_id": user_id,
-                    "document_id": document_id,
-                },
-            )
-            return entry
-        except Exception as e:
-            logger.error(
-                "Failed to log audit event",
-                exc_info=e,
-                extra={
-                    "event_type": event_type,
-                    "user_id": user_id,
-                    "document_id": document_id,
-                },
-            )
-            raise
 
     @staticmethod
     async def get_document_history(
-        db: AsyncSession, document_id: int
-    ) -> list[JournalEntry]:
-        """Get audit history for a document."""
+        db: AsyncSession,
+        document_id: int,
+        limit: int = 50,
+        cursor: Optional[str] = None,
+    ) -> Tuple[List[JournalEntry], Optional[str]]:
+        """
+        Get a page of the audit history of a document, newest first.
+
+        Pages follow the (document_id, timestamp DESC, id DESC) index and
+        start after the last entry of the previous page, so every page
+        costs the same however deep it is. The timestamp bound also lets
+        PostgreSQL skip partitions newer than the cursor.
+
+        Args:
+            db: Database session
+            document_id: ID of the document
+            limit: Maximum number of entries
+            cursor: next_cursor of the previous page
+
+        Returns:
+            Entries and the cursor of the next page (None on the last page)
+
+        Raises:
+            ValueError: If the cursor is malformed
+        """
+        query = select(JournalEntry).where(JournalEntry.document_id == document_id)
+        if cursor is not None:
+            timestamp, entry_id = decode_history_cursor(cursor)
+            query = query.where(
+                JournalEntry.timestamp <= timestamp,
+                or_(
+                    JournalEntry.timestamp < timestamp,
+                    and_(
+                        JournalEntry.timestamp == timestamp,
+                        JournalEntry.id < entry_id,
+                    ),
+                ),
+            )
         result = await db.execute(
-            select(JournalEntry)
-            .where(JournalEntry.document_id == document_id)
-            .order_by(JournalEntry.timestamp.desc())
+            query.order_by(JournalEntry.timestamp.desc(), JournalEntry.id.desc())
+            .limit(limit + 1)
         )
-        return result.scalars().all()
+        entries = list(result.scalars().all())
+        next_cursor = None
+        if len(entries) > limit:
+            entries = entries[:limit]
+            last = entries[-1]
+            next_cursor = encode_history_cursor(last.timestamp, last.id)
+        return entries, next_cursor
+
+
+def encode_history_cursor(timestamp: datetime, entry_id: int) -> str:
+    raw = f"{timestamp.isoformat()}|{entry_id}".encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_history_cursor(cursor: str) -> Tuple[datetime, int]:
+    """
+    Split a history cursor into timestamp and entry ID.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        timestamp, _, entry_id = raw.decode("utf-8").partition("|")
+        return datetime.fromisoformat(timestamp), int(entry_id)
+    except (ValueError, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid history cursor: {cursor!r}") from e
@@ -0,0 +1,309 @@
+"""
+Partition maintenance of the audit journal.
+
+journal_entries is range-partitioned by month on timestamp, one table per
+month named "journal_entries_y2025m03", plus a default partition catching
+rows outside of them. A periodic job:
+
+- creates the partitions of the coming months ahead of time, so inserts
+  normally never land in the default partition. Rows that did, e.g.
+  while the job was not running, are moved to their month's partition
+  when it is created;
+- archives partitions older than the retention period: the partition is
+  detached, its rows are streamed to a gzip-compressed JSON lines file
+  and the table is dropped. Dropping a partition costs nothing compared
+  to deleting the rows from a single table.
+
+Workers coordinate through a PostgreSQL advisory lock, so only one of
+them runs the job at a time.
+"""
+
+import asyncio
+import gzip
+import os
+import re
+from datetime import date, datetime, timezone
+from typing import List, Optional, TextIO, Tuple
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from app.core.config import settings
+from app.core.database import engine
+from app.core.logging import get_logger
+
+logger = get_logger(__name__)
+
+PARENT_TABLE = "journal_entries"
+DEFAULT_PARTITION = "journal_entries_default"
+PARTITION_PATTERN = re.compile(r"^journal_entries_y(\d{4})m(\d{2})$")
+# Arbitrary application-wide key of the maintenance advisory lock
+ADVISORY_LOCK_KEY = 727_150_001
+ARCHIVE_CHUNK_ROWS = 5000
+
+
+def month_start(day: date) -> date:
+    return date(day.year, day.month, 1)
+
+
+def add_months(month: date, months: int) -> date:
+    index = month.year * 12 + month.month - 1 + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def partition_name(month: date) -> str:
+    return f"{PARENT_TABLE}_y{month.year:04d}m{month.month:02d}"
+
+
+def partition_month(name: str) -> Optional[date]:
+    match = PARTITION_PATTERN.match(name)
+    if match is None:
+        return None
+    return date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def partition_bounds_sql(month: date) -> str:
+    return f"FROM ('{month.isoformat()}') TO ('{add_months(month, 1).isoformat()}')"
+
+
+def create_partition_sql(month: date) -> str:
+    return (
+        f"CREATE TABLE IF NOT EXISTS {partition_name(month)} "
+        f"PARTITION OF {PARENT_TABLE} FOR VALUES {partition_bounds_sql(month)}"
+    )
+
+
+async def _table_exists(conn: AsyncConnection, name: str) -> bool:
+    exists = await conn.scalar(
+        text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name}
+    )
+    return bool(exists)
+
+
+async def create_partition(conn: AsyncConnection, month: date) -> None:
+    """
+    Create the partition of a month.
+
+    CREATE TABLE ... PARTITION OF fails while the default partition holds
+    rows of the month. In that case the table is created standalone, the
+    rows are moved into it and it is attached. The default partition is
+    locked against inserts meanwhile, so no new row of the month can land
+    there before the attach validates it.
+    """
+    name = partition_name(month)
+    if not await _table_exists(conn, DEFAULT_PARTITION):
+        await conn.execute(text(create_partition_sql(month)))
+        return
+    in_month = (
+        f"timestamp >= '{month.isoformat()}' "
+        f"AND timestamp < '{add_months(month, 1).isoformat()}'"
+    )
+    await conn.execute(text(f"LOCK TABLE {DEFAULT_PARTITION} IN EXCLUSIVE MODE"))
+    stray = await conn.scalar(
+        text(f"SELECT EXISTS (SELECT 1 FROM {DEFAULT_PARTITION} WHERE {in_month})")
+    )
+    if not stray:
+        await conn.execute(text(create_partition_sql(month)))
+        return
+    await conn.execute(
+        text(
+            f"CREATE TABLE {name} "
+            f"(LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"
+        )
+    )
+    moved = await conn.execute(
+        text(
+            f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE {in_month} "
+            f"RETURNING *) INSERT INTO {name} SELECT * FROM moved"
+        )
+    )
+    await conn.execute(
+        text(
+            f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} "
+            f"FOR VALUES {partition_bounds_sql(month)}"
+        )
+    )
+    logger.warning(
+        "Moved %d journal entries from %s to the new partition %s",
+        moved.rowcount,
+        DEFAULT_PARTITION,
+        name,
+    )
+
+
+async def ensure_partitions(conn: AsyncConnection, months_ahead: int) -> List[str]:
+    """Create the missing partitions of the current and the next months."""
+    current = month_start(datetime.now(timezone.utc).date())
+    created = []
+    for offset in range(months_ahead + 1):
+        month = add_months(current, offset)
+        if not await _table_exists(conn, partition_name(month)):
+            await create_partition(conn, month)
+            created.append(partition_name(month))
+    return created
+
+
+async def list_partitions(conn: AsyncConnection) -> List[Tuple[str, date, bool]]:
+    """(name, month, attached) of the monthly tables, detached ones included."""
+    result = await conn.execute(
+        text(
+            "SELECT c.relname, c.relispartition FROM pg_class c "
+            "JOIN pg_namespace n ON n.oid = c.relnamespace "
+            "WHERE n.nspname = current_schema() AND c.relkind = 'r' "
+            "AND c.relname LIKE 'journal\\_entries\\_y%'"
+        )
+    )
+    partitions = []
+    for name, attached in result.fetchall():
+        month = partition_month(name)
+        if month is not None:
+            partitions.append((name, month, attached))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+async def archive_partition(
+    engine: AsyncEngine, name: str, attached: bool, archive_dir: str
+) -> str:
+    """
+    Move a partition's rows to "<archive_dir>/<name>.jsonl.gz" and drop it.
+
+    Detaching takes a short exclusive lock on the parent table and is
+    committed on its own, so inserts are not blocked while rows are
+    copied. A partition left detached by an interrupted run is picked up
+    again by the next one.
+
+    Returns:
+        Path of the archive file
+    """
+    if attached:
+        async with engine.begin() as conn:
+            await conn.execute(
+                text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}")
+            )
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{name}.jsonl.gz")
+    partial = path + ".partial"
+    rows = 0
+    archive = await asyncio.to_thread(gzip.open, partial, "wt", encoding="utf-8")
+    try:
+        async with engine.begin() as conn:
+            result = await conn.stream(
+                text(f"SELECT row_to_json(t)::text FROM {name} t ORDER BY id")
+            )
+            async for chunk in result.partitions(ARCHIVE_CHUNK_ROWS):
+                data = "".join(row[0] + "\n" for row in chunk)
+                await asyncio.to_thread(archive.write, data)
+                rows += len(chunk)
+            await asyncio.to_thread(_close_durably, archive)
+            os.replace(partial, path)
+            await conn.execute(text(f"DROP TABLE {name}"))
+    except BaseException:
+        archive.close()
+        raise
+    logger.info("Archived journal partition %s: %d rows to %s", name, rows, path)
+    return path
+
+
+def _close_durably(archive: TextIO) -> None:
+    archive.close()
+    with open(archive.name, "rb") as f:
+        os.fsync(f.fileno())
+
+
+class JournalMaintenance:
+    """
+    Periodic partition creation and retention of the audit journal.
+
+    Args:
+        engine: Engine of the primary database
+        months_ahead: Months of partitions created in advance
+        retention_months: Full months kept in the table; 0 keeps everything
+        archive_dir: Directory of the archived partitions
+    """
+
+    def __init__(
+        self,
+        engine: AsyncEngine,
+        months_ahead: int = 3,
+        retention_months: int = 12,
+        archive_dir: str = "archive/journal",
+    ):
+        self.engine = engine
+        self.months_ahead = months_ahead
+        self.retention_months = retention_months
+        self.archive_dir = archive_dir
+        self._task: Optional[asyncio.Task] = None
+
+    async def run_once(self) -> List[str]:
+        """
+        Create upcoming partitions and archive expired ones.
+
+        Returns:
+            Paths of the archives written; empty if another worker holds
+            the maintenance lock
+        """
+        archived = []
+        async with self.engine.connect() as lock_conn:
+            locked = await lock_conn.scalar(
+                text("SELECT pg_try_advisory_lock(:key)"), {"key": ADVISORY_LOCK_KEY}
+            )
+            await lock_conn.commit()
+            if not locked:
+                return archived
+            try:
+                try:
+                    async with self.engine.begin() as conn:
+                        await ensure_partitions(conn, self.months_ahead)
+                except Exception as e:
+                    # Retention must not depend on partition creation
+                    logger.error(
+                        "Creating journal partitions failed: %s", e, exc_info=True
+                    )
+                if self.retention_months > 0:
+                    async with self.engine.connect() as conn:
+                        partitions = await list_partitions(conn)
+                    cutoff = add_months(
+                        month_start(datetime.now(timezone.utc).date()),
+                        -self.retention_months,
+                    )
+                    for name, month, attached in partitions:
+                        if month < cutoff:
+                            archived.append(
+                                await archive_partition(
+                                    self.engine, name, attached, self.archive_dir
+                                )
+                            )
+            finally:
+                await lock_conn.execute(
+                    text("SELECT pg_advisory_unlock(:key)"), {"key": ADVISORY_LOCK_KEY}
+                )
+                await lock_conn.commit()
+        return archived
+
+    async def _loop(self, interval: float) -> None:
+        while True:
+            try:
+                await self.run_once()
+            except Exception as e:
+                logger.error("Journal maintenance failed: %s", e, exc_info=True)
+            await asyncio.sleep(interval)
+
+    def start(self, interval: float = 3600.0) -> None:
+        """Run maintenance now and then every `interval` seconds."""
+        if self._task is None:
+            self._task = asyncio.create_task(self._loop(interval))
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+
+journal_maintenance = JournalMaintenance(
+    engine,
+    months_ahead=settings.JOURNAL_PARTITIONS_AHEAD,
+    retention_months=settings.JOURNAL_RETENTION_MONTHS,
+    archive_dir=settings.JOURNAL_ARCHIVE_DIR,
+)
@@ -0,0 +1,83 @@
+"""
+Minimal JSON Patch (RFC 6902) diffs for audit records.
+
+Only "add", "remove" and "replace" operations are produced: objects are
+compared key by key, recursively, and any other changed value, arrays
+included, is replaced as a whole. Patches therefore grow with the size
+of a change, not with the size of the documents compared.
+"""
+
+from typing import Any, Dict, List
+
+Patch = List[Dict[str, Any]]
+
+
+def _escape(token: str) -> str:
+    return str(token).replace("~", "~0").replace("/", "~1")
+
+
+def _unescape(token: str) -> str:
+    return token.replace("~1", "/").replace("~0", "~")
+
+
+def make_patch(before: Dict[str, Any], after: Dict[str, Any], path: str = "") -> Patch:
+    """
+    Operations turning `before` into `after`.
+
+    Example:
+        >>> make_patch({"a": 1, "b": {"c": 2}}, {"b": {"c": 3}})
+        [{'op': 'remove', 'path': '/a'}, {'op': 'replace', 'path': '/b/c', 'value': 3}]
+    """
+    patch: Patch = []
+    for key, old in before.items():
+        pointer = f"{path}/{_escape(key)}"
+        if key not in after:
+            patch.append({"op": "remove", "path": pointer})
+            continue
+        new = after[key]
+        if isinstance(old, dict) and isinstance(new, dict):
+            patch.extend(make_patch(old, new, pointer))
+        elif old != new or type(old) is not type(new):
+            patch.append({"op": "replace", "path": pointer, "value": new})
+    for key, new in after.items():
+        if key not in before:
+            patch.append({"op": "add", "path": f"{path}/{_escape(key)}", "value": new})
+    return patch
+
+
+def apply_patch(document: Dict[str, Any], patch: Patch) -> Dict[str, Any]:
+    """
+    Apply a patch made by `make_patch` to a copy of `document`.
+
+    Raises:
+        ValueError: If an operation does not fit the document
+    """
+    result = _copy(document)
+    for operation in patch:
+        tokens = [_unescape(token) for token in operation["path"].split("/")[1:]]
+        if not tokens:
+            raise ValueError("Patching the document root is not supported")
+        target: Any = result
+        for token in tokens[:-1]:
+            if not isinstance(target, dict) or token not in target:
+                raise ValueError(f"Path not found: {operation['path']}")
+            target = target[token]
+        if not isinstance(target, dict):
+            raise ValueError(f"Path not found: {operation['path']}")
+        key = tokens[-1]
+        op = operation["op"]
+        if op == "add" or (op == "replace" and key in target):
+            target[key] = _copy(operation["value"])
+        elif op == "remove" and key in target:
+            del target[key]
+        else:
+            raise ValueError(f"Cannot {op} {operation['path']}")
+    return result
+
+
+def _copy(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
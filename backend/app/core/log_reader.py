@@ -0,0 +1,324 @@
+"""
+Reading of the JSON log files written by setup_logging.
+
+The current file and its rotated backups ("app.json", "app.json.1", ...)
+are read as one stream of records, newest file first. Files are never
+loaded whole: the tail is found by reading blocks backwards from the end,
+and incremental reads seek straight to a byte offset.
+
+Positions are exchanged as cursors "<inode>:<offset>". The inode follows
+a file through rotation, so a cursor taken on "app.json" stays valid
+after the file was renamed to "app.json.1".
+"""
+
+import asyncio
+import json
+import logging
+import os
+from typing import Any, AsyncIterator, Dict, Iterator, List, Optional, Tuple
+from .config import settings
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is listed in requirements.txt
+    orjson = None
+
+BLOCK_SIZE = 64 * 1024
+MAX_READ_BYTES = 4 * 1024 * 1024
+
+# (path, inode, size) of a log file
+LogFile = Tuple[str, int, int]
+
+
+def _loads(line: bytes) -> Optional[Dict[str, Any]]:
+    try:
+        record = orjson.loads(line) if orjson is not None else json.loads(line)
+    except ValueError:
+        return None
+    return record if isinstance(record, dict) else None
+
+
+def format_cursor(inode: int, offset: int) -> str:
+    return f"{inode}:{offset}"
+
+
+def parse_cursor(cursor: str) -> Tuple[int, int]:
+    """
+    Split a cursor into inode and offset.
+
+    Raises:
+        ValueError: If the cursor is malformed
+    """
+    inode, sep, offset = cursor.partition(":")
+    if not sep or not inode.isdigit() or not offset.isdigit():
+        raise ValueError(f"Invalid log cursor: {cursor!r}")
+    return int(inode), int(offset)
+
+
+class RecordFilter:
+    """
+    Level and logger criteria for log records.
+
+    Args:
+        level: Minimum level name, e.g. "WARNING"
+        logger: Logger name; its child loggers match too
+    """
+
+    def __init__(self, level: Optional[str] = None, logger: Optional[str] = None):
+        self.min_level = 0
+        if level:
+            min_level = logging.getLevelName(level.upper())
+            if not isinstance(min_level, int):
+                raise ValueError(f"Unknown log level: {level}")
+            self.min_level = min_level
+        self.logger = logger
+
+    def __call__(self, record: Dict[str, Any]) -> bool:
+        if self.min_level:
+            level = logging.getLevelName(str(record.get("level", "")))
+            if not isinstance(level, int) or level < self.min_level:
+                return False
+        if self.logger:
+            name = str(record.get("logger", ""))
+            if name != self.logger and not name.startswith(self.logger + "."):
+                return False
+        return True
+
+
+class LogReader:
+    """
+    Tail and incremental reads over a rotating JSON log file.
+
+    Args:
+        directory: Directory of the log files
+        file_name: Name of the current file; backups add ".1", ".2", ...
+    """
+
+    def __init__(self, directory: str, file_name: str = "app.json"):
+        self.directory = directory
+        self.file_name = file_name
+
+    def files(self) -> List[LogFile]:
+        """Existing log files, newest first."""
+        backups = []
+        prefix = self.file_name + "."
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return []
+        for name in names:
+            suffix = name[len(prefix) :]
+            if name.startswith(prefix) and suffix.isdigit():
+                backups.append((int(suffix), name))
+        ordered = [self.file_name] + [name for _, name in sorted(backups)]
+        files = []
+        for name in ordered:
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            files.append((path, stat.st_ino, stat.st_size))
+        return files
+
+    @staticmethod
+    def _locate(files: List[LogFile], cursor: str) -> Optional[Tuple[int, int]]:
+        """Index of the file a cursor points into and the offset in it."""
+        inode, offset = parse_cursor(cursor)
+        for index, (_, file_inode, size) in enumerate(files):
+            if file_inode == inode:
+                return index, min(offset, size)
+        return None
+
+    @staticmethod
+    def _complete_end(path: str, size: int) -> int:
+        """Offset just past the last newline; later bytes are being written."""
+        with open(path, "rb") as f:
+            position = size
+            while position > 0:
+                length = min(BLOCK_SIZE, position)
+                position -= length
+                f.seek(position)
+                newline = f.read(length).rfind(b"\n")
+                if newline >= 0:
+                    return position + newline + 1
+        return 0
+
+    @staticmethod
+    def _lines_backwards(path: str, end: int) -> Iterator[Tuple[int, bytes]]:
+        """(start offset, line) of the lines before `end`, last first."""
+        with open(path, "rb") as f:
+            position = end
+            remainder = b""
+            while position > 0:
+                length = min(BLOCK_SIZE, position)
+                position -= length
+                f.seek(position)
+                block = f.read(length) + remainder
+                lines = block.split(b"\n")
+                remainder = lines.pop(0)
+                line_end = position + len(block)
+                for line in reversed(lines):
+                    # line_end becomes the offset of the newline before it
+                    line_end -= len(line) + 1
+                    if line:
+                        yield line_end + 1, line
+            if remainder:
+                yield 0, remainder
+
+    def end_cursor(self) -> Optional[str]:
+        """Cursor after the last complete record, None without a log file."""
+        files = self.files()
+        if not files:
+            return None
+        path, inode, size = files[0]
+        return format_cursor(inode, self._complete_end(path, size))
+
+    def tail(
+        self,
+        limit: int = 100,
+        before: Optional[str] = None,
+        record_filter: Optional[RecordFilter] = None,
+    ) -> Dict[str, Any]:
+        """
+        Last `limit` matching records, oldest first.
+
+        Args:
+            limit: Maximum number of records
+            before: Cursor to page further back from
+            record_filter: Level and logger criteria
+
+        Returns:
+            Records, a "prev_cursor" to continue backwards (None at the
+            start of the oldest file) and a "next_cursor" to follow newer
+            records with `read_after`
+        """
+        files = self.files()
+        if not files:
+            return {"entries": [], "prev_cursor": None, "next_cursor": None}
+        path, inode, size = files[0]
+        start_index, start_offset = 0, self._complete_end(path, size)
+        next_cursor = format_cursor(inode, start_offset)
+        if before is not None:
+            located = self._locate(files, before)
+            if located is None:
+                return {"entries": [], "prev_cursor": None, "next_cursor": next_cursor}
+            start_index, start_offset = located
+
+        entries: List[Dict[str, Any]] = []
+        prev_cursor = None
+        for index in range(start_index, len(files)):
+            path, inode, size = files[index]
+            end = start_offset if index == start_index else size
+            for offset, line in self._lines_backwards(path, end):
+                prev_cursor = format_cursor(inode, offset)
+                record = _loads(line)
+                if record is None or (record_filter and not record_filter(record)):
+                    continue
+                entries.append(record)
+                if len(entries) >= limit:
+                    break
+            if len(entries) >= limit:
+                break
+        else:
+            prev_cursor = None
+        entries.reverse()
+        return {
+            "entries": entries,
+            "prev_cursor": prev_cursor,
+            "next_cursor": next_cursor,
+        }
+
+    def read_after(
+        self,
+        after: str,
+        limit: int = 1000,
+        record_filter: Optional[RecordFilter] = None,
+    ) -> Dict[str, Any]:
+        """
+        Matching records written after a cursor, oldest first.
+
+        Reading continues from a rotated file into the newer ones. If the
+        cursor's file was already removed by rotation, reading restarts
+        at the oldest file and "gap" is set.
+
+        Returns:
+            Records, the cursor to continue from and the gap flag
+        """
+        files = self.files()
+        if not files:
+            return {"entries": [], "next_cursor": after, "gap": False}
+        gap = False
+        located = self._locate(files, after)
+        if located is None:
+            gap = True
+            located = (len(files) - 1, 0)
+        index, offset = located
+
+        entries: List[Dict[str, Any]] = []
+        next_cursor = format_cursor(files[index][1], offset)
+        budget = MAX_READ_BYTES
+        while index >= 0 and len(entries) < limit and budget > 0:
+            path, inode, size = files[index]
+            with open(path, "rb") as f:
+                f.seek(offset)
+                data = f.read(min(size - offset, budget))
+            budget -= len(data)
+            # A trailing partial line is left for the next read
+            complete = data[: data.rfind(b"\n") + 1]
+            for line in complete.splitlines(keepends=True):
+                offset += len(line)
+                record = _loads(line)
+                if record is not None and (
+                    record_filter is None or record_filter(record)
+                ):
+                    entries.append(record)
+                    if len(entries) >= limit:
+                        break
+            next_cursor = format_cursor(inode, offset)
+            if offset < size or index == 0:
+                break
+            # Rotated file read to its end: go on with the next newer one
+            index -= 1
+            offset = 0
+            next_cursor = format_cursor(files[index][1], 0)
+        return {"entries": entries, "next_cursor": next_cursor, "gap": gap}
+
+    async def follow(
+        self,
+        after: Optional[str] = None,
+        record_filter: Optional[RecordFilter] = None,
+        poll_interval: float = 1.0,
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Poll for new records, yielding each batch of `read_after`.
+
+        Batches may be empty, which callers can use for keep-alives. File
+        access runs in a worker thread.
+
+        Args:
+            after: Cursor to start from; defaults to the current end
+            record_filter: Level and logger criteria
+            poll_interval: Seconds between polls
+        """
+        if after is None:
+            after = await asyncio.to_thread(self.end_cursor)
+        while True:
+            if after is None:
+                # No log file yet
+                batch = {"entries": [], "next_cursor": None, "gap": False}
+                files = await asyncio.to_thread(self.files)
+                if files:
+                    after = format_cursor(files[0][1], 0)
+                    continue
+            else:
+                batch = await asyncio.to_thread(
+                    self.read_after, after, 1000, record_filter
+                )
+                after = batch["next_cursor"]
+            yield batch
+            if not batch["entries"]:
+                await asyncio.sleep(poll_interval)
+
+
+log_reader = LogReader(settings.LOG_DIR)
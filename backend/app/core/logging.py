@@ -2,14 +2,41 @@
 Advanced logging and journaling configuration.
 """
 
+import atexit
+import copy
 import json
 import logging
+import queue
+import random
 import sys
-from datetime import datetime
+import threading
+import time
+from datetime import date, datetime
+from decimal import Decimal
 from pathlib import Path
-from typing import Any, Dict, Optional
-from logging.handlers import RotatingFileHandler, TimedRotatingFileHandler
-from .config import settings
+from typing import Any, Callable, Dict, Optional, Tuple
+from logging.handlers import (
+    QueueHandler,
+    QueueListener,
+    RotatingFileHandler,
+    TimedRotatingFileHandler,
+)
+from .config import on_settings_reload, settings
+from .context import current_trace_span, request_id
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is listed in requirements.txt
+    orjson = None
+
+# Argument types that can be formatted later on the listener thread as-is
+_IMMUTABLE_ARGS = (str, int, float, bool, type(None), bytes, Decimal, date)
+
+
+def _dumps(data: Dict[str, Any]) -> str:
+    if orjson is not None:
+        return orjson.dumps(data, default=str).decode("utf-8")
+    return json.dumps(data, default=str)
 
 
 class JsonFormatter(logging.Formatter):
@@ -26,15 +53,237 @@ class JsonFormatter(logging.Formatter):
             "function": record.funcName,
             "line": record.lineno,
         }
+        if getattr(record, "request_id", "-") != "-":
+            log_data["request_id"] = record.request_id
+            log_data["trace_id"] = record.trace_id
+            log_data["span_id"] = record.span_id
         if record.exc_info:
             log_data["exception"] = {
                 "type": str(record.exc_info[0]),
                 "message": str(record.exc_info[1]),
                 "traceback": self.formatException(record.exc_info),
             }
+        elif record.exc_text:
+            # Prepared by LazyQueueHandler, which keeps only the rendered text
+            log_data["exception"] = {
+                "type": getattr(record, "exc_type", ""),
+                "message": getattr(record, "exc_message", ""),
+                "traceback": record.exc_text,
+            }
         if hasattr(record, "extra_data"):
             log_data["extra"] = record.extra_data
-        return json.dumps(log_data)
+        return _dumps(log_data)
+
+
+class TraceContextFilter(logging.Filter):
+    """Adds the request ID and current trace/span IDs to log records."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        span = current_trace_span.get()
+        record.request_id = request_id.get() or "-"
+        record.trace_id = span.trace_id if span is not None else "-"
+        record.span_id = span.span_id if span is not None else "-"
+        return True
+
+
+class lazy:
+    """
+    Log argument computed only when the record is actually written.
+
+    Records dropped by the level check or by LogSampler never call it.
+
+    Example:
+        logger.debug("Creating document: %s", lazy(obj_in.model_dump))
+    """
+
+    __slots__ = ("func", "args", "_value")
+
+    def __init__(self, func: Callable[..., Any], *args: Any):
+        self.func = func
+        self.args = args
+        self._value: Optional[str] = None
+
+    def __str__(self) -> str:
+        if self._value is None:
+            self._value = str(self.func(*self.args))
+        return self._value
+
+    __repr__ = __str__
+
+
+class LogSampler(logging.Filter):
+    """
+    Sampling and rate limiting of low-severity records.
+
+    Only records at or below `max_level` are affected; warnings and errors
+    always pass. Keys are logger names, matching their child loggers too,
+    or callsites written "logger.name:function"; the most specific key
+    wins.
+
+    Args:
+        sample_rates: Share of records kept per key
+        rate_limits: Records let through per callsite and window per key;
+            the first record of the next window reports how many were
+            suppressed
+        window: Rate limit window in seconds
+        max_level: Highest level subject to sampling
+    """
+
+    def __init__(
+        self,
+        sample_rates: Optional[Dict[str, float]] = None,
+        rate_limits: Optional[Dict[str, int]] = None,
+        window: float = 1.0,
+        max_level: int = logging.INFO,
+    ):
+        super().__init__()
+        self.sample_rates = sample_rates or {}
+        self.rate_limits = rate_limits or {}
+        self.window = window
+        self.max_level = max_level
+        self.sampled_out = 0
+        self.rate_limited = 0
+        # (logger, function) -> (sample rate, rate limit)
+        self._rules: Dict[Tuple[str, str], Tuple[float, int]] = {}
+        # (logger, function) -> [window start, records passed, suppressed]
+        self._windows: Dict[Tuple[str, str], list] = {}
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _lookup(table: Dict[str, Any], name: str, function: str) -> Any:
+        value = table.get(f"{name}:{function}")
+        while value is None and name:
+            value = table.get(name)
+            name = name.rpartition(".")[0]
+        return value
+
+    def _rule(self, callsite: Tuple[str, str]) -> Tuple[float, int]:
+        rule = self._rules.get(callsite)
+        if rule is None:
+            rate = self._lookup(self.sample_rates, *callsite)
+            limit = self._lookup(self.rate_limits, *callsite)
+            rule = self._rules[callsite] = (
+                1.0 if rate is None else rate,
+                0 if limit is None else limit,
+            )
+        return rule
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.max_level:
+            return True
+        callsite = (record.name, record.funcName)
+        rate, limit = self._rule(callsite)
+        if rate < 1.0 and random.random() >= rate:
+            self.sampled_out += 1
+            return False
+        if limit <= 0:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            state = self._windows.get(callsite)
+            if state is None or now - state[0] >= self.window:
+                suppressed = state[2] if state is not None else 0
+                self._windows[callsite] = [now, 1, 0]
+            elif state[1] < limit:
+                state[1] += 1
+                return True
+            else:
+                state[2] += 1
+                self.rate_limited += 1
+                return False
+        if suppressed:
+            record.suppressed = suppressed
+            record.msg = f"{record.msg} [{suppressed} similar records suppressed]"
+        return True
+
+    def configure(
+        self,
+        sample_rates: Dict[str, float],
+        rate_limits: Dict[str, int],
+        window: float,
+        max_level: int,
+    ) -> None:
+        """Replace the rules; counters are kept."""
+        with self._lock:
+            self.sample_rates = sample_rates
+            self.rate_limits = rate_limits
+            self.window = window
+            self.max_level = max_level
+            self._rules.clear()
+            self._windows.clear()
+
+    def reset(self) -> None:
+        with self._lock:
+            self._rules.clear()
+            self._windows.clear()
+            self.sampled_out = 0
+            self.rate_limited = 0
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    Queue handler doing as little as possible on the calling thread.
+
+    The stdlib QueueHandler fully formats every record before queueing it.
+    Here records keep their message template and immutable arguments, so
+    %-formatting and JSON encoding run on the listener thread; only
+    mutable arguments are rendered up front, as they could change before
+    the listener gets to them. Tracebacks are rendered immediately since
+    they reference live frames. When the queue is full, records are
+    dropped and counted instead of blocking the event loop.
+    """
+
+    def __init__(self, log_queue: "queue.Queue[logging.LogRecord]"):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        if record.args and not (
+            isinstance(record.args, tuple)
+            and all(isinstance(arg, _IMMUTABLE_ARGS) for arg in record.args)
+        ):
+            record.msg = record.getMessage()
+            record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = _exception_formatter.formatException(
+                    record.exc_info
+                )
+            record.exc_type = str(record.exc_info[0])
+            record.exc_message = str(record.exc_info[1])
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class _LogListener(QueueListener):
+    """Listener whose stop waits for room on a full queue to flush it."""
+
+    def enqueue_sentinel(self) -> None:
+        self.queue.put(self._sentinel)
+
+
+_exception_formatter = logging.Formatter()
+_listener: Optional[QueueListener] = None
+
+
+def stop_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+        _listener = None
+
+
+atexit.register(stop_logging)
 
 
 class ContextLogger(logging.Logger):
@@ -54,6 +303,8 @@ class ContextLogger(logging.Logger):
             extra = kwargs.get("extra", {})
             extra["extra_data"] = self.context
             kwargs["extra"] = extra
+        # Skip this frame so records point at the actual caller
+        kwargs["stacklevel"] = kwargs.get("stacklevel", 1) + 1
         super()._log(level, msg, args, **kwargs)
 
 
@@ -65,24 +316,31 @@ def setup_logging(
     """
     Configure application logging with advanced features.
 
+    Records are put on a bounded queue by the calling thread and written by
+    a QueueListener thread, so console and file I/O never block the event
+    loop. Calling it again replaces the previous listener.
+
     Args:
         LOG_LEVEL: Logging level
         LOG_DIR: Directory for log files
         app_name: Application name for log files
     """
+    global _listener
     logging.setLoggerClass(ContextLogger)
     logger = logging.getLogger(app_name)
     logger.setLevel(getattr(logging, LOG_LEVEL.upper()))
     logger.handlers.clear()
+    stop_logging()
+    handlers = []
 
     console_handler = logging.StreamHandler(sys.stdout)
     console_handler.setFormatter(
         logging.Formatter(
-            "%(asctime)s - %(name)s - %(levelname)s - %(message)s",
+            "%(asctime)s - %(name)s - %(levelname)s - [%(request_id)s] %(message)s",
             datefmt="%Y-%m-%d %H:%M:%S",
         )
     )
-    logger.addHandler(console_handler)
+    handlers.append(console_handler)
 
     if LOG_DIR:
         LOG_DIR.mkdir(parents=True, exist_ok=True)
@@ -90,7 +348,7 @@ def setup_logging(
             LOG_DIR / f"{app_name}.json", maxBytes=10_485_760, backupCount=5  # 10MB
         )
         main_handler.setFormatter(JsonFormatter())
-        logger.addHandler(main_handler)
+        handlers.append(main_handler)
 
         error_handler = TimedRotatingFileHandler(
             LOG_DIR / f"{app_name}.error.log",
@@ -100,7 +358,7 @@ def setup_logging(
         )
         error_handler.setLevel(logging.ERROR)
         error_handler.setFormatter(JsonFormatter())
-        logger.addHandler(error_handler)
+        handlers.append(error_handler)
 
         access_handler = TimedRotatingFileHandler(
             LOG_DIR / f"{app_name}.access.log",
@@ -109,13 +367,69 @@ def setup_logging(
             backupCount=30,
         )
         access_handler.setFormatter(JsonFormatter())
-        logger.addHandler(access_handler)
+        handlers.append(access_handler)
+
+    # Context variables are only readable on the logging thread, so the
+    # trace filter runs in the queue handler, before the record is queued
+    queue_handler = LazyQueueHandler(queue.Queue(maxsize=settings.LOG_QUEUE_SIZE))
+    queue_handler.addFilter(
+        LogSampler(
+            settings.LOG_SAMPLE_RATES,
+            settings.LOG_RATE_LIMITS,
+            settings.LOG_RATE_LIMIT_WINDOW,
+            logging.getLevelName(settings.LOG_SAMPLING_MAX_LEVEL.upper()),
+        )
+    )
+    queue_handler.addFilter(TraceContextFilter())
+    logger.addHandler(queue_handler)
+    _listener = _LogListener(
+        queue_handler.queue, *handlers, respect_handler_level=True
+    )
+    _listener.start()
 
     if settings.DEBUG:  # Changed from settings.DEBUG
         logger.setLevel(logging.DEBUG)
         logger.debug("DEBUG logging enabled")
 
 
+def logging_stats() -> Dict[str, int]:
+    """Counts of records not written, by reason."""
+    stats = {"queue_dropped": 0, "sampled_out": 0, "rate_limited": 0}
+    for handler in logging.getLogger("app").handlers:
+        if isinstance(handler, LazyQueueHandler):
+            stats["queue_dropped"] += handler.dropped
+        for log_filter in handler.filters:
+            if isinstance(log_filter, LogSampler):
+                stats["sampled_out"] += log_filter.sampled_out
+                stats["rate_limited"] += log_filter.rate_limited
+    return stats
+
+
+@on_settings_reload
+def _apply_logging_settings(changed: Dict[str, Any]) -> None:
+    """Apply reloaded level and sampling settings to the app logger."""
+    logger = logging.getLogger("app")
+    if "LOG_LEVEL" in changed or "DEBUG" in changed:
+        level = logging.DEBUG if settings.DEBUG else settings.LOG_LEVEL.upper()
+        logger.setLevel(level)
+    if not changed.keys() & {
+        "LOG_SAMPLE_RATES",
+        "LOG_RATE_LIMITS",
+        "LOG_RATE_LIMIT_WINDOW",
+        "LOG_SAMPLING_MAX_LEVEL",
+    }:
+        return
+    for handler in logger.handlers:
+        for log_filter in handler.filters:
+            if isinstance(log_filter, LogSampler):
+                log_filter.configure(
+                    settings.LOG_SAMPLE_RATES,
+                    settings.LOG_RATE_LIMITS,
+                    settings.LOG_RATE_LIMIT_WINDOW,
+                    logging.getLevelName(settings.LOG_SAMPLING_MAX_LEVEL.upper()),
+                )
+
+
 def get_logger(name: str) -> ContextLogger:
     """Get a context-aware logger instance."""
     return logging.getLogger(name)
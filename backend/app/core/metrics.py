@@ -1,57 +1,662 @@
 """
 Performance metrics and monitoring.
+
+Counters, gauges and fixed-bucket histograms with labels, in the
+Prometheus data model. Values live in a store that is either process-local
+or, when METRICS_MULTIPROC_DIR (or PROMETHEUS_MULTIPROC_DIR) is set,
+shared by all uvicorn workers through memory-mapped files. The registry
+renders the Prometheus text format served at /metrics.
+
+Example:
+    requests_total = registry.counter(
+        "http_requests_total", "HTTP requests", ("method", "status")
+    )
+    requests_total.labels(method="GET", status="200").inc()
 """
 
+import bisect
+import json
+import math
+import os
+import re
+import threading
 import time
-from typing import Any, Dict, Optional
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
 from contextlib import contextmanager
-from statistics import mean, median
+from app.core.config import settings
 from app.core.logging import get_logger
+from app.core.metrics_store import InMemoryStore, MmapStore
 
 logger = get_logger(__name__)
 
+# Latency buckets in seconds, from 1ms to 10s
+DEFAULT_BUCKETS = (
+    0.001,
+    0.0025,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+)
+
+# How gauges of several worker processes are combined
+GAUGE_MODES = ("all", "sum", "max", "min")
+
+CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+_METRIC_NAME = re.compile(r"^[a-zA-Z_:][a-zA-Z0-9_:]*$")
+_LEGACY_NAME = re.compile(r"^([^{]+)(?:\{(.*)\})?$")
+
+
+def _sanitize(name: str) -> str:
+    """Turn a free-form metric name into a valid Prometheus name."""
+    name = re.sub(r"[^a-zA-Z0-9_:]", "_", name)
+    return name if _METRIC_NAME.match(name) else f"_{name}"
+
+
+def _format_bound(bound: float) -> str:
+    return "+Inf" if math.isinf(bound) else repr(float(bound))
+
+
+class LocalHistogram:
+    """
+    Fixed-bucket histogram of the current process only.
+
+    For in-process bookkeeping (such as per-statement timings) that is not
+    exported through the registry.
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        self.counts = [0] * (len(self.buckets) + 1)  # last slot is +Inf
+        self.count = 0
+        self.sum = 0.0
+
+    def observe(self, value: float) -> None:
+        """Record a value."""
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def quantile(self, q: float) -> float:
+        """Estimate a quantile as the upper bound of the bucket holding it."""
+        return _bucket_quantile(q, list(zip(self.buckets, self.counts)), self.count)
+
+
+def _bucket_quantile(
+    q: float, buckets: Sequence[Tuple[float, float]], count: float
+) -> float:
+    """Upper bound of the bucket holding a quantile (non-cumulative counts)."""
+    if not count:
+        return 0.0
+    rank = q * count
+    seen = 0.0
+    for bound, bucket_count in buckets:
+        seen += bucket_count
+        if seen >= rank:
+            return bound
+    return float("inf")
+
+
+class _Family:
+    """A named metric with a fixed set of label names."""
+
+    kind = ""
+    store_kind = ""
+
+    def __init__(
+        self,
+        registry: "Registry",
+        name: str,
+        documentation: str = "",
+        labelnames: Sequence[str] = (),
+    ):
+        self.registry = registry
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], Any] = {}
+        self._lock = threading.Lock()
+
+    def labels(self, **labels: Any) -> Any:
+        """Child metric for one combination of label values."""
+        if set(labels) != set(self.labelnames):
+            raise ValueError(
+                f"{self.name} expects labels {list(self.labelnames)}, "
+                f"got {sorted(labels)}"
+            )
+        values = tuple(str(labels[name]) for name in self.labelnames)
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child(
+                        dict(zip(self.labelnames, values))
+                    )
+        return child
+
+    def _key(self, sample: str, labels: Dict[str, str]) -> str:
+        return json.dumps([self.name, sample, labels], sort_keys=True)
+
+    def _new_child(self, labels: Dict[str, str]) -> Any:
+        raise NotImplementedError
+
+    def _unlabelled(self) -> Any:
+        if self.labelnames:
+            raise ValueError(f"{self.name} has labels; use .labels(...)")
+        return self.labels()
+
+
+class _CounterChild:
+    def __init__(self, family: "Counter", labels: Dict[str, str]):
+        self._store = family.registry.store
+        self._key = family._key(family.name, labels)
+
+    def inc(self, amount: float = 1.0) -> None:
+        if amount < 0:
+            raise ValueError("Counters can only be incremented")
+        self._store.inc("counter", self._key, amount)
+
+
+class Counter(_Family):
+    """Monotonically increasing value."""
+
+    kind = "counter"
+    store_kind = "counter"
+
+    def _new_child(self, labels: Dict[str, str]) -> _CounterChild:
+        return _CounterChild(self, labels)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._unlabelled().inc(amount)
+
+
+class _GaugeChild:
+    def __init__(self, family: "Gauge", labels: Dict[str, str]):
+        self._store = family.registry.store
+        self._kind = family.store_kind
+        self._key = family._key(family.name, labels)
+
+    def set(self, value: float) -> None:
+        self._store.set(self._kind, self._key, value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._store.inc(self._kind, self._key, amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._store.inc(self._kind, self._key, -amount)
+
+
+class Gauge(_Family):
+    """
+    Value that goes up and down.
+
+    Args:
+        multiprocess_mode: How values of several workers are combined:
+            "all" keeps one series per process (labelled with pid), "sum",
+            "max" and "min" merge them into one
+    """
+
+    kind = "gauge"
+
+    def __init__(self, *args: Any, multiprocess_mode: str = "all", **kwargs: Any):
+        if multiprocess_mode not in GAUGE_MODES:
+            raise ValueError(f"multiprocess_mode must be one of {GAUGE_MODES}")
+        super().__init__(*args, **kwargs)
+        self.multiprocess_mode = multiprocess_mode
+        self.store_kind = f"gauge_{multiprocess_mode}"
+
+    def _new_child(self, labels: Dict[str, str]) -> _GaugeChild:
+        return _GaugeChild(self, labels)
+
+    def set(self, value: float) -> None:
+        self._unlabelled().set(value)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._unlabelled().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._unlabelled().dec(amount)
+
+
+class _HistogramChild:
+    def __init__(self, family: "Histogram", labels: Dict[str, str]):
+        self._store = family.registry.store
+        self._bounds = family.buckets
+        self._bucket_keys = [
+            family._key(f"{family.name}_bucket", {**labels, "le": _format_bound(b)})
+            for b in family.buckets + (float("inf"),)
+        ]
+        self._sum_key = family._key(f"{family.name}_sum", labels)
+        self._count_key = family._key(f"{family.name}_count", labels)
+
+    def observe(self, value: float) -> None:
+        index = bisect.bisect_left(self._bounds, value)
+        self._store.inc("histogram", self._bucket_keys[index], 1.0)
+        self._store.inc("histogram", self._sum_key, value)
+        self._store.inc("histogram", self._count_key, 1.0)
+
+    @contextmanager
+    def time(self):
+        """Observe the duration of a block, in seconds."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start)
+
+
+class Histogram(_Family):
+    """Distribution of observed values over fixed buckets."""
+
+    kind = "histogram"
+    store_kind = "histogram"
+
+    def __init__(
+        self, *args: Any, buckets: Sequence[float] = DEFAULT_BUCKETS, **kwargs: Any
+    ):
+        super().__init__(*args, **kwargs)
+        self.buckets = tuple(sorted(float(b) for b in buckets if not math.isinf(b)))
+
+    def _new_child(self, labels: Dict[str, str]) -> _HistogramChild:
+        return _HistogramChild(self, labels)
+
+    def observe(self, value: float) -> None:
+        self._unlabelled().observe(value)
+
+    def time(self):
+        return self._unlabelled().time()
+
+
+# A collected sample: (sample name, labels, value)
+Sample = Tuple[str, Dict[str, str], float]
+
+
+class Registry:
+    """
+    Metric families sharing one value store.
+
+    Args:
+        store: InMemoryStore for one process, MmapStore for several workers
+    """
+
+    def __init__(self, store: Any):
+        self.store = store
+        self._families: Dict[str, _Family] = {}
+        self._lock = threading.Lock()
+        self._collect_hooks: List[Callable[[], Any]] = []
+
+    def on_collect(self, hook: Callable[[], Any]) -> Callable[[], Any]:
+        """Register a callable refreshing gauges right before each collection."""
+        self._collect_hooks.append(hook)
+        return hook
+
+    def _get_or_create(self, cls: type, name: str, **kwargs: Any) -> Any:
+        family = self._families.get(name)
+        if family is None:
+            with self._lock:
+                family = self._families.get(name)
+                if family is None:
+                    family = self._families[name] = cls(self, name, **kwargs)
+        if not isinstance(family, cls):
+            raise ValueError(f"Metric {name} is already registered as {family.kind}")
+        labelnames = tuple(kwargs.get("labelnames", ()))
+        if family.labelnames != labelnames:
+            raise ValueError(
+                f"Metric {name} is registered with labels {list(family.labelnames)}"
+            )
+        return family
+
+    def counter(
+        self, name: str, documentation: str = "", labelnames: Sequence[str] = ()
+    ) -> Counter:
+        return self._get_or_create(
+            Counter, name, documentation=documentation, labelnames=labelnames
+        )
+
+    def gauge(
+        self,
+        name: str,
+        documentation: str = "",
+        labelnames: Sequence[str] = (),
+        multiprocess_mode: str = "all",
+    ) -> Gauge:
+        return self._get_or_create(
+            Gauge,
+            name,
+            documentation=documentation,
+            labelnames=labelnames,
+            multiprocess_mode=multiprocess_mode,
+        )
+
+    def histogram(
+        self,
+        name: str,
+        documentation: str = "",
+        labelnames: Sequence[str] = (),
+        buckets: Sequence[float] = DEFAULT_BUCKETS,
+    ) -> Histogram:
+        return self._get_or_create(
+            Histogram,
+            name,
+            documentation=documentation,
+            labelnames=labelnames,
+            buckets=buckets,
+        )
+
+    def collect(self) -> List[Dict[str, Any]]:
+        """
+        Current values of all metrics, merged over worker processes.
+
+        Returns:
+            Families as dicts with name, type, help and samples
+        """
+        for hook in self._collect_hooks:
+            try:
+                hook()
+            except Exception as e:
+                logger.error("Metrics collect hook %r failed: %s", hook, e)
+        merged: Dict[Tuple[str, str], Dict[str, Any]] = {}
+        gauge_values: Dict[Tuple[str, str], List[Tuple[float, int]]] = defaultdict(
+            list
+        )
+        for kind, key, value, pid in self.store.items():
+            family_name, sample, labels = json.loads(key)
+            kind_name = kind.split("_", 1)[0]
+            family = merged.setdefault(
+                (family_name, kind_name),
+                {"samples": defaultdict(float), "mode": None},
+            )
+            labels_key = json.dumps([sample, labels], sort_keys=True)
+            if kind_name == "gauge":
+                family["mode"] = kind.split("_", 1)[1]
+                gauge_values[(family_name, labels_key)].append((value, pid))
+            else:
+                family["samples"][labels_key] += value
+
+        result = []
+        for (family_name, kind_name), data in sorted(merged.items()):
+            registered = self._families.get(family_name)
+            samples: List[Sample] = []
+            if kind_name == "gauge":
+                samples = self._merge_gauges(family_name, data["mode"], gauge_values)
+            elif kind_name == "histogram":
+                samples = self._cumulate(data["samples"])
+            else:
+                samples = [
+                    (*json.loads(labels_key), value)
+                    for labels_key, value in data["samples"].items()
+                ]
+            samples.sort(key=lambda s: (s[0], sorted(s[1].items())))
+            result.append(
+                {
+                    "name": family_name,
+                    "type": kind_name,
+                    "help": registered.documentation if registered else "",
+                    "samples": samples,
+                }
+            )
+        return result
+
+    def _merge_gauges(
+        self,
+        family_name: str,
+        mode: str,
+        gauge_values: Dict[Tuple[str, str], List[Tuple[float, int]]],
+    ) -> List[Sample]:
+        samples: List[Sample] = []
+        for (name, labels_key), values in gauge_values.items():
+            if name != family_name:
+                continue
+            sample, labels = json.loads(labels_key)
+            if mode == "all" and self.store.multiprocess:
+                for value, pid in values:
+                    samples.append((sample, {**labels, "pid": str(pid)}, value))
+            elif mode == "max":
+                samples.append((sample, labels, max(v for v, _ in values)))
+            elif mode == "min":
+                samples.append((sample, labels, min(v for v, _ in values)))
+            else:
+                samples.append((sample, labels, sum(v for v, _ in values)))
+        return samples
+
+    @staticmethod
+    def _cumulate(values: Dict[str, float]) -> List[Sample]:
+        """Turn per-bucket counts into Prometheus' cumulative buckets."""
+        buckets: Dict[str, List[Tuple[float, float]]] = defaultdict(list)
+        samples: List[Sample] = []
+        for labels_key, value in values.items():
+            sample, labels = json.loads(labels_key)
+            if sample.endswith("_bucket"):
+                le = labels.pop("le")
+                series = json.dumps([sample, labels], sort_keys=True)
+                buckets[series].append((float(le), value))
+            else:
+                samples.append((sample, labels, value))
+        for series, counts in buckets.items():
+            sample, labels = json.loads(series)
+            seen = 0.0
+            for bound, count in sorted(counts):
+                seen += count
+                samples.append((sample, {**labels, "le": _format_bound(bound)}, seen))
+        return samples
+
+    def generate_latest(self) -> bytes:
+        """Render all metrics in the Prometheus text exposition format."""
+        lines = []
+        for family in self.collect():
+            name = family["name"]
+            if family["help"]:
+                help_text = family["help"].replace("\\", r"\\").replace("\n", r"\n")
+                lines.append(f"# HELP {name} {help_text}")
+            lines.append(f"# TYPE {name} {family['type']}")
+            for sample, labels, value in family["samples"]:
+                if labels:
+                    rendered = ",".join(
+                        f'{k}="{_escape(v)}"' for k, v in sorted(labels.items())
+                    )
+                    lines.append(f"{sample}{{{rendered}}} {_format_value(value)}")
+                else:
+                    lines.append(f"{sample} {_format_value(value)}")
+        return ("\n".join(lines) + "\n").encode("utf-8")
+
+    def clear(self) -> None:
+        """Reset all values of the current process."""
+        self.store.clear()
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    if value == int(value):
+        return str(int(value))
+    return repr(value)
+
+
+def _create_store() -> Any:
+    directory = settings.METRICS_MULTIPROC_DIR or os.getenv(
+        "PROMETHEUS_MULTIPROC_DIR"
+    )
+    if directory:
+        logger.info("Multiprocess metrics enabled in %s", directory)
+        return MmapStore(directory)
+    return InMemoryStore()
+
+
+registry = Registry(_create_store())
+
+operation_duration = registry.histogram(
+    "app_operation_duration_seconds",
+    "Duration of timed operations (see timing())",
+    ("operation",),
+)
+
 
 class Metrics:
-    """Performance metrics collector."""
+    """
+    Performance metrics collector.
 
-    def __init__(self):
-        self.metrics: Dict[str, list[float]] = {}
-        self.counters: Dict[str, int] = {}
+    Thin name-based facade over the registry kept for existing callers.
+    Names may carry labels inline, e.g. "db_pool_in_use{pool=primary}".
+    """
+
+    def __init__(self, registry: Registry):
+        self.registry = registry
+        # Extremes of record_time() operations in this process, for get_stats()
+        self._extremes: Dict[str, Tuple[float, float]] = {}
+
+    @staticmethod
+    def _parse(name: str) -> Tuple[str, Dict[str, str]]:
+        match = _LEGACY_NAME.match(name)
+        base, inline = match.group(1), match.group(2)
+        labels = {}
+        if inline:
+            for pair in inline.split(","):
+                label, _, value = pair.partition("=")
+                labels[_sanitize(label.strip())] = value.strip().strip('"')
+        return _sanitize(base), labels
 
     def record_time(self, metric_name: str, value: float) -> None:
         """Record a timing metric."""
-        if metric_name not in self.metrics:
-            self.metrics[metric_name] = []
-        self.metrics[metric_name].append(value)
+        operation_duration.labels(operation=metric_name).observe(value)
+        low, high = self._extremes.get(metric_name, (value, value))
+        self._extremes[metric_name] = (min(low, value), max(high, value))
 
     def increment_counter(self, name: str, value: int = 1) -> None:
         """Increment a counter metric."""
-        self.counters[name] = self.counters.get(name, 0) + value
+        base, labels = self._parse(name)
+        self.registry.counter(base, labelnames=tuple(labels)).labels(**labels).inc(
+            value
+        )
+
+    def observe(
+        self, name: str, value: float, buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> None:
+        """Record a value into a fixed-bucket histogram."""
+        base, labels = self._parse(name)
+        self.registry.histogram(
+            base, labelnames=tuple(labels), buckets=buckets
+        ).labels(**labels).observe(value)
+
+    def set_gauge(self, name: str, value: float) -> None:
+        """Set a gauge to its current value."""
+        base, labels = self._parse(name)
+        self.registry.gauge(base, labelnames=tuple(labels)).labels(**labels).set(
+            value
+        )
+
+    def _find(self, family_name: str, labels: Dict[str, str]) -> List[Sample]:
+        for family in self.registry.collect():
+            if family["name"] == family_name:
+                return [
+                    sample
+                    for sample in family["samples"]
+                    if all(sample[1].get(k) == v for k, v in labels.items())
+                ]
+        return []
 
     def get_stats(self, metric_name: str) -> Dict[str, float]:
         """Get statistics for a metric."""
-        if metric_name not in self.metrics:
+        samples = self._find(operation_duration.name, {"operation": metric_name})
+        values = {sample[0]: sample[2] for sample in samples if "le" not in sample[1]}
+        count = values.get(f"{operation_duration.name}_count", 0)
+        if not count:
             return {}
-        values = self.metrics[metric_name]
+        cumulative = sorted(
+            (float(sample[1]["le"]), sample[2])
+            for sample in samples
+            if "le" in sample[1]
+        )
+        buckets = [
+            (bound, total - (cumulative[i - 1][1] if i else 0.0))
+            for i, (bound, total) in enumerate(cumulative)
+        ]
+        low, high = self._extremes.get(metric_name, (0.0, 0.0))
         return {
-            "count": len(values),
-            "mean": mean(values),
-            "median": median(values),
-            "min": min(values),
-            "max": max(values),
+            "count": count,
+            "mean": values.get(f"{operation_duration.name}_sum", 0.0) / count,
+            "median": _bucket_quantile(0.5, buckets, count),
+            "min": low,
+            "max": high,
         }
 
     def get_counter(self, name: str) -> int:
         """Get counter value."""
-        return self.counters.get(name, 0)
+        base, labels = self._parse(name)
+        return int(sum(sample[2] for sample in self._find(base, labels)))
+
+    def get_all(self) -> Dict[str, Any]:
+        """Snapshot of all counters, gauges and histograms as JSON."""
+        snapshot: Dict[str, Dict[str, Any]] = {
+            "counters": {},
+            "gauges": {},
+            "histograms": {},
+        }
+        for family in self.registry.collect():
+            section = snapshot[f"{family['type']}s"]
+            if family["type"] != "histogram":
+                for sample, labels, value in family["samples"]:
+                    section[_series_name(sample, labels)] = value
+                continue
+            series: Dict[str, Dict[str, Any]] = {}
+            for sample, labels, value in family["samples"]:
+                labels = dict(labels)
+                le = labels.pop("le", None)
+                entry = series.setdefault(
+                    _series_name(family["name"], labels), {"buckets": {}}
+                )
+                if le is not None:
+                    entry["buckets"][le] = value
+                else:
+                    entry[sample[len(family["name"]) + 1 :]] = value
+            for name, entry in series.items():
+                section[name] = _histogram_summary(entry)
+        return snapshot
 
     def reset(self) -> None:
         """Reset all metrics."""
-        self.metrics.clear()
-        self.counters.clear()
+        self.registry.clear()
+        self._extremes.clear()
+
+
+def _series_name(name: str, labels: Dict[str, str]) -> str:
+    if not labels:
+        return name
+    rendered = ",".join(f"{k}={v}" for k, v in sorted(labels.items()))
+    return f"{name}{{{rendered}}}"
 
 
-metrics = Metrics()
+def _histogram_summary(entry: Dict[str, Any]) -> Dict[str, Any]:
+    cumulative = sorted((float(le), total) for le, total in entry["buckets"].items())
+    buckets = [
+        (bound, total - (cumulative[i - 1][1] if i else 0.0))
+        for i, (bound, total) in enumerate(cumulative)
+    ]
+    count = entry.get("count", 0)
+    return {
+        "count": count,
+        "sum": entry.get("sum", 0.0),
+        "p50": _bucket_quantile(0.5, buckets, count),
+        "p95": _bucket_quantile(0.95, buckets, count),
+        "p99": _bucket_quantile(0.99, buckets, count),
+        "buckets": entry["buckets"],
+    }
+
+
+metrics = Metrics(registry)
 
 
 @contextmanager
@@ -59,6 +664,9 @@ def timing(name: str, extra: Optional[Dict[str, Any]] = None):
     """
     Context manager for timing code blocks.
 
+    The duration is observed in the app_operation_duration_seconds
+    histogram under operation=<name>.
+
     Example:
         with timing("db_query", {"table": "documents"}):
             result = db.execute(query)
@@ -0,0 +1,256 @@
+"""
+Value stores behind the metrics registry.
+
+Single-process deployments keep values in a dictionary. With several
+uvicorn workers every process writes its values to its own memory-mapped
+files in a shared directory, and collection merges the files of all
+processes, so /metrics reports the same totals whichever worker serves it.
+"""
+
+import glob
+import mmap
+import os
+import struct
+import threading
+from typing import Dict, Iterator, List, Tuple
+
+# (kind, key, value, pid); kind is "counter", "histogram" or "gauge_<mode>"
+StoredValue = Tuple[str, str, float, int]
+
+_HEADER = 8
+_INITIAL_SIZE = 1 << 16
+
+
+def _padded_length(key_length: int) -> int:
+    """Key length padded so that the value after it is 8-byte aligned."""
+    return key_length + (8 - (key_length + 4) % 8) % 8
+
+
+def read_mmap_file(path: str) -> Iterator[Tuple[str, float]]:
+    """Read every (key, value) pair of a metrics file."""
+    with open(path, "rb") as f:
+        data = f.read()
+    if len(data) < _HEADER:
+        return
+    used = struct.unpack_from("<i", data, 0)[0]
+    pos = _HEADER
+    while pos < used:
+        key_length = struct.unpack_from("<i", data, pos)[0]
+        key = data[pos + 4 : pos + 4 + key_length].decode("utf-8")
+        value_pos = pos + 4 + _padded_length(key_length)
+        (value,) = struct.unpack_from("<d", data, value_pos)
+        yield key, value
+        pos = value_pos + 8
+
+
+class MmapedDict:
+    """
+    Append-only key/float map in a memory-mapped file.
+
+    Layout: an 8-byte header holding the number of used bytes, followed by
+    entries of (int32 key length, utf-8 key padded to 8 bytes, float64).
+    Values are updated in place; readers in other processes only look at
+    entries below the used mark, which is advanced after an entry is
+    complete.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._file = open(path, "a+b")
+        size = os.fstat(self._file.fileno()).st_size
+        if size < _INITIAL_SIZE:
+            self._file.truncate(_INITIAL_SIZE)
+            size = _INITIAL_SIZE
+        self._capacity = size
+        self._map = mmap.mmap(self._file.fileno(), self._capacity)
+        self._positions: Dict[str, int] = {}
+        self._used = struct.unpack_from("<i", self._map, 0)[0]
+        if self._used == 0:
+            self._used = _HEADER
+            struct.pack_into("<i", self._map, 0, self._used)
+        else:
+            pos = _HEADER
+            while pos < self._used:
+                key_length = struct.unpack_from("<i", self._map, pos)[0]
+                key = self._map[pos + 4 : pos + 4 + key_length].decode("utf-8")
+                value_pos = pos + 4 + _padded_length(key_length)
+                self._positions[key] = value_pos
+                pos = value_pos + 8
+
+    def _position(self, key: str) -> int:
+        pos = self._positions.get(key)
+        if pos is None:
+            encoded = key.encode("utf-8")
+            padded = _padded_length(len(encoded))
+            entry = struct.pack(
+                f"<i{padded}sd", len(encoded), encoded.ljust(padded), 0.0
+            )
+            while self._used + len(entry) > self._capacity:
+                self._capacity *= 2
+                self._map.close()
+                self._file.truncate(self._capacity)
+                self._map = mmap.mmap(self._file.fileno(), self._capacity)
+            self._map[self._used : self._used + len(entry)] = entry
+            pos = self._used + len(entry) - 8
+            self._used += len(entry)
+            struct.pack_into("<i", self._map, 0, self._used)
+            self._positions[key] = pos
+        return pos
+
+    def read(self, key: str) -> float:
+        return struct.unpack_from("<d", self._map, self._position(key))[0]
+
+    def write(self, key: str, value: float) -> None:
+        struct.pack_into("<d", self._map, self._position(key), value)
+
+    def close(self) -> None:
+        self._map.close()
+        self._file.close()
+
+
+class InMemoryStore:
+    """Values of the current process only."""
+
+    multiprocess = False
+
+    def __init__(self):
+        self._values: Dict[Tuple[str, str], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, kind: str, key: str, amount: float) -> None:
+        with self._lock:
+            self._values[(kind, key)] = self._values.get((kind, key), 0.0) + amount
+
+    def set(self, kind: str, key: str, value: float) -> None:
+        with self._lock:
+            self._values[(kind, key)] = value
+
+    def items(self) -> List[StoredValue]:
+        pid = os.getpid()
+        with self._lock:
+            return [
+                (kind, key, value, pid) for (kind, key), value in self._values.items()
+            ]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._values.clear()
+
+    def mark_process_dead(self, pid: int) -> None:
+        """Nothing to clean up for a single process."""
+
+    def stale_pids(self) -> List[int]:
+        return []
+
+
+class MmapStore:
+    """
+    Values of all worker processes sharing a directory.
+
+    Each process writes "<kind>_<pid>.db" files. The directory must be
+    emptied before the server starts, as counters of previous runs would
+    otherwise be added to the new ones: start.sh runs `reset()` through
+    scripts/reset_metrics.py before uvicorn forks its workers.
+
+    Args:
+        directory: Directory shared by all workers of one deployment
+    """
+
+    multiprocess = True
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+        self._files: Dict[str, MmapedDict] = {}
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def _file(self, kind: str) -> MmapedDict:
+        pid = os.getpid()
+        if pid != self._pid:
+            # Forked after values were written: start files of the new process
+            self._files = {}
+            self._pid = pid
+        mapped = self._files.get(kind)
+        if mapped is None:
+            path = os.path.join(self.directory, f"{kind}_{pid}.db")
+            mapped = self._files[kind] = MmapedDict(path)
+        return mapped
+
+    def inc(self, kind: str, key: str, amount: float) -> None:
+        with self._lock:
+            mapped = self._file(kind)
+            mapped.write(key, mapped.read(key) + amount)
+
+    def set(self, kind: str, key: str, value: float) -> None:
+        with self._lock:
+            self._file(kind).write(key, value)
+
+    def items(self) -> List[StoredValue]:
+        values: List[StoredValue] = []
+        for path in glob.glob(os.path.join(self.directory, "*.db")):
+            kind, _, pid = os.path.basename(path)[:-3].rpartition("_")
+            try:
+                for key, value in read_mmap_file(path):
+                    values.append((kind, key, value, int(pid)))
+            except (OSError, struct.error, UnicodeDecodeError):
+                # A file being created by another worker; picked up next time
+                continue
+        return values
+
+    def clear(self) -> None:
+        """Drop the values of the current process."""
+        with self._lock:
+            for mapped in self._files.values():
+                mapped.close()
+                os.remove(mapped.path)
+            self._files = {}
+
+    def mark_process_dead(self, pid: int) -> None:
+        """Remove the gauges of an exited worker; its counters stay counted."""
+        for path in glob.glob(os.path.join(self.directory, f"gauge_*_{pid}.db")):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stale_pids(self) -> List[int]:
+        """PIDs of exited processes that left files in the directory."""
+        pids = set()
+        for path in glob.glob(os.path.join(self.directory, "*.db")):
+            pid = os.path.basename(path)[:-3].rpartition("_")[2]
+            if pid.isdigit():
+                pids.add(int(pid))
+        return sorted(pid for pid in pids if not _process_alive(pid))
+
+    def reset(self) -> int:
+        """
+        Delete the files of every process.
+
+        Only safe while no worker is running.
+
+        Returns:
+            Number of files removed
+        """
+        with self._lock:
+            for mapped in self._files.values():
+                mapped.close()
+            self._files = {}
+        removed = 0
+        for path in glob.glob(os.path.join(self.directory, "*.db")):
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
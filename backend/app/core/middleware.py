@@ -2,47 +2,199 @@
 Application middleware configuration.
 """
 
+import asyncio
 import time
 import logging
-from typing import Callable
-from fastapi import FastAPI, Request, Response
+from fastapi import FastAPI
 from fastapi.responses import JSONResponse
-from starlette.middleware.base import BaseHTTPMiddleware
+from starlette.datastructures import MutableHeaders
 from starlette.middleware.cors import CORSMiddleware
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
 from .config import settings
+from .context import current_scope, request_tasks
 from .logging import get_logger
+from .metrics import registry
+from .tracing import TracingMiddleware
 
 logger = get_logger(__name__)
 
+# Label for requests that matched no route, so unknown paths add no series
+UNMATCHED_ROUTE = "<unmatched>"
+SIZE_BUCKETS = (100, 1_000, 10_000, 100_000, 1_000_000, 10_000_000)
 
-class DebugMiddleware(BaseHTTPMiddleware):
-    """Middleware to add debug headers and logging in DEBUG mode."""
-
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
-        start_time = time.time()
-        response = await call_next(request)
-        if settings.DEBUG:
-            process_time = time.time() - start_time
-            response.headers["X-Process-Time"] = str(process_time)
-            response.headers["X-Debug-Mode"] = "Enabled"
-            logger.debug(
-                "Request: %s %s - Time: %.3fs",
-                request.method,
-                request.url.path,
-                process_time,
+http_requests = registry.counter(
+    "http_requests_total", "HTTP requests", ("method", "route", "status")
+)
+http_duration = registry.histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency until the response body is sent",
+    ("method", "route"),
+)
+http_in_progress = registry.gauge(
+    "http_requests_in_progress",
+    "HTTP requests being served",
+    ("method",),
+    multiprocess_mode="sum",
+)
+http_request_size = registry.histogram(
+    "http_request_size_bytes",
+    "HTTP request body size",
+    ("method", "route"),
+    buckets=SIZE_BUCKETS,
+)
+http_response_size = registry.histogram(
+    "http_response_size_bytes",
+    "HTTP response body size",
+    ("method", "route"),
+    buckets=SIZE_BUCKETS,
+)
+
+
+class RequestContextMiddleware:
+    """
+    Pure ASGI middleware exposing the request scope to code outside handlers.
+
+    The scope is available through a context variable within the request,
+    and through the task -> scope map for the sampling profiler.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        token = current_scope.set(scope)
+        task = asyncio.current_task()
+        request_tasks[task] = scope
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            request_tasks.pop(task, None)
+            current_scope.reset(token)
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording latency, sizes and status codes per route.
+
+    Series are labelled with the route template ("/documents/{document_id}")
+    taken from the scope once routing matched, never with the raw path.
+    The in-flight gauge is labelled by method only, as the route is not
+    known before the request reaches the router.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        start = time.perf_counter()
+        status = 500
+        request_bytes = 0
+        response_bytes = 0
+
+        async def counting_receive() -> Message:
+            nonlocal request_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                request_bytes += len(message.get("body", b""))
+            return message
+
+        async def counting_send(message: Message) -> None:
+            nonlocal status, response_bytes
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        in_progress = http_in_progress.labels(method=method)
+        in_progress.inc()
+        try:
+            await self.app(scope, counting_receive, counting_send)
+        finally:
+            in_progress.dec()
+            route = getattr(scope.get("route"), "path", None) or UNMATCHED_ROUTE
+            http_duration.labels(method=method, route=route).observe(
+                time.perf_counter() - start
+            )
+            http_requests.labels(method=method, route=route, status=status).inc()
+            http_request_size.labels(method=method, route=route).observe(
+                request_bytes
+            )
+            http_response_size.labels(method=method, route=route).observe(
+                response_bytes
             )
-        return response
 
 
-class ErrorHandlingMiddleware(BaseHTTPMiddleware):
-    """Global error handling middleware."""
+class DebugMiddleware:
+    """Pure ASGI middleware adding timing headers and request logs in DEBUG mode."""
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start_time = time.perf_counter()
+
+        async def send_with_headers(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                process_time = time.perf_counter() - start_time
+                headers = MutableHeaders(scope=message)
+                headers["X-Process-Time"] = str(process_time)
+                headers["X-Debug-Mode"] = "Enabled"
+                logger.debug(
+                    "Request: %s %s - Time: %.3fs",
+                    scope["method"],
+                    scope["path"],
+                    process_time,
+                )
+            await send(message)
+
+        await self.app(scope, receive, send_with_headers)
+
+
+class ErrorHandlingMiddleware:
+    """
+    Global error handling middleware.
+
+    Pure ASGI, so response bodies (including streamed files) are passed
+    through as they are produced. An unhandled exception becomes a JSON 500
+    when no response was started yet; once headers are sent the exception
+    is re-raised for the server to close the connection.
+    """
+
+    def __init__(self, app: ASGIApp):
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        response_started = False
+
+        async def tracking_send(message: Message) -> None:
+            nonlocal response_started
+            if message["type"] == "http.response.start":
+                response_started = True
+            await send(message)
 
-    async def dispatch(self, request: Request, call_next: Callable) -> Response:
         try:
-            return await call_next(request)
+            await self.app(scope, receive, tracking_send)
         except Exception as e:
             logger.error("Unhandled exception: %s", str(e), exc_info=True)
-            return JSONResponse(status_code=500, content={"detail": str(e)})
+            if response_started:
+                raise
+            response = JSONResponse(status_code=500, content={"detail": str(e)})
+            await response(scope, receive, send)
 
 
 def setup_middleware(app: FastAPI) -> None:
@@ -58,3 +210,9 @@ def setup_middleware(app: FastAPI) -> None:
     if settings.DEBUG:
         app.add_middleware(DebugMiddleware)
         logger.debug("Debug middleware enabled")
+    # Outside of error handling so that its 500 responses are counted
+    app.add_middleware(MetricsMiddleware)
+    # Server span and request ID; outside of error handling to see its 500s
+    app.add_middleware(TracingMiddleware)
+    # Added last so it is outermost and covers the whole request
+    app.add_middleware(RequestContextMiddleware)
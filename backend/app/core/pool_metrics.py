@@ -0,0 +1,227 @@
+"""
+Connection pool instrumentation and adaptive sizing.
+"""
+
+import asyncio
+import heapq
+import itertools
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Tuple
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import AsyncAdaptedQueuePool
+from .context import current_route
+from .logging import get_logger
+from .metrics import registry
+
+logger = get_logger(__name__)
+
+# Seconds between gauge refreshes triggered by checkouts
+GAUGE_REFRESH_INTERVAL = 1.0
+
+# Finer buckets than request latency: healthy checkouts take microseconds
+CHECKOUT_BUCKETS = (0.0001, 0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+
+checkout_wait = registry.histogram(
+    "db_pool_checkout_wait_seconds",
+    "Time spent waiting for a pool connection",
+    ("pool",),
+    buckets=CHECKOUT_BUCKETS,
+)
+checkout_timeouts = registry.counter(
+    "db_pool_checkout_timeouts_total", "Pool checkouts that timed out", ("pool",)
+)
+pool_resizes = registry.counter(
+    "db_pool_resizes_total", "Adaptive changes of max_overflow", ("pool",)
+)
+pool_gauges = {
+    gauge: registry.gauge(f"db_pool_{gauge}", f"Pool {gauge}", ("pool",))
+    for gauge in ("size", "in_use", "idle", "overflow", "max_overflow")
+}
+
+
+class InstrumentedAsyncQueuePool(AsyncAdaptedQueuePool):
+    """Async queue pool that reports how long each checkout waited."""
+
+    def _do_get(self) -> Any:
+        start = time.perf_counter()
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            pool_monitor.record_timeout(self)
+            raise
+        finally:
+            pool_monitor.record_checkout(self, time.perf_counter() - start)
+
+
+class PoolMonitor:
+    """
+    Collects checkout wait times and pool occupancy for every engine.
+
+    Args:
+        slowest: Number of slowest checkouts to keep, tagged by route
+        window: Number of recent wait samples used by the adaptive tuner
+    """
+
+    def __init__(self, slowest: int = 20, window: int = 1000):
+        self.slowest_size = slowest
+        self._slowest: List[Tuple[float, int, Dict[str, Any]]] = []
+        self._sequence = itertools.count()
+        self._recent: Dict[str, Deque[float]] = {}
+        self._window = window
+        self._pools: Dict[str, AsyncAdaptedQueuePool] = {}
+        self._tuner: Optional[asyncio.Task] = None
+        self._gauges_updated = 0.0
+
+    def register(self, name: str, pool: AsyncAdaptedQueuePool) -> None:
+        """Track a pool under a display name (e.g. "primary", "replica-0")."""
+        self._pools[name] = pool
+        pool._monitor_name = name  # pylint: disable=protected-access
+
+    def _name_of(self, pool: Any) -> str:
+        return getattr(pool, "_monitor_name", "unregistered")
+
+    def record_checkout(self, pool: Any, wait: float) -> None:
+        name = self._name_of(pool)
+        checkout_wait.labels(pool=name).observe(wait)
+        self._recent.setdefault(name, deque(maxlen=self._window)).append(wait)
+        entry = (
+            wait,
+            next(self._sequence),
+            {
+                "pool": name,
+                "route": current_route(),
+                "wait_seconds": round(wait, 6),
+                "at": time.time(),
+            },
+        )
+        if len(self._slowest) < self.slowest_size:
+            heapq.heappush(self._slowest, entry)
+        elif wait > self._slowest[0][0]:
+            heapq.heapreplace(self._slowest, entry)
+        # Keeps the per-worker gauges current in multiprocess mode, where a
+        # scrape is served, and the collect hook run, by one worker only
+        now = time.monotonic()
+        if now - self._gauges_updated >= GAUGE_REFRESH_INTERVAL:
+            self.update_gauges()
+
+    def record_timeout(self, pool: Any) -> None:
+        checkout_timeouts.labels(pool=self._name_of(pool)).inc()
+        logger.warning(
+            "Pool checkout timed out (pool=%s, route=%s)",
+            self._name_of(pool),
+            current_route(),
+        )
+
+    def recent_wait_quantile(self, name: str, q: float) -> float:
+        """Quantile of the recent checkout waits of a pool."""
+        samples = sorted(self._recent.get(name, ()))
+        if not samples:
+            return 0.0
+        return samples[min(len(samples) - 1, int(q * len(samples)))]
+
+    def update_gauges(self) -> Dict[str, Dict[str, Any]]:
+        """Set the occupancy gauges of every pool and return their values."""
+        self._gauges_updated = time.monotonic()
+        pools = {}
+        for name, pool in self._pools.items():
+            in_use = pool.checkedout()
+            gauges = {
+                "size": pool.size(),
+                "in_use": in_use,
+                "idle": pool.checkedin(),
+                "overflow": max(pool.overflow(), 0),
+                "max_overflow": pool._max_overflow,  # pylint: disable=protected-access
+                "recent_wait_p95": self.recent_wait_quantile(name, 0.95),
+            }
+            for gauge, family in pool_gauges.items():
+                family.labels(pool=name).set(gauges[gauge])
+            pools[name] = gauges
+        return pools
+
+    def snapshot(self) -> Dict[str, Any]:
+        """Occupancy gauges per pool plus the slowest checkouts."""
+        slowest = [entry[2] for entry in sorted(self._slowest, reverse=True)]
+        return {"pools": self.update_gauges(), "slowest_checkouts": slowest}
+
+    def set_max_overflow(self, max_overflow: int) -> None:
+        """Set the overflow capacity of every registered pool."""
+        for name, pool in self._pools.items():
+            pool._max_overflow = max_overflow  # pylint: disable=protected-access
+            pool_resizes.labels(pool=name).inc()
+        logger.info("Pools max_overflow set to %d", max_overflow)
+
+    @property
+    def tuner_running(self) -> bool:
+        return self._tuner is not None
+
+    def start_tuner(
+        self,
+        interval: float,
+        wait_target: float,
+        min_overflow: int,
+        max_overflow: int,
+    ) -> None:
+        """Start adaptive sizing on the running loop."""
+        if self._tuner is None:
+            self._tuner = asyncio.create_task(
+                self._tune_loop(interval, wait_target, min_overflow, max_overflow)
+            )
+
+    async def stop_tuner(self) -> None:
+        if self._tuner is not None:
+            self._tuner.cancel()
+            try:
+                await self._tuner
+            except asyncio.CancelledError:
+                pass
+            self._tuner = None
+
+    async def _tune_loop(
+        self, interval: float, wait_target: float, min_overflow: int, max_overflow: int
+    ) -> None:
+        while True:
+            await asyncio.sleep(interval)
+            for name, pool in self._pools.items():
+                self.tune(name, pool, wait_target, min_overflow, max_overflow)
+
+    def tune(
+        self,
+        name: str,
+        pool: AsyncAdaptedQueuePool,
+        wait_target: float,
+        min_overflow: int,
+        max_overflow: int,
+    ) -> None:
+        """
+        Adjust a pool's overflow capacity from its recent checkout waits.
+
+        The persistent pool keeps its configured size; what adapts is how
+        many extra connections may be opened under load. Capacity doubles
+        (within bounds) while the p95 wait exceeds the target, and shrinks
+        by one when checkouts stopped waiting and overflow is unused.
+        """
+        p95 = self.recent_wait_quantile(name, 0.95)
+        # Every tuning step judges only the waits observed since the last one
+        self._recent.get(name, deque()).clear()
+        current = pool._max_overflow  # pylint: disable=protected-access
+        if p95 > wait_target and current < max_overflow:
+            target = min(max_overflow, max(current * 2, current + 1))
+        elif p95 < wait_target / 10 and pool.overflow() <= 0 and current > min_overflow:
+            target = current - 1
+        else:
+            return
+        pool._max_overflow = target  # pylint: disable=protected-access
+        pool_resizes.labels(pool=name).inc()
+        logger.info(
+            "Adaptive pool %s: max_overflow %d -> %d (p95 wait %.4fs)",
+            name,
+            current,
+            target,
+            p95,
+        )
+
+
+pool_monitor = PoolMonitor()
+# /metrics scrapes see the occupancy at scrape time
+registry.on_collect(pool_monitor.update_gauges)
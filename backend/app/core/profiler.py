@@ -1,58 +1,254 @@
 """
 Code profiling utilities.
+
+- `timed` records how long a sync or async callable takes, split into
+  database, I/O and CPU time, into the app_span_seconds histogram.
+- `io_span` marks a block as I/O (file access, subprocesses, HTTP calls)
+  for the enclosing spans.
+- `profile` runs sampled calls under cProfile.
+
+Database time is reported by the query profiler's statement hooks through
+`add_db_time`; CPU time is what remains of a span after database and I/O
+time, so for async code it also includes time spent waiting for the
+event loop.
 """
 
+import asyncio
 import cProfile
 import pstats
 import io
+import random
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
 from typing import Any, Callable, Optional
 from functools import wraps
+from .config import settings
 from .logging import get_logger
+from .metrics import registry
+from .tracing import start_span
 
 logger = get_logger(__name__)
 
+span_seconds = registry.histogram(
+    "app_span_seconds",
+    "Time of instrumented service calls by component (total, db, io, cpu)",
+    ("span", "component"),
+)
+
+
+class Span:
+    """Time accounting of one instrumented call."""
+
+    __slots__ = ("name", "parent", "start", "db", "io", "queries")
+
+    def __init__(self, name: str, parent: Optional["Span"]):
+        self.name = name
+        self.parent = parent
+        self.start = time.perf_counter()
+        self.db = 0.0
+        self.io = 0.0
+        self.queries = 0
+
+
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+
+def add_db_time(elapsed: float) -> None:
+    """Attribute a statement's execution time to the active spans."""
+    span = _current_span.get()
+    while span is not None:
+        span.db += elapsed
+        span.queries += 1
+        span = span.parent
+
+
+@contextmanager
+def io_span():
+    """
+    Attribute the time of a block to I/O in the active spans.
+
+    Example:
+        with io_span():
+            await process.communicate()
+    """
+    span = _current_span.get()
+    if span is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        while span is not None:
+            span.io += elapsed
+            span = span.parent
+
+
+def _sampled(rate: Optional[float], default: float) -> bool:
+    rate = default if rate is None else rate
+    return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+
+def _finish(span: Span) -> None:
+    total = time.perf_counter() - span.start
+    cpu = max(total - span.db - span.io, 0.0)
+    for component, value in (
+        ("total", total),
+        ("db", span.db),
+        ("io", span.io),
+        ("cpu", cpu),
+    ):
+        span_seconds.labels(span=span.name, component=component).observe(value)
+    logger.debug(
+        "Span %s: total=%.4fs db=%.4fs (%d queries) io=%.4fs cpu=%.4fs",
+        span.name,
+        total,
+        span.db,
+        span.queries,
+        span.io,
+        cpu,
+    )
+
+
+@contextmanager
+def _record_span(name: str):
+    """Account a call as a span, also traced as a child of the current span."""
+    span = Span(name, _current_span.get())
+    token = _current_span.set(span)
+    try:
+        with start_span(name):
+            yield
+    finally:
+        _current_span.reset(token)
+        _finish(span)
+
+
+def timed(name: Optional[str] = None, sample_rate: Optional[float] = None):
+    """
+    Decorator recording the duration of sync and async callables.
+
+    Args:
+        name: Span name, defaults to the callable's qualified name
+        sample_rate: Share of calls recorded, defaults to SPAN_SAMPLE_RATE
+
+    Example:
+        >>> @timed()
+        ... async def get_tree(self, db, document_id):
+        ...     pass
+    """
+
+    def decorator(func: Callable) -> Callable:
+        span_name = name or func.__qualname__
+
+        if asyncio.iscoroutinefunction(func):
+
+            @wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                if not _sampled(sample_rate, settings.SPAN_SAMPLE_RATE):
+                    return await func(*args, **kwargs)
+                with _record_span(span_name):
+                    return await func(*args, **kwargs)
+
+            return async_wrapper
+
+        @wraps(func)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if not _sampled(sample_rate, settings.SPAN_SAMPLE_RATE):
+                return func(*args, **kwargs)
+            with _record_span(span_name):
+                return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+# cProfile supports one active profiler per process
+_profiling = False
+
 
 def profile(
-    output_file: Optional[str] = None, sort_by: str = "cumulative", lines: int = 50
+    output_file: Optional[str] = None,
+    sort_by: str = "cumulative",
+    lines: int = 50,
+    sample_rate: Optional[float] = None,
 ):
     """
     Decorator for profiling functions.
 
+    Works on sync and async callables. Only a sample of the calls is
+    profiled, and only one at a time; while an async call is profiled,
+    code of other tasks running in between shows up in its results too.
+
     Args:
         output_file: Optional file to save profile results
         sort_by: Stats sorting key
         lines: Number of lines to print
+        sample_rate: Share of calls profiled, defaults to PROFILE_SAMPLE_RATE
 
     Example:
-        >>> @profile(output_file="query_profile.txt")
-        ... def complex_query():
+        >>> @profile(output_file="query_profile.txt", sample_rate=0.1)
+        ... async def complex_query():
         ...     pass
     """
 
     def decorator(func: Callable) -> Callable:
+        def start() -> Optional[cProfile.Profile]:
+            global _profiling
+            if _profiling or not _sampled(sample_rate, settings.PROFILE_SAMPLE_RATE):
+                return None
+            _profiling = True
+            profiler = cProfile.Profile()
+            profiler.enable()
+            return profiler
+
+        def report(profiler: cProfile.Profile) -> None:
+            global _profiling
+            profiler.disable()
+            _profiling = False
+
+            # Print to string
+            stream = io.StringIO()
+            stats = pstats.Stats(profiler, stream=stream)
+            stats.sort_stats(sort_by)
+            stats.print_stats(lines)
+            profile_data = stream.getvalue()
+
+            # Log results
+            logger.info(
+                f"Profile results for {func.__name__}",
+                extra={"profile": profile_data},
+            )
+
+            # Save to file if specified
+            if output_file:
+                stats.dump_stats(output_file)
+
+        if asyncio.iscoroutinefunction(func):
+
+            @wraps(func)
+            async def async_wrapper(*args: Any, **kwargs: Any) -> Any:
+                profiler = start()
+                if profiler is None:
+                    return await func(*args, **kwargs)
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    report(profiler)
+
+            return async_wrapper
+
         @wraps(func)
         def wrapper(*args: Any, **kwargs: Any) -> Any:
-            profile = cProfile.Profile()
+            profiler = start()
+            if profiler is None:
+                return func(*args, **kwargs)
             try:
-                return profile.runcall(func, *args, **kwargs)
+                return func(*args, **kwargs)
             finally:
-                stats = pstats.Stats(profile)
-                stats.sort_stats(sort_by)
-
-                # Print to string
-                stream = io.StringIO()
-                stats.print_stats(lines)
-                profile_data = stream.getvalue()
-
-                # Log results
-                logger.info(
-                    f"Profile results for {func.__name__}",
-                    extra={"profile": profile_data},
-                )
-
-                # Save to file if specified
-                if output_file:
-                    stats.dump_stats(output_file)
+                report(profiler)
 
         return wrapper
 
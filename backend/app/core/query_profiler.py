@@ -0,0 +1,390 @@
+"""
+Statement-level query profiling.
+
+Every statement executed through a profiled engine is timed and grouped
+by its fingerprint, the SQL text with literals and bind parameters
+normalized away, so "WHERE id = 1" and "WHERE id = 2" count as one query.
+SELECTs slower than the threshold are occasionally re-run with
+EXPLAIN (ANALYZE, BUFFERS) and their plans kept in a ring buffer, which
+shows sequential scans and misestimates under real traffic.
+
+Plans are captured off the request path: the statement is queued and a
+background task explains it on its own read-only connection, skipping
+statements that call volatile functions.
+"""
+
+import asyncio
+import hashlib
+import random
+import re
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional, Set, Tuple
+from sqlalchemy import event, text
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncEngine
+from .context import current_route
+from .logging import get_logger
+from .metrics import LocalHistogram
+from .profiler import add_db_time
+from .tracing import record_span
+
+logger = get_logger(__name__)
+
+_COMMENTS = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+_STRINGS = re.compile(r"'(?:[^']|'')*'")
+_NUMBERS = re.compile(r"(?<![\w$])-?\d+(?:\.\d+)?\b")
+_PARAMS = re.compile(r"\$\d+|%\(\w+\)s|%s|(?<![:\w]):[A-Za-z_]\w*|\?")
+_IN_LISTS = re.compile(r"\(\s*\?(?:\s*,\s*\?)+\s*\)")
+_VALUES_ROWS = re.compile(r"(VALUES\s*\([^()]*\))(?:\s*,\s*\([^()]*\))+", re.IGNORECASE)
+_WHITESPACE = re.compile(r"\s+")
+_WRITES = re.compile(r"\b(INSERT|UPDATE|DELETE|MERGE|INTO)\b", re.IGNORECASE)
+_LOCKING = re.compile(
+    r"\bFOR\s+(?:NO\s+KEY\s+UPDATE|UPDATE|KEY\s+SHARE|SHARE)\b", re.IGNORECASE
+)
+_CALLS = re.compile(r"([A-Za-z_][\w$]*)\s*\(")
+
+# Key under which statement start times are kept in Connection.info
+_START_KEY = "query_profiler_start"
+# Execution option marking the profiler's own EXPLAIN connections
+_SKIP_OPTION = "query_profiler_skip"
+
+# (engine, statement, parameters, normalized, fingerprint, elapsed, route)
+PlanRequest = Tuple[AsyncEngine, str, Any, str, str, float, str]
+
+
+def normalize_sql(statement: str) -> str:
+    """
+    Normalize SQL text so statements differing only in values compare equal.
+
+    Comments are dropped, literals and bind parameters become "?", IN lists
+    and multi-row VALUES collapse to a single element, and whitespace is
+    squeezed.
+    """
+    sql = _COMMENTS.sub(" ", statement)
+    sql = _STRINGS.sub("?", sql)
+    sql = _PARAMS.sub("?", sql)
+    sql = _NUMBERS.sub("?", sql)
+    sql = _IN_LISTS.sub("(...)", sql)
+    sql = _VALUES_ROWS.sub(r"\1, ...", sql)
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+def is_read_query(normalized: str) -> bool:
+    """
+    Whether a statement is safe to re-run under EXPLAIN ANALYZE.
+
+    EXPLAIN ANALYZE executes the statement, so only SELECTs and CTEs
+    without data-modifying parts (SELECT ... INTO included) or row locks
+    qualify. Functions called by the statement are checked separately
+    against the database, see `called_functions`.
+    """
+    keyword = normalized.split(" ", 1)[0].upper()
+    if keyword not in ("SELECT", "WITH"):
+        return False
+    return not _WRITES.search(normalized) and not _LOCKING.search(normalized)
+
+
+def called_functions(normalized: str) -> Set[str]:
+    """
+    Lowercased names followed by a parenthesis, i.e. possible function calls.
+
+    Also matches keywords such as IN or VALUES, which are not found among
+    the database's functions.
+    """
+    return {name.lower() for name in _CALLS.findall(normalized)}
+
+
+def fingerprint(normalized: str) -> str:
+    """Short stable identifier of a normalized statement."""
+    return hashlib.sha1(normalized.encode("utf-8")).hexdigest()[:16]
+
+
+class QueryStats:
+    """Latency of one statement fingerprint."""
+
+    def __init__(self, normalized: str):
+        self.normalized = normalized
+        self.histogram = LocalHistogram()
+        self.max = 0.0
+        self.rows = 0
+        self.last_route = "-"
+
+    def record(self, elapsed: float, rows: int, route: str) -> None:
+        self.histogram.observe(elapsed)
+        self.max = max(self.max, elapsed)
+        if rows > 0:
+            self.rows += rows
+        self.last_route = route
+
+    def summary(self) -> Dict[str, Any]:
+        count = self.histogram.count
+        return {
+            "statement": self.normalized,
+            "count": count,
+            "total_ms": round(self.histogram.sum * 1000, 3),
+            "mean_ms": round(self.histogram.sum / count * 1000, 3) if count else 0.0,
+            "p95_ms": self.histogram.quantile(0.95) * 1000,
+            "max_ms": round(self.max * 1000, 3),
+            "rows": self.rows,
+            "last_route": self.last_route,
+        }
+
+
+class QueryProfiler:
+    """
+    Times statements of attached engines and samples plans of slow SELECTs.
+
+    Plans are only captured while the background explainer runs, see
+    `start`.
+
+    Args:
+        slow_threshold: Duration (seconds) above which a statement is slow
+        explain_sample_rate: Share of slow SELECTs re-run with EXPLAIN ANALYZE
+        buffer_size: Number of captured plans kept
+        max_fingerprints: Number of distinct statements tracked; further
+            statements are accounted under a single "other" entry
+        explain_queue_size: Sampled statements waiting for the explainer;
+            further samples are dropped
+    """
+
+    OTHER = "other"
+
+    def __init__(
+        self,
+        slow_threshold: float = 0.2,
+        explain_sample_rate: float = 0.1,
+        buffer_size: int = 50,
+        max_fingerprints: int = 500,
+        explain_queue_size: int = 10,
+    ):
+        self.slow_threshold = slow_threshold
+        self.explain_sample_rate = explain_sample_rate
+        self.max_fingerprints = max_fingerprints
+        self.enabled = True
+        self._stats: Dict[str, QueryStats] = {}
+        self._plans: Deque[Dict[str, Any]] = deque(maxlen=buffer_size)
+        self._normalized: Dict[str, str] = {}
+        self._engines: Dict[Any, AsyncEngine] = {}
+        self._explain_queue_size = explain_queue_size
+        self._queue: Optional[asyncio.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._task: Optional[asyncio.Task] = None
+        # Function name -> whether any function of that name is volatile
+        self._volatile: Dict[str, bool] = {}
+
+    def attach(self, engine: AsyncEngine) -> None:
+        """Install the timing hooks on an engine."""
+        sync_engine = engine.sync_engine
+        self._engines[sync_engine] = engine
+        event.listen(sync_engine, "before_cursor_execute", self._before_execute)
+        event.listen(sync_engine, "after_cursor_execute", self._after_execute)
+        event.listen(sync_engine, "handle_error", self._on_error)
+
+    def _before_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ) -> None:
+        conn.info.setdefault(_START_KEY, []).append(time.perf_counter())
+
+    def _on_error(self, exception_context) -> None:
+        conn = exception_context.connection
+        if conn is not None and conn.info.get(_START_KEY):
+            conn.info[_START_KEY].pop()
+
+    def _after_execute(
+        self, conn, cursor, statement, parameters, context, executemany
+    ) -> None:
+        starts = conn.info.get(_START_KEY)
+        if not starts:
+            return
+        elapsed = time.perf_counter() - starts.pop()
+        add_db_time(elapsed)
+        if not self.enabled or conn.get_execution_options().get(_SKIP_OPTION):
+            return
+        normalized = self._normalize(statement)
+        key = fingerprint(normalized)
+        stats = self._stats.get(key)
+        if stats is None:
+            if len(self._stats) >= self.max_fingerprints:
+                key = self.OTHER
+                stats = self._stats.get(key)
+            if stats is None:
+                stats = self._stats[key] = QueryStats(
+                    normalized if key != self.OTHER else "(untracked statements)"
+                )
+        end_ns = time.time_ns()
+        record_span(
+            "db.query",
+            end_ns - int(elapsed * 1e9),
+            end_ns,
+            **{"db.system": "postgresql", "db.statement": normalized},
+        )
+        route = current_route()
+        stats.record(elapsed, getattr(cursor, "rowcount", -1) or 0, route)
+
+        if (
+            elapsed >= self.slow_threshold
+            and not executemany
+            and is_read_query(normalized)
+            and random.random() < self.explain_sample_rate
+        ):
+            self._queue_plan(
+                conn.engine, statement, parameters, normalized, key, elapsed, route
+            )
+
+    def _normalize(self, statement: str) -> str:
+        """Normalize with memoization: compiled statements repeat verbatim."""
+        normalized = self._normalized.get(statement)
+        if normalized is None:
+            normalized = normalize_sql(statement)
+            if len(self._normalized) < self.max_fingerprints * 4:
+                self._normalized[statement] = normalized
+        return normalized
+
+    def _queue_plan(
+        self,
+        sync_engine: Any,
+        statement: str,
+        parameters: Any,
+        normalized: str,
+        key: str,
+        elapsed: float,
+        route: str,
+    ) -> None:
+        """Hand a slow SELECT to the explainer without waiting for it."""
+        engine = self._engines.get(sync_engine)
+        if self._queue is None or engine is None:
+            return
+        try:
+            # Cursor events of async engines run on the loop's thread
+            if asyncio.get_running_loop() is not self._loop:
+                return
+        except RuntimeError:
+            return
+        if isinstance(parameters, list):
+            parameters = tuple(parameters)
+        try:
+            self._queue.put_nowait(
+                (engine, statement, parameters, normalized, key, elapsed, route)
+            )
+        except asyncio.QueueFull:
+            logger.debug("Explain queue full, dropped plan of slow query %s", key)
+
+    def start(self) -> None:
+        """Start the background explainer on the running loop."""
+        if self._task is None:
+            self._loop = asyncio.get_running_loop()
+            self._queue = asyncio.Queue(maxsize=self._explain_queue_size)
+            self._task = asyncio.create_task(self._explain_loop())
+
+    async def stop(self) -> None:
+        """Stop the explainer; queued statements are discarded."""
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+            self._queue = None
+
+    async def _explain_loop(self) -> None:
+        while True:
+            request = await self._queue.get()
+            try:
+                await self._capture_plan(*request)
+            except Exception as e:
+                logger.warning(
+                    "Could not sample plan of slow query %s: %s", request[4], e
+                )
+
+    async def _capture_plan(
+        self,
+        engine: AsyncEngine,
+        statement: str,
+        parameters: Any,
+        normalized: str,
+        key: str,
+        elapsed: float,
+        route: str,
+    ) -> None:
+        """
+        Re-run a slow SELECT under EXPLAIN (ANALYZE, BUFFERS).
+
+        Runs on a separate connection in a read-only transaction that is
+        rolled back. Stable functions such as now() or date_trunc() cannot
+        modify the database and are fine. Statements calling a volatile
+        function, e.g. nextval(), are skipped: re-running them could have
+        effects the read-only transaction does not prevent.
+        """
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(**{_SKIP_OPTION: True})
+            await conn.exec_driver_sql("SET TRANSACTION READ ONLY")
+            unsafe = await self._volatile_calls(conn, called_functions(normalized))
+            if unsafe:
+                logger.debug(
+                    "Not explaining slow query %s: calls %s",
+                    key,
+                    ", ".join(sorted(unsafe)),
+                )
+                return
+            result = await conn.exec_driver_sql(
+                "EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) " + statement, parameters
+            )
+            plan = result.scalar()
+            await conn.rollback()
+        self._plans.append(
+            {
+                "fingerprint": key,
+                "statement": statement,
+                "duration_ms": round(elapsed * 1000, 3),
+                "route": route,
+                "captured_at": time.time(),
+                "plan": plan,
+            }
+        )
+        logger.info(
+            "Captured plan of slow query %s (%.1f ms, route=%s)",
+            key,
+            elapsed * 1000,
+            route,
+        )
+
+    async def _volatile_calls(self, conn: AsyncConnection, names: Set[str]) -> Set[str]:
+        """Names among `names` with a volatile database function."""
+        unknown = [name for name in names if name not in self._volatile]
+        if unknown:
+            result = await conn.execute(
+                text(
+                    "SELECT proname, bool_or(provolatile = 'v') FROM pg_proc "
+                    "WHERE proname = ANY(:names) GROUP BY proname"
+                ),
+                {"names": unknown},
+            )
+            found = dict(result.fetchall())
+            for name in unknown:
+                # Names without a function are keywords such as IN or VALUES
+                self._volatile[name] = found.get(name, False)
+        return {name for name in names if self._volatile[name]}
+
+    def top(self, sort: str = "total_ms", limit: int = 20) -> List[Dict[str, Any]]:
+        """Tracked statements ordered by a summary field, largest first."""
+        rows = [
+            {"fingerprint": key, **stats.summary()}
+            for key, stats in self._stats.items()
+        ]
+        rows.sort(key=lambda row: row.get(sort, 0), reverse=True)
+        return rows[:limit]
+
+    def plans(self, fingerprint_filter: Optional[str] = None) -> List[Dict[str, Any]]:
+        """Captured plans, most recent first."""
+        return [
+            plan
+            for plan in reversed(self._plans)
+            if fingerprint_filter is None or plan["fingerprint"] == fingerprint_filter
+        ]
+
+    def reset(self) -> None:
+        """Drop collected statistics and plans."""
+        self._stats.clear()
+        self._plans.clear()
+        self._normalized.clear()
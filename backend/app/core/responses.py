@@ -0,0 +1,43 @@
+"""
+Response classes for high-throughput endpoints.
+"""
+
+import json
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any
+from fastapi.responses import JSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is listed in requirements.txt
+    orjson = None
+
+
+def _default(value: Any) -> Any:
+    """Serialize types the JSON encoders do not handle natively."""
+    if isinstance(value, Decimal):
+        # Same representation Pydantic uses for Decimal in JSON mode
+        return str(value)
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+class FastJSONResponse(JSONResponse):
+    """
+    JSON response rendered straight from plain rows with orjson.
+
+    Endpoints returning this class skip `response_model` validation, so it is
+    meant for read paths whose content already matches the declared schema.
+    Falls back to the stdlib encoder when orjson is not installed.
+    """
+
+    def render(self, content: Any) -> bytes:
+        if orjson is not None:
+            return orjson.dumps(
+                content, default=_default, option=orjson.OPT_NON_STR_KEYS
+            )
+        return json.dumps(
+            content, default=_default, ensure_ascii=False, separators=(",", ":")
+        ).encode("utf-8")
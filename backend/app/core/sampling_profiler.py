@@ -0,0 +1,331 @@
+"""
+Low-overhead sampling profiler for live workers.
+
+Stacks are captured periodically instead of tracing every call, so
+profiling a production worker costs a few percent at most. Two modes are
+supported:
+
+- "cpu": where CPU time goes. When the event loop runs on the main
+  thread, a SIGPROF interval timer (ITIMER_PROF, counting process CPU
+  time) interrupts it and the signal handler records the loop thread's
+  current frame, so short bursts of work between awaits are seen too.
+  Other threads are sampled by a background thread, skipping those
+  blocked in a wait. Without the timer (loop outside the main thread,
+  Windows), the loop thread is sampled from the background thread as
+  well. That thread only gets the GIL when the loop releases it, so work
+  done in bursts shorter than the GIL switch interval (5ms) is missed.
+  The summary reports which sampler was used.
+- "wall": the await chain of every pending asyncio task, i.e. where
+  requests spend their time, including while suspended on I/O.
+
+Samples are attributed to routes through the task -> request map kept by
+RequestContextMiddleware, so a session can be limited to one endpoint.
+Results are rendered as collapsed stacks (flamegraph.pl, speedscope) or
+as a speedscope JSON file.
+"""
+
+import asyncio
+import os
+import signal
+import sys
+import threading
+import time
+from collections import Counter
+from types import FrameType
+from typing import Any, Dict, List, Optional, Tuple
+from .context import request_tasks, route_of
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+PROFILE_MODES = ("cpu", "wall")
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+Stack = Tuple[str, ...]
+
+# (file, function) of top frames of threads blocked rather than running
+_WAITING_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),
+    ("selectors.py", "select"),
+    ("queue.py", "get"),
+    ("thread.py", "_worker"),
+    ("socket.py", "accept"),
+}
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    return f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+
+
+def _is_waiting(frame: FrameType) -> bool:
+    """Whether a thread's top frame is a known blocking wait."""
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in _WAITING_FRAMES
+
+
+def _thread_stack(frame: Optional[FrameType]) -> List[str]:
+    """Frames of a thread, outermost first."""
+    labels = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        frame = frame.f_back
+    labels.reverse()
+    return labels
+
+
+def _await_chain(task: "asyncio.Task") -> List[str]:
+    """Logical stack of a task: its coroutine and everything it awaits."""
+    labels = []
+    coro: Any = task.get_coro()
+    while coro is not None:
+        frame = (
+            getattr(coro, "cr_frame", None)
+            or getattr(coro, "gi_frame", None)
+            or getattr(coro, "ag_frame", None)
+        )
+        if frame is None:
+            break
+        labels.append(_frame_label(frame))
+        coro = (
+            getattr(coro, "cr_await", None)
+            or getattr(coro, "gi_yieldfrom", None)
+            or getattr(coro, "ag_await", None)
+        )
+    return labels
+
+
+class ProfileSession:
+    """
+    One sampling run against an event loop.
+
+    Args:
+        loop: Event loop whose tasks and thread are sampled
+        mode: "cpu" or "wall"
+        interval: Seconds between samples
+        route: Optional route template; other samples are discarded
+        include_idle: Keep cpu samples taken while no task was running
+    """
+
+    def __init__(
+        self,
+        loop: asyncio.AbstractEventLoop,
+        mode: str = "cpu",
+        interval: float = 0.005,
+        route: Optional[str] = None,
+        include_idle: bool = False,
+    ):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"mode must be one of: {', '.join(PROFILE_MODES)}")
+        self.loop = loop
+        self.mode = mode
+        self.interval = interval
+        self.route = route
+        self.include_idle = include_idle
+        self.stacks: Counter = Counter()
+        self.samples_taken = 0
+        self.timer_ticks = 0
+        self.started_at = 0.0
+        self.duration = 0.0
+        self._loop_thread = threading.get_ident()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # Samples of the background thread, merged into stacks on stop
+        self._thread_stacks: Counter = Counter()
+        self._use_timer = (
+            mode == "cpu"
+            and hasattr(signal, "setitimer")
+            and threading.current_thread() is threading.main_thread()
+        )
+        self._previous_handler: Any = None
+
+    @property
+    def sampler(self) -> str:
+        return "itimer" if self._use_timer else "thread"
+
+    def start(self) -> None:
+        """Start sampling; must be called from the event loop thread."""
+        self.started_at = time.time()
+        if self._use_timer:
+            self._previous_handler = signal.signal(signal.SIGPROF, self._on_sigprof)
+            # Restart interrupted system calls instead of failing them with EINTR
+            signal.siginterrupt(signal.SIGPROF, False)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        self._thread = threading.Thread(
+            target=self._run, name="sampling-profiler", daemon=True
+        )
+        self._thread.start()
+
+    def stop(self) -> None:
+        if self._use_timer:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, self._previous_handler or signal.SIG_DFL)
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.stacks.update(self._thread_stacks)
+        self._thread_stacks.clear()
+        self.duration = time.time() - self.started_at
+
+    def _on_sigprof(self, signum: int, frame: Optional[FrameType]) -> None:
+        """Record the loop thread's frame; runs on the main thread."""
+        self.timer_ticks += 1
+        if frame is not None:
+            self._record_loop_frame(frame, self.stacks)
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        next_tick = time.perf_counter()
+        while not self._stop.is_set():
+            try:
+                if self.mode == "cpu":
+                    self._sample_threads(own)
+                else:
+                    self._sample_tasks()
+                self.samples_taken += 1
+            except Exception as e:  # never let a racy read end the session
+                logger.debug("Profiler sample skipped: %s", e)
+            next_tick += self.interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                self._stop.wait(delay)
+            else:
+                next_tick = time.perf_counter()
+
+    def _route_of_task(self, task: Optional["asyncio.Task"]) -> Optional[str]:
+        scope = request_tasks.get(task) if task is not None else None
+        return route_of(scope) if scope is not None else None
+
+    def _record_loop_frame(self, frame: FrameType, stacks: Counter) -> None:
+        task = asyncio.current_task(self.loop)
+        if task is None and not self.include_idle:
+            return
+        route = self._route_of_task(task)
+        if self.route is not None and route != self.route:
+            return
+        root = route or ("[idle]" if task is None else "[background]")
+        stacks[(root, *_thread_stack(frame))] += 1
+
+    def _sample_threads(self, own: int) -> None:
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        for ident, frame in sys._current_frames().items():
+            if ident == own:
+                continue
+            if ident == self._loop_thread:
+                if not self._use_timer:
+                    self._record_loop_frame(frame, self._thread_stacks)
+                continue
+            # Threadpool work (sync endpoints, to_thread) has no route
+            if self.route is not None or _is_waiting(frame):
+                continue
+            root = f"[thread {names.get(ident, ident)}]"
+            self._thread_stacks[(root, *_thread_stack(frame))] += 1
+
+    def _sample_tasks(self) -> None:
+        for task in asyncio.all_tasks(self.loop):
+            route = self._route_of_task(task)
+            if self.route is not None and route != self.route:
+                continue
+            stack = _await_chain(task)
+            if stack:
+                self.stacks[(route or "[background]", *stack)] += 1
+
+    def to_collapsed(self) -> str:
+        """Collapsed stacks: "root;frame;frame count" per line."""
+        return "".join(
+            f"{';'.join(stack)} {count}\n"
+            for stack, count in self.stacks.most_common()
+        )
+
+    def to_speedscope(self, name: str = "profile") -> Dict[str, Any]:
+        """Speedscope file with one sampled profile weighted in seconds."""
+        frames: List[Dict[str, Any]] = []
+        index: Dict[str, int] = {}
+        samples, weights = [], []
+        for stack, count in self.stacks.items():
+            sample = []
+            for label in stack:
+                if label not in index:
+                    index[label] = len(frames)
+                    func, _, location = label.partition(" (")
+                    file, _, line = location.rstrip(")").partition(":")
+                    frame: Dict[str, Any] = {"name": func}
+                    if file:
+                        frame["file"] = file
+                    if line.isdigit():
+                        frame["line"] = int(line)
+                    frames.append(frame)
+                sample.append(index[label])
+            samples.append(sample)
+            weights.append(count * self.interval)
+        return {
+            "$schema": SPEEDSCOPE_SCHEMA,
+            "name": name,
+            "exporter": "app.core.sampling_profiler",
+            "shared": {"frames": frames},
+            "profiles": [
+                {
+                    "type": "sampled",
+                    "name": name,
+                    "unit": "seconds",
+                    "startValue": 0,
+                    "endValue": sum(weights),
+                    "samples": samples,
+                    "weights": weights,
+                }
+            ],
+        }
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "mode": self.mode,
+            "sampler": self.sampler if self.mode == "cpu" else "thread",
+            "route": self.route,
+            "interval_ms": self.interval * 1000,
+            "duration_s": round(self.duration, 3),
+            "ticks": self.samples_taken,
+            "timer_ticks": self.timer_ticks,
+            "samples": sum(self.stacks.values()),
+            "distinct_stacks": len(self.stacks),
+        }
+
+
+_session_lock = asyncio.Lock()
+
+
+async def profile_for(
+    seconds: float,
+    mode: str = "cpu",
+    interval: float = 0.005,
+    route: Optional[str] = None,
+    include_idle: bool = False,
+) -> ProfileSession:
+    """
+    Sample the running worker for a number of seconds.
+
+    Only one session runs per worker at a time.
+
+    Raises:
+        RuntimeError: If another session is in progress
+    """
+    if _session_lock.locked():
+        raise RuntimeError("A profiling session is already running")
+    async with _session_lock:
+        session = ProfileSession(
+            asyncio.get_running_loop(), mode, interval, route, include_idle
+        )
+        session.start()
+        logger.info(
+            "Profiling worker %d for %.1fs (mode=%s, route=%s)",
+            os.getpid(),
+            seconds,
+            mode,
+            route or "*",
+        )
+        try:
+            await asyncio.sleep(seconds)
+        finally:
+            session.stop()
+        return session
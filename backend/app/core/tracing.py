@@ -0,0 +1,596 @@
+"""
+Request-scoped tracing compatible with OpenTelemetry.
+
+Spans follow the OpenTelemetry data model (trace and span IDs, parent
+links, attributes, events, status) and propagate through the W3C
+`traceparent` header. Finished spans go to the configured exporters:
+
+- "memory": ring buffer behind /admin/traces, grouped into traces
+- "file": JSON lines appended to TRACE_FILE
+- "otlp": OTLP/HTTP JSON to a collector, by default http://localhost:4318
+
+Example:
+    with start_span("docx.render", template=template_name):
+        doc.render(data)
+"""
+
+import json
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+import uuid
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Deque, Dict, Iterator, List, Optional, Tuple
+from .config import settings
+from .context import current_trace_span as _current_span
+from .context import request_id as request_id_var
+from .logging import get_logger
+
+logger = get_logger(__name__)
+
+# OTLP span kinds and status codes
+SPAN_KIND_INTERNAL = 1
+SPAN_KIND_SERVER = 2
+SPAN_KIND_CLIENT = 3
+STATUS_UNSET = 0
+STATUS_OK = 1
+STATUS_ERROR = 2
+
+TRACEPARENT_HEADER = "traceparent"
+REQUEST_ID_HEADER = "X-Request-ID"
+
+
+def _new_trace_id() -> str:
+    return f"{random.getrandbits(128):032x}"
+
+
+def _new_span_id() -> str:
+    return f"{random.getrandbits(64):016x}"
+
+
+class Span:
+    """A timed operation within a trace."""
+
+    __slots__ = (
+        "name",
+        "trace_id",
+        "span_id",
+        "parent_id",
+        "kind",
+        "sampled",
+        "start_ns",
+        "end_ns",
+        "attributes",
+        "events",
+        "status",
+        "status_message",
+    )
+
+    def __init__(
+        self,
+        name: str,
+        trace_id: str,
+        parent_id: Optional[str],
+        sampled: bool,
+        kind: int = SPAN_KIND_INTERNAL,
+        start_ns: Optional[int] = None,
+    ):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _new_span_id()
+        self.parent_id = parent_id
+        self.kind = kind
+        self.sampled = sampled
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = 0
+        self.attributes: Dict[str, Any] = {}
+        self.events: List[Tuple[int, str, Dict[str, Any]]] = []
+        self.status = STATUS_UNSET
+        self.status_message = ""
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        if self.sampled:
+            self.attributes[key] = value
+
+    def add_event(self, name: str, **attributes: Any) -> None:
+        if self.sampled:
+            self.events.append((time.time_ns(), name, attributes))
+
+    def record_exception(self, exc: BaseException) -> None:
+        self.status = STATUS_ERROR
+        self.status_message = f"{type(exc).__name__}: {exc}"
+        self.add_event("exception", type=type(exc).__name__, message=str(exc))
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    @property
+    def duration_ms(self) -> float:
+        return (self.end_ns - self.start_ns) / 1_000_000 if self.end_ns else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_id": self.parent_id,
+            "kind": self.kind,
+            "start_ns": self.start_ns,
+            "end_ns": self.end_ns,
+            "duration_ms": round(self.duration_ms, 3),
+            "attributes": self.attributes,
+            "events": [
+                {"time_ns": at, "name": name, "attributes": attributes}
+                for at, name, attributes in self.events
+            ],
+            "status": self.status,
+            "status_message": self.status_message,
+        }
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def parse_traceparent(value: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """Parse a W3C traceparent header into (trace_id, parent_id, sampled)."""
+    if not value:
+        return None
+    parts = value.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    version, trace_id, parent_id, flags = parts[:4]
+    try:
+        int(trace_id, 16), int(parent_id, 16)
+        sampled = bool(int(flags, 16) & 0x01)
+    except ValueError:
+        return None
+    if version == "ff" or trace_id == "0" * 32 or parent_id == "0" * 16:
+        return None
+    return trace_id, parent_id, sampled
+
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex
+
+
+class InMemoryExporter:
+    """Keeps the most recent finished spans for the admin API."""
+
+    def __init__(self, max_spans: int = 2000):
+        self._spans: Deque[Span] = deque(maxlen=max_spans)
+
+    def export(self, spans: List[Span]) -> None:
+        self._spans.extend(spans)
+
+    def traces(
+        self, limit: int = 20, min_duration_ms: float = 0.0
+    ) -> List[Dict[str, Any]]:
+        """Summaries of recent traces with a finished root span, newest first."""
+        summaries = []
+        for span in reversed(self._spans):
+            if span.parent_id is not None and span.kind != SPAN_KIND_SERVER:
+                continue
+            if span.duration_ms < min_duration_ms:
+                continue
+            summaries.append(
+                {
+                    "trace_id": span.trace_id,
+                    "name": span.name,
+                    "start_ns": span.start_ns,
+                    "duration_ms": round(span.duration_ms, 3),
+                    "status": span.status,
+                    "spans": sum(1 for s in self._spans if s.trace_id == span.trace_id),
+                }
+            )
+            if len(summaries) >= limit:
+                break
+        return summaries
+
+    def waterfall(self, trace_id: str) -> List[Dict[str, Any]]:
+        """Spans of a trace ordered by start, with offsets and nesting depth."""
+        spans = sorted(
+            (s for s in self._spans if s.trace_id == trace_id),
+            key=lambda s: s.start_ns,
+        )
+        if not spans:
+            return []
+        by_id = {s.span_id: s for s in spans}
+        origin = spans[0].start_ns
+
+        def depth(span: Span) -> int:
+            level = 0
+            while span.parent_id in by_id:
+                span = by_id[span.parent_id]
+                level += 1
+            return level
+
+        return [
+            {
+                **span.to_dict(),
+                "offset_ms": round((span.start_ns - origin) / 1_000_000, 3),
+                "depth": depth(span),
+            }
+            for span in spans
+        ]
+
+    def shutdown(self) -> None:
+        """Nothing to flush."""
+
+
+class JsonLinesFileExporter:
+    """Appends finished spans to a file, one JSON object per line."""
+
+    def __init__(self, path: str):
+        self.path = path
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+    def export(self, spans: List[Span]) -> None:
+        with open(self.path, "a", encoding="utf-8") as f:
+            for span in spans:
+                f.write(json.dumps(span.to_dict(), default=str) + "\n")
+
+    def shutdown(self) -> None:
+        """Nothing to flush; every batch is written when exported."""
+
+
+def _otlp_value(value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        return {"boolValue": value}
+    if isinstance(value, int):
+        return {"intValue": str(value)}
+    if isinstance(value, float):
+        return {"doubleValue": value}
+    return {"stringValue": str(value)}
+
+
+def _otlp_attributes(attributes: Dict[str, Any]) -> List[Dict[str, Any]]:
+    return [{"key": k, "value": _otlp_value(v)} for k, v in attributes.items()]
+
+
+class OTLPHttpExporter:
+    """
+    Sends spans to an OpenTelemetry collector over OTLP/HTTP with JSON.
+
+    Args:
+        endpoint: Traces endpoint, e.g. http://localhost:4318/v1/traces
+        service_name: Value of the service.name resource attribute
+        timeout: Seconds to wait for the collector
+    """
+
+    def __init__(self, endpoint: str, service_name: str, timeout: float = 5.0):
+        self.endpoint = endpoint
+        self.service_name = service_name
+        self.timeout = timeout
+
+    def _payload(self, spans: List[Span]) -> Dict[str, Any]:
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {
+                        "attributes": _otlp_attributes(
+                            {
+                                "service.name": self.service_name,
+                                "process.pid": os.getpid(),
+                            }
+                        )
+                    },
+                    "scopeSpans": [
+                        {
+                            "scope": {"name": "app.core.tracing"},
+                            "spans": [
+                                {
+                                    "traceId": span.trace_id,
+                                    "spanId": span.span_id,
+                                    "parentSpanId": span.parent_id or "",
+                                    "name": span.name,
+                                    "kind": span.kind,
+                                    "startTimeUnixNano": str(span.start_ns),
+                                    "endTimeUnixNano": str(span.end_ns),
+                                    "attributes": _otlp_attributes(span.attributes),
+                                    "events": [
+                                        {
+                                            "timeUnixNano": str(at),
+                                            "name": name,
+                                            "attributes": _otlp_attributes(attrs),
+                                        }
+                                        for at, name, attrs in span.events
+                                    ],
+                                    "status": {
+                                        "code": span.status,
+                                        "message": span.status_message,
+                                    },
+                                }
+                                for span in spans
+                            ],
+                        }
+                    ],
+                }
+            ]
+        }
+
+    def export(self, spans: List[Span]) -> None:
+        request = urllib.request.Request(
+            self.endpoint,
+            data=json.dumps(self._payload(spans), default=str).encode("utf-8"),
+            headers={"Content-Type": "application/json"},
+            method="POST",
+        )
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            response.read()
+
+    def shutdown(self) -> None:
+        """Nothing to flush; every batch is sent when exported."""
+
+
+class BatchSpanProcessor:
+    """
+    Hands finished spans to slow exporters from a background thread.
+
+    Spans are queued without blocking the event loop and exported in
+    batches; when the queue is full, spans are dropped and counted.
+    """
+
+    def __init__(
+        self,
+        exporters: List[Any],
+        max_queue: int = 10_000,
+        batch_size: int = 512,
+        interval: float = 1.0,
+    ):
+        self.exporters = exporters
+        self.batch_size = batch_size
+        self.interval = interval
+        self.dropped = 0
+        self._queue: "queue.Queue[Span]" = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def on_end(self, span: Span) -> None:
+        if self._thread is None:
+            self._start()
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            self.dropped += 1
+
+    def _start(self) -> None:
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(
+                    target=self._run, name="trace-exporter", daemon=True
+                )
+                self._thread.start()
+
+    def _drain(self) -> List[Span]:
+        batch: List[Span] = []
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _export(self, batch: List[Span]) -> None:
+        for exporter in self.exporters:
+            try:
+                exporter.export(batch)
+            except Exception as e:
+                logger.warning(
+                    "Trace exporter %s failed: %s", type(exporter).__name__, e
+                )
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.interval):
+            batch = self._drain()
+            while batch:
+                self._export(batch)
+                batch = self._drain()
+
+    def shutdown(self) -> None:
+        """Stop the thread and export what is still queued."""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        batch = self._drain()
+        while batch:
+            self._export(batch)
+            batch = self._drain()
+        for exporter in self.exporters:
+            exporter.shutdown()
+
+
+class Tracer:
+    """
+    Creates spans and routes finished spans to the exporters.
+
+    Args:
+        sample_rate: Share of new traces recorded; incoming traceparent
+            headers decide for propagated traces
+        memory: In-memory exporter for the admin API, if enabled
+        processor: Batch processor for file and OTLP exporters, if any
+    """
+
+    def __init__(
+        self,
+        sample_rate: float = 1.0,
+        memory: Optional[InMemoryExporter] = None,
+        processor: Optional[BatchSpanProcessor] = None,
+        enabled: bool = True,
+    ):
+        self.sample_rate = sample_rate
+        self.memory = memory
+        self.processor = processor
+        self.enabled = enabled
+
+    def _sample(self) -> bool:
+        return self.sample_rate >= 1.0 or random.random() < self.sample_rate
+
+    def new_span(
+        self,
+        name: str,
+        parent: Optional[Span] = None,
+        remote: Optional[Tuple[str, str, bool]] = None,
+        kind: int = SPAN_KIND_INTERNAL,
+    ) -> Span:
+        if remote is not None:
+            trace_id, parent_id, sampled = remote
+        elif parent is not None:
+            trace_id, parent_id, sampled = (
+                parent.trace_id,
+                parent.span_id,
+                parent.sampled,
+            )
+        else:
+            trace_id, parent_id, sampled = _new_trace_id(), None, self._sample()
+        return Span(name, trace_id, parent_id, sampled and self.enabled, kind)
+
+    def end(self, span: Span, end_ns: Optional[int] = None) -> None:
+        span.end_ns = end_ns or time.time_ns()
+        if not span.sampled:
+            return
+        if self.memory is not None:
+            self.memory.export([span])
+        if self.processor is not None:
+            self.processor.on_end(span)
+
+    def shutdown(self) -> None:
+        if self.processor is not None:
+            self.processor.shutdown()
+
+
+def _create_tracer() -> Tracer:
+    exporters = settings.TRACE_EXPORTERS
+    memory = (
+        InMemoryExporter(settings.TRACE_BUFFER_SIZE) if "memory" in exporters else None
+    )
+    batched: List[Any] = []
+    if "file" in exporters:
+        batched.append(JsonLinesFileExporter(settings.TRACE_FILE))
+    if "otlp" in exporters:
+        batched.append(
+            OTLPHttpExporter(settings.OTLP_TRACES_ENDPOINT, settings.project_name)
+        )
+    return Tracer(
+        sample_rate=settings.TRACE_SAMPLE_RATE,
+        memory=memory,
+        processor=BatchSpanProcessor(batched) if batched else None,
+        enabled=settings.TRACING_ENABLED,
+    )
+
+
+tracer = _create_tracer()
+
+
+@contextmanager
+def start_span(
+    name: str, kind: int = SPAN_KIND_INTERNAL, **attributes: Any
+) -> Iterator[Span]:
+    """
+    Run a block as a child span of the current span.
+
+    Exceptions mark the span as failed and are re-raised.
+    """
+    span = tracer.new_span(name, parent=_current_span.get(), kind=kind)
+    for key, value in attributes.items():
+        span.set_attribute(key, value)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.record_exception(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        tracer.end(span)
+
+
+def record_span(
+    name: str, start_ns: int, end_ns: int, **attributes: Any
+) -> Optional[Span]:
+    """Record an already finished operation as a child of the current span."""
+    parent = _current_span.get()
+    if parent is None or not parent.sampled:
+        return None
+    span = tracer.new_span(name, parent=parent, kind=SPAN_KIND_CLIENT)
+    span.start_ns = start_ns
+    for key, value in attributes.items():
+        span.set_attribute(key, value)
+    tracer.end(span, end_ns)
+    return span
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware opening a server span and request ID per request.
+
+    Continues the caller's trace from its traceparent header, reuses an
+    incoming X-Request-ID (or generates one), and returns both headers on
+    the response. Sending the response body is visible as the time
+    between the response.start and response.end events.
+    """
+
+    def __init__(self, app: Any):
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = {k.decode("latin-1").lower(): v for k, v in scope["headers"]}
+        remote = parse_traceparent(
+            headers.get(TRACEPARENT_HEADER, b"").decode("latin-1")
+        )
+        request_id = (
+            headers.get(REQUEST_ID_HEADER.lower(), b"").decode("latin-1")[:128]
+            or new_request_id()
+        )
+        span = tracer.new_span(
+            f"{scope['method']} {scope['path']}", remote=remote, kind=SPAN_KIND_SERVER
+        )
+        span.set_attribute("http.method", scope["method"])
+        span.set_attribute("http.target", scope["path"])
+        span.set_attribute("request.id", request_id)
+        span_token = _current_span.set(span)
+        request_token = request_id_var.set(request_id)
+
+        async def traced_send(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                span.set_attribute("http.status_code", message["status"])
+                if message["status"] >= 500:
+                    span.status = STATUS_ERROR
+                message.setdefault("headers", [])
+                message["headers"] = [
+                    *message["headers"],
+                    (b"traceparent", span.traceparent.encode("latin-1")),
+                    (b"x-request-id", request_id.encode("latin-1")),
+                ]
+                span.add_event("response.start")
+            elif message["type"] == "http.response.body" and not message.get(
+                "more_body", False
+            ):
+                span.add_event("response.end")
+            await send(message)
+
+        try:
+            await self.app(scope, receive, traced_send)
+        except BaseException as e:
+            span.record_exception(e)
+            raise
+        finally:
+            route = getattr(scope.get("route"), "path", None)
+            if route:
+                span.name = f"{scope['method']} {route}"
+                span.set_attribute("http.route", route)
+            request_id_var.reset(request_token)
+            _current_span.reset(span_token)
+            tracer.end(span)
@@ -3,12 +3,9 @@ FastAPI application factory and configuration.
 """
 
 import logging
-import os
-from dotenv import load_dotenv
-from typing import Callable
-from fastapi import FastAPI, Request
-from fastapi.middleware.cors import CORSMiddleware
-from app.core.config import settings  # Updated import
+from fastapi import FastAPI
+from app.core.config import settings
+from app.core.events import create_start_app_handler, create_stop_app_handler
 from app.core.logging import setup_logging
 from app.core.middleware import setup_middleware
 from app.routers import (
@@ -16,14 +13,10 @@ from app.routers import (
     stats_router,
     pdf_router,
     admin_router,
+    metrics_router,
     template_router,
 )
 
-# Load .env explicitly before imports (optional if already in config.py)
-BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-ENV_FILE_PATH = os.path.join(BASE_DIR, ".env")
-load_dotenv(dotenv_path=ENV_FILE_PATH, verbose=True)
-
 logger = logging.getLogger(__name__)
 
 
@@ -34,6 +27,7 @@ def register_routes(app: FastAPI) -> None:
         stats_router,
         pdf_router,
         admin_router,
+        metrics_router,
         template_router,
     ]
     for router in routers:
@@ -56,21 +50,16 @@ def create_app() -> FastAPI:
         docs_url="/docs" if settings.DEBUG else None,
     )
 
-    # Configure CORS
-    app.add_middleware(
-        CORSMiddleware,
-        allow_origins=settings.cors_origins,
-        allow_credentials=settings.cors_allow_credentials,
-        allow_methods=settings.cors_allow_methods,
-        allow_headers=settings.cors_allow_headers,
-    )
-
     # Register routes
     register_routes(app)
 
-    # Setup middlewares
+    # Setup middlewares (CORS, error handling, metrics, request context)
     setup_middleware(app)
 
+    # Lifecycle handlers (replica health checks, pool disposal)
+    app.add_event_handler("startup", create_start_app_handler(app))
+    app.add_event_handler("shutdown", create_stop_app_handler(app))
+
     return app
 
 
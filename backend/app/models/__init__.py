@@ -6,10 +6,12 @@ from .user import User
 from .document import Document
 from .template import Template
 from .journal import JournalEntry
+from .stats import DocumentMonthlyStats
 
 __all__ = [
     "User",
     "Document",
     "Template",
     "JournalEntry",
+    "DocumentMonthlyStats",
 ]
@@ -3,12 +3,16 @@ Generic document model definition.
 """
 
 from datetime import date
+from decimal import Decimal
 from typing import List, Optional, TYPE_CHECKING
 from sqlalchemy import (
+    Computed,
     String,
     Date,
     JSON,
+    Numeric,
     ForeignKey,
+    Index,
     UniqueConstraint,
 )  # Added ForeignKeyfrom sqlalchemy.orm import Mapped, mapped_column, relationship
 from sqlalchemy.orm import Mapped, mapped_column, relationship  # Added mapped_column
@@ -17,6 +21,18 @@ from app.core.database import Base
 if TYPE_CHECKING:
     from .document import Document  # For self-referencing relationships
 
+# Only plain decimal strings are treated as monetary amounts
+AMOUNT_PATTERN = r"^\s*-?[0-9]+(\.[0-9]+)?\s*$"
+
+# ISO 4217 code for "no currency", used when dynamic_fields has none
+NO_CURRENCY = "XXX"
+
+TOTAL_PRICE_SQL = (
+    "CASE WHEN (dynamic_fields->>'total_price') ~ '" + AMOUNT_PATTERN + "' "
+    "THEN (dynamic_fields->>'total_price')::numeric END"
+)
+CURRENCY_SQL = "NULLIF(upper(left(btrim(dynamic_fields->>'currency'), 10)), '')"
+
 
 class Document(Base):
     """
@@ -29,6 +45,8 @@ class Document(Base):
         created_date: Date of creation
         dynamic_fields: JSON field for storing type-specific data
         parent_id: Optional reference to a parent document
+        total_price: Numeric total_price from dynamic_fields (generated, NULL if malformed)
+        currency: Upper-cased currency from dynamic_fields (generated)
     """
 
     __tablename__ = "documents"
@@ -41,12 +59,19 @@ class Document(Base):
     created_date: Mapped[date] = mapped_column(Date, nullable=False)
     dynamic_fields: Mapped[dict] = mapped_column(JSON, nullable=True, default={})
     parent_id: Mapped[Optional[int]] = mapped_column(
-        ForeignKey("documents.id", ondelete="CASCADE"), nullable=True
+        ForeignKey("documents.id", ondelete="CASCADE"), nullable=True, index=True
+    )
+
+    total_price: Mapped[Optional[Decimal]] = mapped_column(
+        Numeric, Computed(TOTAL_PRICE_SQL, persisted=True)
+    )
+    currency: Mapped[Optional[str]] = mapped_column(
+        String(10), Computed(CURRENCY_SQL, persisted=True)
     )
 
     # Self-referential relationship for parent/child documents
     children: Mapped[List["Document"]] = relationship(
-        back_populates="parent", cascade="all, delete-orphan"
+        back_populates="parent", cascade="all, delete-orphan", passive_deletes=True
     )
     parent: Mapped[Optional["Document"]] = relationship(
         back_populates="children", remote_side=[id]
@@ -54,4 +79,11 @@ class Document(Base):
 
     __table_args__ = (
         UniqueConstraint("document_type", "reference_number", name="uq_doc_type_ref"),
+        # Covers per-type, per-currency totals as index-only aggregates
+        Index(
+            "ix_documents_type_currency_total",
+            "document_type",
+            "currency",
+            "total_price",
+        ),
     )
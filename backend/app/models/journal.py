@@ -4,15 +4,24 @@ Journal model for audit logging.
 
 from datetime import datetime
 from typing import Dict, Any, Optional
-from sqlalchemy import String, DateTime, Integer, ForeignKey, JSON
-from sqlalchemy.orm import Mapped, mapped_column, relationship
+from sqlalchemy import BigInteger, DateTime, Index, Integer, JSON, Sequence, String
+from sqlalchemy import func
+from sqlalchemy.orm import Mapped, mapped_column
 from app.core.database import Base
 
+journal_id_seq = Sequence("journal_entries_id_seq")
+
 
 class JournalEntry(Base):
     """
     Audit journal entry model.
 
+    The table is partitioned by month on timestamp (see
+    app.core.journal_partitions), so the primary key includes it. Entries
+    keep plain user and document IDs without foreign keys: the audit trail
+    must outlive the rows it describes, and ON DELETE actions would have
+    to scan every partition.
+
     Attributes:
         event_type: Type of event (create, update, delete)
         user_id: User who performed the action
@@ -24,24 +33,37 @@ class JournalEntry(Base):
 
     __tablename__ = "journal_entries"
 
-    # Event details
-    event_type: Mapped[str] = mapped_column(String(50), nullable=False, index=True)
-    document_id: Mapped[Optional[int]] = mapped_column(
-        ForeignKey("documents.id", ondelete="SET NULL"), index=True
+    id: Mapped[int] = mapped_column(
+        BigInteger,
+        journal_id_seq,
+        server_default=journal_id_seq.next_value(),
+        primary_key=True,
     )
+
+    # Event details
+    event_type: Mapped[str] = mapped_column(String(50), nullable=False)
+    document_id: Mapped[Optional[int]] = mapped_column(Integer)
     details: Mapped[Dict[str, Any]] = mapped_column(JSON, nullable=False)
 
     # User info
-    user_id: Mapped[Optional[int]] = mapped_column(
-        ForeignKey("users.id", ondelete="SET NULL"), index=True
-    )
+    user_id: Mapped[Optional[int]] = mapped_column(Integer)
     ip_address: Mapped[Optional[str]] = mapped_column(String(45))  # IPv6 length
 
     # Metadata
     timestamp: Mapped[datetime] = mapped_column(
-        DateTime(timezone=True), nullable=False, index=True
+        DateTime(timezone=True),
+        nullable=False,
+        server_default=func.now(),
+        primary_key=True,
     )
 
-    # Relationships
-    user: Mapped[Optional["User"]] = relationship("User")
-    document: Mapped[Optional["Document"]] = relationship("Document")
+    __table_args__ = {"postgresql_partition_by": "RANGE (timestamp)"}
+
+
+# Serves history pages: newest first, id breaks timestamp ties
+Index(
+    "ix_journal_entries_document_id_timestamp",
+    JournalEntry.document_id,
+    JournalEntry.timestamp.desc(),
+    JournalEntry.id.desc(),
+)
@@ -0,0 +1,46 @@
+"""
+Pre-aggregated statistics models.
+"""
+
+from decimal import Decimal
+from sqlalchemy import Integer, Numeric, String, UniqueConstraint
+from sqlalchemy.orm import Mapped, mapped_column
+from app.core.database import Base
+from .document import NO_CURRENCY
+
+
+class DocumentMonthlyStats(Base):
+    """
+    Monthly document totals, maintained incrementally by DocumentService.
+
+    Attributes:
+        year: Calendar year of the documents' created_date
+        month: Calendar month of the documents' created_date
+        document_type: Type of the aggregated documents
+        currency: Currency of the aggregated amounts (NO_CURRENCY if unset)
+        document_count: Number of documents in the bucket
+        total_amount: Sum of the documents' numeric total_price values
+    """
+
+    __tablename__ = "document_monthly_stats"
+
+    year: Mapped[int] = mapped_column(Integer, nullable=False)
+    month: Mapped[int] = mapped_column(Integer, nullable=False)
+    document_type: Mapped[str] = mapped_column(String(50), nullable=False)
+    currency: Mapped[str] = mapped_column(
+        String(10), nullable=False, default=NO_CURRENCY
+    )
+    document_count: Mapped[int] = mapped_column(Integer, nullable=False, default=0)
+    total_amount: Mapped[Decimal] = mapped_column(
+        Numeric(18, 2), nullable=False, default=0
+    )
+
+    __table_args__ = (
+        UniqueConstraint(
+            "year",
+            "month",
+            "document_type",
+            "currency",
+            name="uq_monthly_stats_bucket",
+        ),
+    )
@@ -2,14 +2,25 @@
 Модуль API для мониторинга бэкенда.
 """
 
+import asyncio
+import json
 import logging
 import psutil
 import os
 from datetime import datetime
-from fastapi import APIRouter, Depends
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Request
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import text
-from app.core.database import get_db
+from app.core.database import get_db, query_profiler, replica_router
+from app.core.config import settings
+from app.core.log_reader import RecordFilter, log_reader, parse_cursor
+from app.core.logging import logging_stats
+from app.core.metrics import metrics
+from app.core.pool_metrics import pool_monitor
+from app.core.sampling_profiler import PROFILE_MODES, profile_for
+from app.core.tracing import tracer
 
 router = APIRouter(prefix="/admin", tags=["Admin"])
 logger = logging.getLogger(__name__)
@@ -27,16 +38,200 @@ async def health_check():
     }
 
 
-@router.get("/logs")
-async def get_logs():
-    """Возвращает последние 10 строк логов."""
-    log_file = "logs.txt"
+@router.get("/metrics")
+async def get_metrics():
+    """Возвращает метрики приложения и состояние пулов соединений."""
+    pool = pool_monitor.snapshot()
+    return {"db_pool": pool, "logging": logging_stats(), **metrics.get_all()}
+
+
+QUERY_SORT_FIELDS = ("total_ms", "mean_ms", "p95_ms", "max_ms", "count")
+
+
+@router.get("/queries")
+async def get_query_stats(
+    sort: str = Query("total_ms", description="Поле сортировки"),
+    limit: int = Query(20, ge=1, le=500),
+):
+    """Возвращает статистику запросов к БД, сгруппированных по отпечатку SQL."""
+    if sort not in QUERY_SORT_FIELDS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"sort must be one of: {', '.join(QUERY_SORT_FIELDS)}",
+        )
+    return {
+        "slow_threshold_ms": query_profiler.slow_threshold * 1000,
+        "queries": query_profiler.top(sort, limit),
+    }
+
+
+@router.get("/queries/slow")
+async def get_slow_query_plans(fingerprint: Optional[str] = None):
+    """Возвращает планы EXPLAIN ANALYZE, снятые для медленных запросов."""
+    return {"plans": query_profiler.plans(fingerprint)}
+
+
+@router.delete("/queries")
+async def reset_query_stats():
+    """Сбрасывает накопленную статистику запросов и планы."""
+    query_profiler.reset()
+    return {"message": "Query statistics reset"}
+
+
+PROFILE_FORMATS = ("collapsed", "speedscope", "summary")
+
+
+@router.post("/profile")
+async def run_profiler(
+    seconds: float = Query(10.0, gt=0, le=120),
+    mode: str = Query("cpu", description="cpu или wall"),
+    route: Optional[str] = Query(None, description="Шаблон маршрута"),
+    interval_ms: float = Query(5.0, ge=1, le=1000),
+    output: str = Query("collapsed", description="collapsed, speedscope или summary"),
+    include_idle: bool = False,
+):
+    """
+    Профилирует текущий воркер семплированием в течение заданного времени.
+
+    Пример: POST /admin/profile?seconds=30&route=/pdf/{document_id}
+    """
+    if mode not in PROFILE_MODES:
+        raise HTTPException(
+            status_code=400, detail=f"mode must be one of: {', '.join(PROFILE_MODES)}"
+        )
+    if output not in PROFILE_FORMATS:
+        raise HTTPException(
+            status_code=400,
+            detail=f"output must be one of: {', '.join(PROFILE_FORMATS)}",
+        )
+    try:
+        session = await profile_for(
+            seconds, mode, interval_ms / 1000, route, include_idle
+        )
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    filename = f"profile-{os.getpid()}-{int(session.started_at)}"
+    if output == "summary":
+        return session.summary()
+    if output == "speedscope":
+        disposition = f'attachment; filename="{filename}.speedscope.json"'
+        return JSONResponse(
+            session.to_speedscope(f"{mode} {route or 'worker'} {os.getpid()}"),
+            headers={"Content-Disposition": disposition},
+        )
+    disposition = f'attachment; filename="{filename}.folded"'
+    return PlainTextResponse(
+        session.to_collapsed(), headers={"Content-Disposition": disposition}
+    )
+
+
+@router.get("/traces")
+async def list_traces(
+    limit: int = Query(20, ge=1, le=200),
+    min_duration_ms: float = Query(0.0, ge=0),
+):
+    """Возвращает последние трассировки запросов этого воркера."""
+    if tracer.memory is None:
+        raise HTTPException(status_code=404, detail="In-memory trace export is off")
+    return {"traces": tracer.memory.traces(limit, min_duration_ms)}
+
+
+@router.get("/traces/{trace_id}")
+async def get_trace(trace_id: str):
+    """Возвращает спаны трассировки в виде временной диаграммы."""
+    if tracer.memory is None:
+        raise HTTPException(status_code=404, detail="In-memory trace export is off")
+    spans = tracer.memory.waterfall(trace_id)
+    if not spans:
+        raise HTTPException(status_code=404, detail="Trace not found")
+    return {"trace_id": trace_id, "spans": spans}
+
+
+def _log_filter(level: Optional[str], logger_name: Optional[str]) -> RecordFilter:
     try:
-        with open(log_file, "r", encoding="utf-8") as file:
-            logs = file.readlines()[-10:]
-        return {"logs": logs}
-    except FileNotFoundError:
-        return {"error": "Файл логов не найден"}
+        return RecordFilter(level, logger_name)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _check_cursor(cursor: Optional[str]) -> None:
+    if cursor is not None:
+        try:
+            parse_cursor(cursor)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.get("/logs")
+async def get_logs(
+    limit: int = Query(100, ge=1, le=1000),
+    before: Optional[str] = Query(None, description="Курсор для чтения назад"),
+    after: Optional[str] = Query(None, description="Курсор для новых записей"),
+    level: Optional[str] = Query(None, description="Минимальный уровень"),
+    logger_name: Optional[str] = Query(None, alias="logger"),
+):
+    """
+    Возвращает записи JSON-логов, включая ротированные файлы.
+
+    Без курсоров возвращает последние записи; prev_cursor листает назад,
+    next_cursor передается в after для получения новых записей.
+    """
+    _check_cursor(before)
+    _check_cursor(after)
+    record_filter = _log_filter(level, logger_name)
+    if after is not None:
+        return await asyncio.to_thread(
+            log_reader.read_after, after, limit, record_filter
+        )
+    return await asyncio.to_thread(log_reader.tail, limit, before, record_filter)
+
+
+@router.get("/logs/stream")
+async def stream_logs(
+    request: Request,
+    after: Optional[str] = Query(None, description="Курсор начала"),
+    level: Optional[str] = Query(None, description="Минимальный уровень"),
+    logger_name: Optional[str] = Query(None, alias="logger"),
+    last_event_id: Optional[str] = Header(None),
+):
+    """
+    Транслирует новые записи логов через Server-Sent Events.
+
+    Идентификатор события - курсор, поэтому EventSource продолжает
+    с места обрыва по заголовку Last-Event-ID.
+    """
+    after = last_event_id or after
+    _check_cursor(after)
+    record_filter = _log_filter(level, logger_name)
+
+    async def events():
+        idle = 0.0
+        async for batch in log_reader.follow(
+            after, record_filter, settings.LOG_STREAM_POLL_INTERVAL
+        ):
+            if await request.is_disconnected():
+                break
+            if batch["gap"]:
+                yield "event: gap\ndata: {}\n\n"
+            if batch["entries"]:
+                idle = 0.0
+                data = "\n".join(
+                    f"data: {json.dumps(entry, default=str)}"
+                    for entry in batch["entries"]
+                )
+                yield f"id: {batch['next_cursor']}\nevent: logs\n{data}\n\n"
+            else:
+                idle += settings.LOG_STREAM_POLL_INTERVAL
+                if idle >= 15:
+                    idle = 0.0
+                    yield ": keep-alive\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @router.get("/db/status")
@@ -48,6 +243,7 @@ async def db_status(db: AsyncSession = Depends(get_db)):
         return {
             "database": "Connected",
             "active_connections": connections.scalar(),
+            "replicas": replica_router.status(),
         }
     except Exception as e:
         logger.error("Ошибка подключения к БД: %s", str(e))
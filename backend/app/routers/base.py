@@ -5,10 +5,10 @@ Base router configuration and common dependencies.
 from typing import Annotated, Tuple, Any
 from fastapi import Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.database import get_db_sync  # Updated to use sync version
+from app.core.database import get_db
 
 # Common dependencies
-DbSession = Annotated[AsyncSession, Depends(get_db_sync)]
+DbSession = Annotated[AsyncSession, Depends(get_db)]
 
 
 # Common query parameters
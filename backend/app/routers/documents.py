@@ -4,21 +4,30 @@ Universal document management endpoints.
 
 from typing import List, Optional, Dict, Any
 import logging
-from fastapi import APIRouter, HTTPException, Query
-from app.schemas.document import DocumentCreate, DocumentUpdate, DocumentResponse
+from fastapi import APIRouter, Depends, HTTPException, Query
+from app.schemas.document import (
+    DocumentCreate,
+    DocumentUpdate,
+    DocumentResponse,
+    DocumentTreeNode,
+)
+from app.schemas.journal import DocumentHistoryPage
 from app.services.document_service import document_service
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.database import AsyncSessionLocal
+from app.core.database import get_db, get_read_db
+from app.core.journal import Journal
+from app.core.responses import FastJSONResponse
 
 logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/documents", tags=["Documents"])
 
 
-@router.get("/{document_id}")
-async def get_document(document_id: int):
-    logger.debug("Fetching document ID: %d", document_id)
-    return {"document_id": document_id}
+def _split_csv(value: Optional[str]) -> Optional[List[str]]:
+    """Split a comma-separated query parameter into a list of names."""
+    if not value:
+        return None
+    return [item.strip() for item in value.split(",") if item.strip()] or None
 
 
 @router.post(
@@ -27,46 +36,111 @@ async def get_document(document_id: int):
     summary="Create new document",
     description="Creates a new document of any type with dynamic fields",
 )
-async def create_document(document: DocumentCreate) -> DocumentResponse:
+async def create_document(
+    document: DocumentCreate, db: AsyncSession = Depends(get_db)
+) -> DocumentResponse:
     logger.debug("Creating document with data: %s", document)
-    async with AsyncSessionLocal() as db:
-        try:
-            return await document_service.create(db, document)
-        except HTTPException as e:
-            raise e
-        except Exception as e:
-            logger.error("Error creating document: %s", str(e), exc_info=True)
-            raise HTTPException(status_code=400, detail=str(e))
+    try:
+        return await document_service.create(db, document)
+    except HTTPException as e:
+        raise e
+    except Exception as e:
+        logger.error("Error creating document: %s", str(e), exc_info=True)
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @router.get(
     "/{document_id}",
     response_model=DocumentResponse,
+    response_class=FastJSONResponse,
     summary="Get document details",
     description="Retrieves details of a specific document",
 )
 async def get_document(
     document_id: int,
     include_related: bool = Query(False, description="Include related documents"),
+    db: AsyncSession = Depends(get_db),
 ) -> DocumentResponse:
     logger.debug(
         "Fetching document ID: %d, include_related: %s", document_id, include_related
     )
-    async with AsyncSessionLocal() as db:
-        if include_related:
-            document = await document_service.get_with_relations(db, document_id)
-        else:
-            document = await document_service.get(db, document_id)
+    if include_related:
+        document = await document_service.get_with_relations(db, document_id)
         if not document:
             raise HTTPException(status_code=404, detail="Document not found")
         return document
+    # Read-only fast path: Core row serialized without ORM or Pydantic
+    row = await document_service.get_row(db, document_id)
+    if not row:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return FastJSONResponse(row)
+
+
+@router.get(
+    "/{document_id}/tree",
+    response_model=DocumentTreeNode,
+    summary="Get document hierarchy",
+    description="Loads the subtree or the ancestor chain of a document in one query",
+)
+async def get_document_tree(
+    document_id: int,
+    direction: str = Query(
+        "descendants",
+        enum=["descendants", "ancestors"],
+        description="Load child documents or the chain of parents",
+    ),
+    max_depth: int = Query(10, ge=0, le=50, description="Maximum levels to load"),
+    db: AsyncSession = Depends(get_db),
+) -> DocumentTreeNode:
+    logger.debug(
+        "Fetching document tree ID: %d, direction: %s, max_depth: %d",
+        document_id,
+        direction,
+        max_depth,
+    )
+    tree = await document_service.get_tree(
+        db, document_id, direction=direction, max_depth=max_depth
+    )
+    if not tree:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return tree
+
+
+@router.get(
+    "/{document_id}/history",
+    response_model=DocumentHistoryPage,
+    summary="Get document audit history",
+    description=(
+        "Returns audit journal entries of a document, newest first. Pass "
+        "`next_cursor` of a page as `cursor` to get the following one; "
+        "history of deleted documents stays available."
+    ),
+)
+async def get_document_history(
+    document_id: int,
+    limit: int = Query(50, ge=1, le=500, description="Maximum number of entries"),
+    cursor: Optional[str] = Query(None, description="Cursor of the next page"),
+    db: AsyncSession = Depends(get_read_db),
+) -> DocumentHistoryPage:
+    try:
+        entries, next_cursor = await Journal.get_document_history(
+            db, document_id, limit=limit, cursor=cursor
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return DocumentHistoryPage(items=entries, next_cursor=next_cursor)
 
 
 @router.get(
     "/",
     response_model=List[DocumentResponse],
+    response_class=FastJSONResponse,
     summary="List documents",
-    description="Get a list of documents with optional filtering",
+    description=(
+        "Get a list of documents with optional filtering. When `fields` or "
+        "`dynamic_keys` are given, only the requested columns and dynamic "
+        "field keys are returned."
+    ),
 )
 async def list_documents(
     skip: int = Query(0, ge=0, description="Number of documents to skip"),
@@ -79,18 +153,30 @@ async def list_documents(
         None, description="Filter by dynamic fields"
     ),
     parent_id: Optional[int] = Query(None, description="Filter by parent document ID"),
+    fields: Optional[str] = Query(
+        None, description="Comma-separated document columns to return"
+    ),
+    dynamic_keys: Optional[str] = Query(
+        None, description="Comma-separated dynamic field keys to return"
+    ),
+    db: AsyncSession = Depends(get_read_db),
 ) -> List[DocumentResponse]:
     logger.debug("Listing documents with filters: skip=%d, limit=%d", skip, limit)
-    async with AsyncSessionLocal() as db:
-        return await document_service.get_by_filters(
+    try:
+        rows = await document_service.list_rows(
             db,
             document_type=document_type,
             reference_number=reference_number,
             dynamic_field_filters=dynamic_field_filters,
             parent_id=parent_id,
+            fields=_split_csv(fields),
+            dynamic_keys=_split_csv(dynamic_keys),
             skip=skip,
             limit=limit,
         )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return FastJSONResponse(rows)
 
 
 @router.put(
@@ -100,13 +186,12 @@ async def list_documents(
     description="Updates an existing document",
 )
 async def update_document(
-    document_id: int, document: DocumentUpdate
+    document_id: int, document: DocumentUpdate, db: AsyncSession = Depends(get_db)
 ) -> DocumentResponse:
-    async with AsyncSessionLocal() as db:
-        db_obj = await document_service.get(db, document_id)
-        if not db_obj:
-            raise HTTPException(status_code=404, detail="Document not found")
-        return await document_service.update(db, db_obj, document)
+    db_obj = await document_service.get(db, document_id)
+    if not db_obj:
+        raise HTTPException(status_code=404, detail="Document not found")
+    return await document_service.update(db, db_obj, document)
 
 
 @router.delete(
@@ -114,10 +199,11 @@ async def update_document(
     summary="Delete document",
     description="Deletes a specific document",
 )
-async def delete_document(document_id: int) -> dict:
-    async with AsyncSessionLocal() as db:
-        db_obj = await document_service.get(db, document_id)
-        if not db_obj:
-            raise HTTPException(status_code=404, detail="Document not found")
-        await document_service.delete(db, db_obj)
-        return {"message": "Document deleted"}
+async def delete_document(
+    document_id: int, db: AsyncSession = Depends(get_db)
+) -> dict:
+    db_obj = await document_service.get(db, document_id)
+    if not db_obj:
+        raise HTTPException(status_code=404, detail="Document not found")
+    await document_service.delete(db, db_obj)
+    return {"message": "Document deleted"}
@@ -0,0 +1,14 @@
+"""
+Модуль API для экспорта метрик в формате Prometheus.
+"""
+
+from fastapi import APIRouter, Response
+from app.core.metrics import CONTENT_TYPE_LATEST, registry
+
+router = APIRouter(tags=["Metrics"])
+
+
+@router.get("/metrics", include_in_schema=False)
+async def prometheus_metrics() -> Response:
+    """Возвращает метрики всех воркеров в текстовом формате Prometheus."""
+    return Response(registry.generate_latest(), media_type=CONTENT_TYPE_LATEST)
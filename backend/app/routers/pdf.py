@@ -6,11 +6,12 @@ import logging
 from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import FileResponse
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.database import get_db
+from app.core.database import get_db, release_connection
 from app.schemas.document import DocumentBase
 from app.services.document_service import document_service
 from app.services.pdf_service import generate_document_docx, convert_docx_to_pdf
-from app.core.config import Settings
+from app.core.config import settings
+from app.core.tracing import start_span
 
 logger = logging.getLogger(__name__)
 
@@ -28,7 +29,7 @@ async def export_document(
     """
     Генерация документа в формате PDF или DOCX.
     """
-    if Settings.DEBUG:
+    if settings.DEBUG:
         logger.debug(
             "Генерация документа %d в формате %s с шаблоном %s",
             document_id,
@@ -36,18 +37,22 @@ async def export_document(
             template,
         )
 
-    document = await document_service.get(db, document_id)
+    with start_span("db.fetch_document", document_id=document_id):
+        document = await document_service.get(db, document_id)
     if not document:
         raise HTTPException(status_code=404, detail="Document not found")
+    # Rendering and conversion take seconds; don't hold a pool connection
+    await release_connection(db)
 
-    document_data = DocumentBase(
-        document_type=document.document_type,
-        reference_number=document.reference_number,
-        created_date=document.created_date,
-        dynamic_fields=document.dynamic_fields,
-        parent_id=document.parent_id,
-    )
-    document_dict = document_data.model_dump()
+    with start_span("document.build_model"):
+        document_data = DocumentBase(
+            document_type=document.document_type,
+            reference_number=document.reference_number,
+            created_date=document.created_date,
+            dynamic_fields=document.dynamic_fields,
+            parent_id=document.parent_id,
+        )
+        document_dict = document_data.model_dump()
     for field in exclude_fields:
         document_dict["dynamic_fields"].pop(field, None)
 
@@ -3,11 +3,21 @@
 """
 
 import logging
-from fastapi import APIRouter, Depends
+from datetime import date
+from typing import List, Optional
+from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.database import get_db
-from app.services.stats_service import get_monthly_stats, get_total_amount_by_type
-from app.core.config import Settings
+from app.core.database import get_read_db
+from app.services.stats_service import (
+    get_monthly_stats,
+    get_total_amount_by_type,
+    stats_service,
+    normalize_currency,
+    single_currency_total,
+    GRANULARITIES,
+    MEASURES,
+)
+from app.core.config import settings
 
 logger = logging.getLogger(__name__)
 
@@ -15,16 +25,94 @@ router = APIRouter(prefix="/stats", tags=["Statistics"])
 
 
 @router.get("/total/{document_type}")
-async def total_by_type(document_type: str, db: AsyncSession = Depends(get_db)):
-    """Получить общую сумму по типу документа."""
-    if Settings.DEBUG:
+async def total_by_type(
+    document_type: str,
+    currency: Optional[str] = Query(None, description="Sum only this currency"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Получить общую сумму по типу документа (по валютам)."""
+    if settings.DEBUG:
         logger.debug("Запрос общей суммы для типа документа: %s", document_type)
-    return {"total_amount": await get_total_amount_by_type(db, document_type)}
+    if currency:
+        total = await get_total_amount_by_type(db, document_type, currency)
+        return {"total_amount": total, "currency": normalize_currency(currency)}
+    totals = await stats_service.get_totals_by_currency(db, document_type)
+    return {
+        "total_amount": single_currency_total(totals),
+        "totals_by_currency": totals,
+    }
 
 
 @router.get("/monthly/{year}/{month}")
-async def monthly_stats(year: int, month: int, db: AsyncSession = Depends(get_db)):
+async def monthly_stats(year: int, month: int, db: AsyncSession = Depends(get_read_db)):
     """Получить статистику за месяц."""
-    if Settings.DEBUG:
+    if settings.DEBUG:
         logger.debug("Запрос месячной статистики за %d-%d", year, month)
     return await get_monthly_stats(db, year, month)
+
+
+@router.get("/timeseries")
+async def timeseries(
+    start: date = Query(..., description="Start of the range (inclusive)"),
+    end: date = Query(..., description="End of the range (exclusive)"),
+    granularity: str = Query(
+        "month", enum=list(GRANULARITIES), description="Bucket size"
+    ),
+    document_type: Optional[str] = Query(None, description="Filter by document type"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Получить статистику по периодам за произвольный диапазон."""
+    if settings.DEBUG:
+        logger.debug(
+            "Запрос статистики %s за %s - %s", granularity, start, end
+        )
+    try:
+        series = await stats_service.get_timeseries(
+            db, start, end, granularity, document_type
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
+    return {
+        "start": start,
+        "end": end,
+        "granularity": granularity,
+        "series": series,
+    }
+
+
+@router.get("/aggregate")
+async def aggregate(
+    group_by: List[str] = Query(
+        [],
+        description="Dimensions: document_type, currency, period or field:<key>",
+    ),
+    measure: List[str] = Query(
+        ["count"], description=f"Measures: {', '.join(MEASURES)}"
+    ),
+    start: Optional[date] = Query(None, description="Start of the range (inclusive)"),
+    end: Optional[date] = Query(None, description="End of the range (exclusive)"),
+    granularity: Optional[str] = Query(
+        None, enum=list(GRANULARITIES), description="Bucket size for period"
+    ),
+    document_type: Optional[str] = Query(None, description="Filter by document type"),
+    currency: Optional[str] = Query(None, description="Filter by currency"),
+    limit: Optional[int] = Query(None, ge=1, description="Maximum number of rows"),
+    db: AsyncSession = Depends(get_read_db),
+):
+    """Получить агрегированную статистику по произвольным измерениям."""
+    if settings.DEBUG:
+        logger.debug("Запрос агрегации: group_by=%s, measure=%s", group_by, measure)
+    try:
+        return await stats_service.aggregate(
+            db,
+            group_by=group_by,
+            measures=measure,
+            start=start,
+            end=end,
+            granularity=granularity,
+            document_type=document_type,
+            currency=currency,
+            limit=limit,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=422, detail=str(e))
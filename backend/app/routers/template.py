@@ -6,7 +6,7 @@ import logging
 from typing import List, Dict, Optional
 from fastapi import APIRouter, Depends, File, Form, HTTPException, UploadFile, status
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.core.database import get_db
+from app.core.database import get_db, get_read_db
 from app.services.template_manager import TemplateManager
 from app.services.field_extractor import extract_dynamic_fields
 from app.models.template import Template
@@ -22,7 +22,7 @@ router = APIRouter(
 
 
 @router.get("/", response_model=List[Dict])
-async def list_templates(db: AsyncSession = Depends(get_db)):
+async def list_templates(db: AsyncSession = Depends(get_read_db)):
     """Возвращает список шаблонов."""
     try:
         return await TemplateManager.list_templates(db)
@@ -111,7 +111,7 @@ async def update_template(
             except json.JSONDecodeError as e:
                 logger.error("Invalid JSON in fields: %s", str(e))
                 raise HTTPException(status_code=422, detail="Invalid fields format")
-        await db.commit()
+        await db.flush()
         await db.refresh(template)
         return {
             "message": "Template updated successfully",
@@ -124,7 +124,6 @@ async def update_template(
     except HTTPException:
         raise
     except Exception as e:
-        await db.rollback()
         logger.error("Failed to update template: %s", str(e), exc_info=True)
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -149,13 +148,12 @@ async def delete_template(template_id: int, db: AsyncSession = Depends(get_db)):
             except Exception as e:
                 logger.warning("Failed to delete template file: %s", str(e))
         await db.delete(template)
-        await db.commit()
+        await db.flush()
         logger.info("Successfully deleted template: %d", template_id)
         return {"message": f"Template {template_id} deleted successfully"}
     except HTTPException:
         raise
     except Exception as e:
-        await db.rollback()
         logger.error("Error deleting template: %s", str(e), exc_info=True)
         raise HTTPException(
             status_code=500, detail=f"Failed to delete template: {str(e)}"
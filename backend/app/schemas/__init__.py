@@ -4,7 +4,14 @@ Schema definitions for the application.
 
 from .base import BaseSchema, BaseResponseSchema, PriceType, DateType
 from .common import CurrencyEnum, StatusEnum
-from .document import DocumentBase, DocumentCreate, DocumentUpdate, DocumentResponse
+from .document import (
+    DocumentBase,
+    DocumentCreate,
+    DocumentUpdate,
+    DocumentResponse,
+    DocumentTreeNode,
+)
+from .journal import DocumentHistoryPage, JournalEntryResponse
 
 __all__ = [
     # Base schemas
@@ -20,4 +27,8 @@ __all__ = [
     "DocumentCreate",
     "DocumentUpdate",
     "DocumentResponse",
+    "DocumentTreeNode",
+    # Journal schemas
+    "JournalEntryResponse",
+    "DocumentHistoryPage",
 ]
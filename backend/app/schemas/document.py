@@ -2,7 +2,8 @@
 Document schema definitions.
 """
 
-from typing import Optional, Dict, Any
+from __future__ import annotations
+from typing import Optional, Dict, Any, List
 from pydantic import Field
 from .common import DateType, BaseSchema, BaseResponseSchema
 
@@ -69,3 +70,14 @@ class DocumentResponse(DocumentBase, BaseResponseSchema):
     """Schema for document response including ID."""
 
     pass
+
+
+class DocumentTreeNode(DocumentResponse):
+    """Schema for a document inside a loaded hierarchy."""
+
+    depth: int = Field(
+        0, description="Distance from the requested document (0 for itself)"
+    )
+    children: List[DocumentTreeNode] = Field(
+        default=[], description="Nested child documents"
+    )
@@ -0,0 +1,30 @@
+"""
+Audit journal schema definitions.
+"""
+
+from __future__ import annotations
+from datetime import datetime
+from typing import Optional, Dict, Any, List
+from pydantic import Field
+from .base import BaseSchema
+
+
+class JournalEntryResponse(BaseSchema):
+    """Schema for one audit journal entry."""
+
+    id: int = Field(description="Unique identifier")
+    event_type: str = Field(description="Type of event (create, update, delete)")
+    document_id: Optional[int] = Field(None, description="ID of the document")
+    user_id: Optional[int] = Field(None, description="User who performed the action")
+    details: Dict[str, Any] = Field(default={}, description="Event details")
+    ip_address: Optional[str] = None
+    timestamp: datetime
+
+
+class DocumentHistoryPage(BaseSchema):
+    """Schema for a page of a document's audit history, newest first."""
+
+    items: List[JournalEntryResponse]
+    next_cursor: Optional[str] = Field(
+        None, description="Cursor of the next page; absent on the last page"
+    )
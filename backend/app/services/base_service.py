@@ -1,5 +1,9 @@
 """
 Base service class providing common CRUD operations.
+
+Services flush their changes but never commit: the request's unit of work
+(app.core.database.get_db) commits once the handler succeeded and rolls
+back on any error.
 """
 
 from typing import TypeVar, Generic, Type, Optional, List, Any, Dict
@@ -29,11 +33,10 @@ class BaseService(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
         db_obj = self.model(**obj_data)
         db.add(db_obj)
         try:
-            await db.commit()
+            await db.flush()
             await db.refresh(db_obj)
             return db_obj
         except Exception as e:
-            await db.rollback()
             raise HTTPException(status_code=500, detail=str(e))
 
     async def get(self, db: AsyncSession, id: Any) -> Optional[ModelType]:
@@ -76,11 +79,10 @@ class BaseService(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
                 setattr(db_obj, field, value)
         db.add(db_obj)
         try:
-            await db.commit()
+            await db.flush()
             await db.refresh(db_obj)
             return db_obj
         except Exception as e:
-            await db.rollback()
             raise HTTPException(status_code=500, detail=str(e))
 
     async def delete(self, db: AsyncSession, id: Any) -> bool:
@@ -90,8 +92,7 @@ class BaseService(Generic[ModelType, CreateSchemaType, UpdateSchemaType]):
             return False
         try:
             await db.delete(obj)
-            await db.commit()
+            await db.flush()
             return True
         except Exception as e:
-            await db.rollback()
             raise HTTPException(status_code=500, detail=str(e))
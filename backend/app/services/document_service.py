@@ -2,22 +2,53 @@
 Universal service for managing all document types.
 """
 
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
 from datetime import date
 import logging
-from sqlalchemy import and_
+from sqlalchemy import JSON, and_, func, literal
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy.orm import selectinload
 from fastapi import HTTPException
 
+from app.core.database import after_commit
+from app.core.journal import Journal
+from app.core.jsonpatch import make_patch
+from app.core.logging import lazy
+from app.core.profiler import timed
 from app.models.document import Document
 from app.schemas.document import DocumentCreate, DocumentUpdate, DocumentResponse
 from app.services.base_service import BaseService
+from app.services.stats_service import stats_service
 from app.services.template_manager import TemplateManager
 
 logger = logging.getLogger(__name__)
 
+# Directions supported by the recursive tree loader
+TREE_DIRECTIONS = ("descendants", "ancestors")
+
+# Document fields recorded in the audit journal
+AUDIT_FIELDS = (
+    "document_type",
+    "reference_number",
+    "created_date",
+    "dynamic_fields",
+    "parent_id",
+)
+
+# Columns exposed by DocumentResponse, selected directly on ORM-free read paths
+RESPONSE_COLUMNS = (
+    "id",
+    "document_type",
+    "reference_number",
+    "created_date",
+    "dynamic_fields",
+    "parent_id",
+)
+
+# json_build_object accepts at most 100 arguments, i.e. 50 key/value pairs
+MAX_DYNAMIC_KEYS = 50
+
 
 class DocumentService(BaseService[Document, DocumentCreate, DocumentUpdate]):
     """Service for handling all document operations."""
@@ -26,9 +57,10 @@ class DocumentService(BaseService[Document, DocumentCreate, DocumentUpdate]):
         super().__init__(model)
         self.template_manager = TemplateManager()
 
+    @timed()
     async def create(self, db: AsyncSession, obj_in: DocumentCreate) -> Document:
         """Create a new document with dynamic fields."""
-        logger.debug("Creating document: %s", obj_in.model_dump())
+        logger.debug("Creating document: %s", lazy(obj_in.model_dump))
         # Validate document_type against templates
         templates = await self.template_manager.list_templates(db)
         template = next(
@@ -64,18 +96,31 @@ class DocumentService(BaseService[Document, DocumentCreate, DocumentUpdate]):
             parent_id=obj_in.parent_id,
         )
         db.add(db_obj)
-        await db.commit()
+        after = self._snapshot(db_obj)
+        await stats_service.record_change(db, after=after)
+        await db.flush()
         await db.refresh(db_obj)
+        document_id = db_obj.id
+        patch = make_patch({}, self._audit_state(db_obj))
+        after_commit(db, lambda: stats_service.invalidate([after]))
+        after_commit(
+            db, lambda: Journal.log_document_change("create", document_id, patch)
+        )
         logger.info("Document created: %s (ID: %d)", obj_in.reference_number, db_obj.id)
         return db_obj
 
+    @timed()
     async def update(
         self, db: AsyncSession, db_obj: Document, obj_in: DocumentUpdate
     ) -> Document:
         """Update a document with dynamic fields."""
         logger.debug(
-            "Updating document ID: %d with data: %s", db_obj.id, obj_in.model_dump()
+            "Updating document ID: %d with data: %s",
+            db_obj.id,
+            lazy(obj_in.model_dump),
         )
+        before = self._snapshot(db_obj)
+        audit_before = self._audit_state(db_obj)
         update_data = obj_in.model_dump(exclude_unset=True)
         if "dynamic_fields" in update_data:
             db_obj.dynamic_fields = {
@@ -85,11 +130,97 @@ class DocumentService(BaseService[Document, DocumentCreate, DocumentUpdate]):
             del update_data["dynamic_fields"]
         for key, value in update_data.items():
             setattr(db_obj, key, value)
-        await db.commit()
+        after = self._snapshot(db_obj)
+        patch = make_patch(audit_before, self._audit_state(db_obj))
+        await stats_service.record_change(db, before=before, after=after)
+        await db.flush()
         await db.refresh(db_obj)
+        document_id = db_obj.id
+        after_commit(db, lambda: stats_service.invalidate([before, after]))
+        if patch:
+            after_commit(
+                db, lambda: Journal.log_document_change("update", document_id, patch)
+            )
         logger.info("Document updated: %s (ID: %d)", db_obj.reference_number, db_obj.id)
         return db_obj
 
+    @timed()
+    async def delete(self, db: AsyncSession, db_obj: Document) -> bool:
+        """Delete a document together with its child documents."""
+        logger.debug("Deleting document ID: %d", db_obj.id)
+        # Children go through ON DELETE CASCADE, so take their stats out first
+        ids, snapshots = await self._subtree_snapshots(db, db_obj.id)
+        await stats_service.record_bulk_removal(db, snapshots)
+        await db.delete(db_obj)
+        await db.flush()
+        root_id = db_obj.id
+        # Removals carry no values: the earlier entries hold the last state
+        removal = [{"op": "remove", "path": f"/{field}"} for field in AUDIT_FIELDS]
+
+        async def journal_removal() -> None:
+            for document_id in ids:
+                if document_id == root_id:
+                    await Journal.log_document_change("delete", document_id, removal)
+                else:
+                    await Journal.log_document_change(
+                        "delete", document_id, removal, cascade_from=root_id
+                    )
+
+        after_commit(db, lambda: stats_service.invalidate(snapshots))
+        after_commit(db, journal_removal)
+        logger.info(
+            "Document deleted: %s (ID: %d, %d removed in total)",
+            db_obj.reference_number,
+            db_obj.id,
+            len(snapshots),
+        )
+        return True
+
+    @staticmethod
+    def _snapshot(db_obj: Document) -> tuple:
+        """Capture the fields that feed the monthly statistics."""
+        dynamic_fields = db_obj.dynamic_fields or {}
+        return (
+            db_obj.document_type,
+            db_obj.created_date,
+            dynamic_fields.get("total_price"),
+            dynamic_fields.get("currency"),
+        )
+
+    @staticmethod
+    def _audit_state(db_obj: Document) -> Dict[str, Any]:
+        """JSON-compatible values of the journaled fields."""
+        state = {field: getattr(db_obj, field) for field in AUDIT_FIELDS}
+        if state["created_date"] is not None:
+            state["created_date"] = state["created_date"].isoformat()
+        state["dynamic_fields"] = dict(state["dynamic_fields"] or {})
+        return state
+
+    @staticmethod
+    async def _subtree_snapshots(
+        db: AsyncSession, document_id: int
+    ) -> Tuple[List[int], List[tuple]]:
+        """Get IDs and stats snapshots of a document and all of its descendants."""
+        table = Document.__table__
+        subtree = select(table.c.id).where(table.c.id == document_id)
+        subtree = subtree.cte("document_subtree", recursive=True)
+        # UNION (not UNION ALL) stops on corrupted parent cycles
+        subtree = subtree.union(
+            select(table.c.id).join(subtree, table.c.parent_id == subtree.c.id)
+        )
+        result = await db.execute(
+            select(
+                table.c.id,
+                table.c.document_type,
+                table.c.created_date,
+                table.c.total_price,
+                table.c.currency,
+            ).where(table.c.id.in_(select(subtree.c.id)))
+        )
+        rows = result.all()
+        return [row[0] for row in rows], [tuple(row[1:]) for row in rows]
+
+    @timed()
     async def get_by_filters(
         self,
         db: AsyncSession,
@@ -111,8 +242,141 @@ class DocumentService(BaseService[Document, DocumentCreate, DocumentUpdate]):
             parent_id,
         )
         query = select(Document).offset(skip).limit(limit)
-        filters = []
+        filters = self._filter_clauses(
+            document_type=document_type,
+            reference_number=reference_number,
+            start_date=start_date,
+            end_date=end_date,
+            dynamic_field_filters=dynamic_field_filters,
+            parent_id=parent_id,
+        )
+        if filters:
+            query = query.where(*filters)
+
+        result = await db.execute(query)
+        documents = result.scalars().all()
+        logger.info("Retrieved %d documents", len(documents))
+        return documents
+
+    @timed()
+    async def list_rows(
+        self,
+        db: AsyncSession,
+        *,
+        document_type: Optional[str] = None,
+        reference_number: Optional[str] = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        dynamic_field_filters: Optional[Dict[str, Any]] = None,
+        parent_id: Optional[int] = None,
+        fields: Optional[List[str]] = None,
+        dynamic_keys: Optional[List[str]] = None,
+        skip: int = 0,
+        limit: int = 100,
+    ) -> List[Dict[str, Any]]:
+        """
+        Get documents as plain dictionaries without building ORM instances.
+
+        Selects only the DocumentResponse columns as Core rows, so the result
+        can be serialized directly by FastJSONResponse.
+
+        Args:
+            fields: Optional subset of response columns to return (id is always kept)
+            dynamic_keys: Optional dynamic_fields keys to extract in SQL with `->`
+        """
+        table = Document.__table__
+        query = (
+            select(*self._projection(fields, dynamic_keys))
+            .order_by(table.c.id)
+            .offset(skip)
+            .limit(limit)
+        )
+        filters = self._filter_clauses(
+            document_type=document_type,
+            reference_number=reference_number,
+            start_date=start_date,
+            end_date=end_date,
+            dynamic_field_filters=dynamic_field_filters,
+            parent_id=parent_id,
+        )
+        if filters:
+            query = query.where(*filters)
+        result = await db.execute(query)
+        rows = [self._row_to_dict(row) for row in result.mappings()]
+        logger.info("Retrieved %d document rows", len(rows))
+        return rows
+
+    @timed()
+    async def get_row(
+        self, db: AsyncSession, document_id: int
+    ) -> Optional[Dict[str, Any]]:
+        """Get a single document as a plain dictionary."""
+        table = Document.__table__
+        result = await db.execute(
+            select(*(table.c[name] for name in RESPONSE_COLUMNS)).where(
+                table.c.id == document_id
+            )
+        )
+        row = result.mappings().first()
+        return self._row_to_dict(row) if row else None
+
+    @staticmethod
+    def _projection(
+        fields: Optional[List[str]] = None, dynamic_keys: Optional[List[str]] = None
+    ) -> List[Any]:
+        """
+        Build the column list for a sparse fieldset.
+
+        Raises:
+            ValueError: If an unknown field or too many dynamic keys are requested
+        """
+        table = Document.__table__
+        names = list(RESPONSE_COLUMNS)
+        if fields:
+            unknown = set(fields) - set(RESPONSE_COLUMNS)
+            if unknown:
+                raise ValueError(f"Unknown fields: {', '.join(sorted(unknown))}")
+            names = [name for name in RESPONSE_COLUMNS if name == "id" or name in fields]
+        if dynamic_keys and "dynamic_fields" not in names:
+            names.append("dynamic_fields")
+        columns = [table.c[name] for name in names if name != "dynamic_fields"]
+        if "dynamic_fields" in names:
+            if dynamic_keys:
+                keys = list(dict.fromkeys(dynamic_keys))
+                if len(keys) > MAX_DYNAMIC_KEYS:
+                    raise ValueError(
+                        f"At most {MAX_DYNAMIC_KEYS} dynamic keys can be requested"
+                    )
+                pairs = []
+                for key in keys:
+                    pairs.extend((literal(key), table.c.dynamic_fields[key]))
+                columns.append(
+                    func.json_build_object(*pairs, type_=JSON).label("dynamic_fields")
+                )
+            else:
+                columns.append(table.c.dynamic_fields)
+        return columns
+
+    @staticmethod
+    def _row_to_dict(row: Any) -> Dict[str, Any]:
+        """Convert a Core row mapping into a DocumentResponse-shaped dict."""
+        data = dict(row)
+        if "dynamic_fields" in data and data["dynamic_fields"] is None:
+            data["dynamic_fields"] = {}
+        return data
 
+    @staticmethod
+    def _filter_clauses(
+        *,
+        document_type: Optional[str] = None,
+        reference_number: Optional[str] = None,
+        start_date: Optional[date] = None,
+        end_date: Optional[date] = None,
+        dynamic_field_filters: Optional[Dict[str, Any]] = None,
+        parent_id: Optional[int] = None,
+    ) -> List[Any]:
+        """Build WHERE clauses shared by the ORM and Core read paths."""
+        filters = []
         if document_type:
             filters.append(Document.document_type == document_type)
         if reference_number:
@@ -129,15 +393,9 @@ class DocumentService(BaseService[Document, DocumentCreate, DocumentUpdate]):
         if dynamic_field_filters:
             for key, value in dynamic_field_filters.items():
                 filters.append(Document.dynamic_fields[key].astext == str(value))
+        return filters
 
-        if filters:
-            query = query.where(*filters)
-
-        result = await db.execute(query)
-        documents = result.scalars().all()
-        logger.info("Retrieved %d documents", len(documents))
-        return documents
-
+    @timed()
     async def get_with_relations(
         self, db: AsyncSession, document_id: int
     ) -> Optional[Document]:
@@ -163,6 +421,78 @@ class DocumentService(BaseService[Document, DocumentCreate, DocumentUpdate]):
             logger.warning("Document not found: ID=%d", document_id)
         return document
 
+    @timed()
+    async def get_tree(
+        self,
+        db: AsyncSession,
+        document_id: int,
+        *,
+        direction: str = "descendants",
+        max_depth: int = 10,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Load a document hierarchy with a single recursive CTE query.
+
+        Args:
+            db: Database session
+            document_id: ID of the document to start from
+            direction: "descendants" for the subtree, "ancestors" for the parent chain
+            max_depth: Maximum number of levels to follow from the start document
+
+        Returns:
+            Nested dictionary rooted at the top-most loaded document, or None
+        """
+        if direction not in TREE_DIRECTIONS:
+            raise ValueError(f"Unsupported tree direction: {direction}")
+        logger.debug(
+            "Fetching document tree: ID=%d, direction=%s, max_depth=%d",
+            document_id,
+            direction,
+            max_depth,
+        )
+        table = Document.__table__
+        anchor = select(*table.c, literal(0).label("depth")).where(
+            table.c.id == document_id
+        )
+        tree = anchor.cte("document_tree", recursive=True)
+        if direction == "descendants":
+            link = table.c.parent_id == tree.c.id
+        else:
+            link = table.c.id == tree.c.parent_id
+        step = (
+            select(*table.c, (tree.c.depth + 1).label("depth"))
+            .join(tree, link)
+            .where(tree.c.depth < max_depth)
+        )
+        tree = tree.union_all(step)
+        result = await db.execute(select(tree).order_by(tree.c.depth, tree.c.id))
+        rows = result.mappings().all()
+        if not rows:
+            logger.warning("Document not found: ID=%d", document_id)
+            return None
+
+        nodes: Dict[int, Dict[str, Any]] = {}
+        for row in rows:
+            # Skip repeats so a corrupted parent cycle cannot nest a node twice
+            nodes.setdefault(row["id"], {**row, "children": []})
+        if direction == "descendants":
+            root = nodes[document_id]
+            for node in nodes.values():
+                if node["depth"] > 0:
+                    nodes[node["parent_id"]]["children"].append(node)
+        else:
+            chain = list(nodes.values())
+            for child, parent in zip(chain, chain[1:]):
+                parent["children"].append(child)
+            root = chain[-1]
+        logger.info(
+            "Retrieved document tree: ID=%d, %d nodes (%s)",
+            document_id,
+            len(nodes),
+            direction,
+        )
+        return root
+
 
 # Create service instance
 document_service = DocumentService(Document)
@@ -11,6 +11,8 @@ from datetime import datetime
 from docxtpl import DocxTemplate
 from app.schemas.document import DocumentBase
 from app.core.config import Settings
+from app.core.profiler import io_span, timed
+from app.core.tracing import start_span
 
 logger = logging.getLogger(__name__)
 
@@ -25,6 +27,7 @@ class PDFService:
         self.templates_dir.mkdir(parents=True, exist_ok=True)
         self.generated_dir.mkdir(parents=True, exist_ok=True)
 
+    @timed()
     async def generate_document_docx(
         self, document_data: DocumentBase, template_name: str
     ) -> Path:
@@ -46,19 +49,22 @@ class PDFService:
             )
 
         try:
-            doc = DocxTemplate(template_path)
+            with start_span("docx.load", template=template_name), io_span():
+                doc = DocxTemplate(template_path)
             render_data = {
                 "document_type": document_data.document_type,
                 "reference_number": document_data.reference_number,
                 "created_date": document_data.created_date.isoformat(),
                 **document_data.dynamic_fields,
             }
-            doc.render(render_data)
+            with start_span("docx.render"):
+                doc.render(render_data)
             output_path = (
                 self.generated_dir
                 / f"{document_data.document_type}_{document_data.reference_number}.docx"
             )
-            doc.save(output_path)
+            with start_span("docx.save"), io_span():
+                doc.save(output_path)
             logger.info(
                 "Generated DOCX: %s using template: %s", output_path.name, template_name
             )
@@ -69,6 +75,7 @@ class PDFService:
                 status_code=500, detail=f"Failed to generate document: {str(e)}"
             )
 
+    @timed()
     async def convert_docx_to_pdf(self, docx_path: Path) -> Path:
         """
         Convert DOCX file to PDF using LibreOffice.
@@ -81,18 +88,20 @@ class PDFService:
         """
         try:
             pdf_path = docx_path.with_suffix(".pdf")
-            process = await asyncio.create_subprocess_exec(
-                "soffice",
-                "--headless",
-                "--convert-to",
-                "pdf",
-                str(docx_path),
-                "--outdir",
-                str(self.generated_dir),
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE,
-            )
-            stdout, stderr = await process.communicate()
+            with start_span("soffice.convert", file=docx_path.name) as span, io_span():
+                process = await asyncio.create_subprocess_exec(
+                    "soffice",
+                    "--headless",
+                    "--convert-to",
+                    "pdf",
+                    str(docx_path),
+                    "--outdir",
+                    str(self.generated_dir),
+                    stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.PIPE,
+                )
+                stdout, stderr = await process.communicate()
+                span.set_attribute("process.exit_code", process.returncode)
             if process.returncode != 0:
                 logger.error("PDF conversion failed: %s", stderr.decode())
                 raise HTTPException(
@@ -106,6 +115,7 @@ class PDFService:
                 status_code=500, detail=f"PDF conversion failed: {str(e)}"
             )
 
+    @timed()
     async def cleanup_old_files(self, max_age_days: int = 7) -> None:
         """Clean up old generated files."""
         try:
@@ -3,41 +3,218 @@ Service for generating document statistics.
 """
 
 from datetime import date, datetime
-from typing import List, Dict, Any
+from decimal import Decimal, InvalidOperation
+from typing import List, Dict, Any, Iterable, Optional, Tuple
 import logging
-from sqlalchemy import func, extract, select
+import re
+from sqlalchemy import (
+    Date,
+    cast,
+    delete,
+    func,
+    extract,
+    literal_column,
+    select,
+    text,
+)
+from sqlalchemy.dialects.postgresql import insert
 from sqlalchemy.ext.asyncio import AsyncSession
-from app.models.document import Document
+from app.core.cache import QueryCache, create_backend
+from app.core.config import on_settings_reload, settings
+from app.core.profiler import timed
+from app.models.document import Document, NO_CURRENCY, AMOUNT_PATTERN
+from app.models.stats import DocumentMonthlyStats
 
 logger = logging.getLogger(__name__)
 
+# (document_type, created_date, total_price, currency) of a document version
+DocumentSnapshot = Tuple[str, date, Any, Any]
+
+_AMOUNT_RE = re.compile(AMOUNT_PATTERN)
+
+# Dashboards poll the stats endpoints; DocumentService writes invalidate by tag
+stats_cache = QueryCache(
+    "stats",
+    ttl=settings.STATS_CACHE_TTL,
+    max_entries=settings.STATS_CACHE_MAX_ENTRIES,
+    backend=create_backend(settings.CACHE_BACKEND_URL),
+)
+
+
+@on_settings_reload
+def _apply_cache_settings(changed: Dict[str, Any]) -> None:
+    stats_cache.ttl = settings.STATS_CACHE_TTL
+    stats_cache.max_entries = settings.STATS_CACHE_MAX_ENTRIES
+
+
+# Bumped by a full rebuild of document_monthly_stats
+REBUILD_TAG = "monthly:rebuild"
+
+
+def replica_settle(db: AsyncSession) -> float:
+    """
+    Settle window for results loaded on a session.
+
+    A replica may serve pre-write data for a while after a write
+    invalidated the cache; such results are not cached within the
+    read-your-writes window (see QueryCache.get_or_load).
+    """
+    return settings.DB_READ_YOUR_WRITES_SECONDS if db.info.get("replica") else 0.0
+
+
+def type_tag(document_type: str) -> str:
+    """Cache tag of everything aggregated for a document type."""
+    return f"type:{document_type}"
+
+
+def month_tag(year: int, month: int) -> str:
+    """Cache tag of everything aggregated for a calendar month."""
+    return f"month:{year}-{month:02d}"
+
+
+# Bucket sizes accepted by the timeseries endpoint (date_trunc field names)
+GRANULARITIES = ("day", "week", "month", "quarter", "year")
+
+
+def parse_amount(value: Any) -> Decimal:
+    """
+    Parse a dynamic total_price value, treating malformed values as zero.
+
+    Mirrors the documents.total_price generated column, so incremental
+    stats agree with aggregates computed in SQL.
+    """
+    if value is None or isinstance(value, bool):
+        return Decimal(0)
+    text = str(value)
+    if not _AMOUNT_RE.match(text):
+        return Decimal(0)
+    try:
+        return Decimal(text.strip())
+    except InvalidOperation:
+        return Decimal(0)
+
+
+def normalize_currency(value: Any) -> str:
+    """Normalize a dynamic currency value like the documents.currency column."""
+    if value is None:
+        return NO_CURRENCY
+    return str(value).strip(" ").upper()[:10] or NO_CURRENCY
+
+
+def single_currency_total(totals: Dict[str, float]) -> Optional[float]:
+    """Return the grand total only when it does not mix currencies."""
+    if len(totals) > 1:
+        return None
+    return next(iter(totals.values()), 0.0)
+
+
+def truncate_date(granularity: str, column: Any) -> Any:
+    """
+    date_trunc() with the field inlined, so SELECT and GROUP BY match.
+
+    The granularity must already be validated against GRANULARITIES.
+    """
+    return func.date_trunc(literal_column(f"'{granularity}'"), column)
+
+
+# Amount measures over total_price, by name
+AMOUNT_MEASURES = {
+    "sum": func.sum,
+    "avg": func.avg,
+    "min": func.min,
+    "max": func.max,
+}
+PERCENTILES = {"p50": 0.5, "p90": 0.9, "p95": 0.95, "p99": 0.99}
+MEASURES = ("count", *AMOUNT_MEASURES, *PERCENTILES)
+
+# Prefix of group_by dimensions that read a dynamic_fields key
+FIELD_PREFIX = "field:"
+
+
+def currency_expression() -> Any:
+    """Currency grouping key with missing currencies mapped to NO_CURRENCY."""
+    return func.coalesce(Document.currency, NO_CURRENCY)
+
 
 class StatsService:
     """Service for handling document statistics operations."""
 
     @staticmethod
-    async def get_total_amount_by_type(db: AsyncSession, document_type: str) -> float:
-        """Get total amount for a specific document type from dynamic_fields."""
+    @timed()
+    async def get_totals_by_currency(
+        db: AsyncSession, document_type: str
+    ) -> Dict[str, float]:
+        """
+        Get total amounts for a document type, one per currency.
+
+        Served from the (document_type, currency, total_price) index and
+        cached until a document of this type changes.
+        """
+        return await stats_cache.get_or_load(
+            f"totals:{document_type}",
+            lambda: StatsService._load_totals_by_currency(db, document_type),
+            tags=[type_tag(document_type)],
+            settle=replica_settle(db),
+        )
+
+    @staticmethod
+    async def _load_totals_by_currency(
+        db: AsyncSession, document_type: str
+    ) -> Dict[str, float]:
+        currency = currency_expression()
         result = await db.execute(
-            select(
-                func.sum(
-                    func.cast(
-                        Document.dynamic_fields["total_price"].astext, func.Numeric
-                    )
-                )
-            ).where(Document.document_type == document_type)
+            select(currency, func.sum(Document.total_price))
+            .where(
+                Document.document_type == document_type,
+                Document.total_price.is_not(None),
+            )
+            .group_by(currency)
+        )
+        totals = {row[0]: float(row[1]) for row in result.fetchall()}
+        logger.info("Totals for %s: %s", document_type, totals)
+        return totals
+
+    @staticmethod
+    @timed()
+    async def get_total_amount_by_type(
+        db: AsyncSession, document_type: str, currency: Optional[str] = None
+    ) -> float:
+        """Get total amount for a document type, optionally in a single currency."""
+        return await stats_cache.get_or_load(
+            f"total:{document_type}:{currency and normalize_currency(currency)}",
+            lambda: StatsService._load_total_amount(db, document_type, currency),
+            tags=[type_tag(document_type)],
+            settle=replica_settle(db),
+        )
+
+    @staticmethod
+    async def _load_total_amount(
+        db: AsyncSession, document_type: str, currency: Optional[str]
+    ) -> float:
+        query = select(func.sum(Document.total_price)).where(
+            Document.document_type == document_type
         )
+        if currency:
+            query = query.where(
+                currency_expression() == normalize_currency(currency)
+            )
+        result = await db.execute(query)
         total = result.scalar() or 0
-        logger.info("Total amount for %s: %f", document_type, total)
+        logger.info("Total amount for %s (%s): %f", document_type, currency, total)
         return float(total)
 
     @staticmethod
+    @timed()
     async def get_monthly_stats(
         db: AsyncSession, year: int, month: int
     ) -> Dict[str, Any]:
         """
         Get monthly statistics for all documents.
 
+        Reads the pre-aggregated document_monthly_stats rows for the month
+        instead of scanning documents, cached until a document of the month
+        changes.
+
         Args:
             db: Database session
             year: Year to get stats for
@@ -46,40 +223,454 @@ class StatsService:
         Returns:
             Dictionary with monthly statistics
         """
-        logger.debug("Fetching monthly stats for %d-%d", year, month)
-        # Count documents by type
-        query = (
-            select(Document.document_type, func.count(Document.id).label("count"))
-            .where(
-                extract("year", Document.created_date) == year,
-                extract("month", Document.created_date) == month,
-            )
-            .group_by(Document.document_type)
+        return await stats_cache.get_or_load(
+            f"monthly:{year}:{month}",
+            lambda: StatsService._load_monthly_stats(db, year, month),
+            tags=[month_tag(year, month), REBUILD_TAG],
+            settle=replica_settle(db),
         )
-        result = await db.execute(query)
-        doc_counts = {row[0]: row[1] for row in result.fetchall()}
 
-        # Total amount from dynamic_fields (assuming 'total_price' exists)
-        total_query = select(
-            func.sum(
-                func.cast(Document.dynamic_fields["total_price"].astext, func.Numeric)
+    @staticmethod
+    async def _load_monthly_stats(
+        db: AsyncSession, year: int, month: int
+    ) -> Dict[str, Any]:
+        logger.debug("Fetching monthly stats for %d-%d", year, month)
+        result = await db.execute(
+            select(
+                DocumentMonthlyStats.document_type,
+                DocumentMonthlyStats.currency,
+                DocumentMonthlyStats.document_count,
+                DocumentMonthlyStats.total_amount,
+            ).where(
+                DocumentMonthlyStats.year == year,
+                DocumentMonthlyStats.month == month,
+                DocumentMonthlyStats.document_count > 0,
             )
-        ).where(
-            extract("year", Document.created_date) == year,
-            extract("month", Document.created_date) == month,
         )
-        total_result = await db.execute(total_query)
-        total_amount = float(total_result.scalar() or 0)
-
+        doc_counts: Dict[str, int] = {}
+        totals: Dict[str, Decimal] = {}
+        for document_type, currency, count, amount in result.fetchall():
+            doc_counts[document_type] = doc_counts.get(document_type, 0) + count
+            totals[currency] = totals.get(currency, Decimal(0)) + amount
+        totals_by_currency = {key: float(value) for key, value in totals.items()}
         stats = {
             "year": year,
             "month": month,
             "document_counts": doc_counts,
-            "total_amount": total_amount,
+            "totals_by_currency": totals_by_currency,
+            "total_amount": single_currency_total(totals_by_currency),
         }
         logger.info("Monthly stats retrieved: %s", stats)
         return stats
 
+    @staticmethod
+    @timed()
+    async def get_range_stats(
+        db: AsyncSession,
+        start: date,
+        end: date,
+        document_type: Optional[str] = None,
+    ) -> Dict[str, Dict[str, Any]]:
+        """
+        Count and sum documents per type over a half-open date range.
+
+        Both measures come from one grouped query, and the plain
+        `created_date >= start AND created_date < end` predicate can use the
+        created_date index.
+
+        Returns:
+            Mapping of document type to {"count": int, "totals_by_currency": dict}
+        """
+        currency = currency_expression()
+        query = (
+            select(
+                Document.document_type,
+                currency,
+                func.count(Document.id),
+                func.coalesce(func.sum(Document.total_price), 0),
+            )
+            .where(Document.created_date >= start, Document.created_date < end)
+            .group_by(Document.document_type, currency)
+        )
+        if document_type:
+            query = query.where(Document.document_type == document_type)
+        result = await db.execute(query)
+        stats: Dict[str, Dict[str, Any]] = {}
+        for doc_type, doc_currency, count, amount in result.fetchall():
+            entry = stats.setdefault(doc_type, {"count": 0, "totals_by_currency": {}})
+            entry["count"] += count
+            entry["totals_by_currency"][doc_currency] = float(amount)
+        return stats
+
+    @staticmethod
+    @timed()
+    async def get_timeseries(
+        db: AsyncSession,
+        start: date,
+        end: date,
+        granularity: str = "month",
+        document_type: Optional[str] = None,
+    ) -> List[Dict[str, Any]]:
+        """
+        Get per-type counts and totals bucketed by day, week, month, quarter or year.
+
+        Args:
+            db: Database session
+            start: First day of the range (inclusive)
+            end: Day after the range (exclusive)
+            granularity: Bucket size, one of GRANULARITIES
+            document_type: Optional document type filter
+
+        Returns:
+            List of buckets ordered by period start
+        """
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unsupported granularity: {granularity}")
+        if end <= start:
+            raise ValueError("end must be after start")
+        logger.debug(
+            "Fetching %s timeseries for %s..%s (type=%s)",
+            granularity,
+            start,
+            end,
+            document_type,
+        )
+        bucket = cast(truncate_date(granularity, Document.created_date), Date)
+        currency = currency_expression()
+        query = (
+            select(
+                bucket.label("period_start"),
+                Document.document_type,
+                currency,
+                func.count(Document.id),
+                func.coalesce(func.sum(Document.total_price), 0),
+            )
+            .where(Document.created_date >= start, Document.created_date < end)
+            .group_by(bucket, Document.document_type, currency)
+            .order_by(bucket)
+        )
+        if document_type:
+            query = query.where(Document.document_type == document_type)
+        result = await db.execute(query)
+
+        series: Dict[date, Dict[str, Any]] = {}
+        for period_start, doc_type, doc_currency, count, amount in result.fetchall():
+            point = series.setdefault(
+                period_start,
+                {
+                    "period_start": period_start,
+                    "document_counts": {},
+                    "totals_by_currency": {},
+                    "document_count": 0,
+                },
+            )
+            counts = point["document_counts"]
+            totals = point["totals_by_currency"]
+            counts[doc_type] = counts.get(doc_type, 0) + count
+            totals[doc_currency] = totals.get(doc_currency, 0.0) + float(amount)
+            point["document_count"] += count
+        for point in series.values():
+            point["total_amount"] = single_currency_total(point["totals_by_currency"])
+        logger.info("Timeseries retrieved: %d %s buckets", len(series), granularity)
+        return list(series.values())
+
+    @staticmethod
+    @timed()
+    async def aggregate(
+        db: AsyncSession,
+        group_by: List[str],
+        measures: List[str],
+        start: Optional[date] = None,
+        end: Optional[date] = None,
+        granularity: Optional[str] = None,
+        document_type: Optional[str] = None,
+        currency: Optional[str] = None,
+        limit: Optional[int] = None,
+    ) -> Dict[str, Any]:
+        """
+        Group documents by arbitrary dimensions and compute measures in one query.
+
+        Dimensions are "document_type", "currency", "period" (bucketed by
+        granularity) and "field:<key>" for allow-listed dynamic_fields keys.
+        Measures are "count", "sum", "avg", "min", "max" and "p50"/"p90"/
+        "p95"/"p99" over total_price. Amounts are never mixed across
+        currencies: amount measures without a currency filter add the
+        currency dimension automatically.
+
+        The query runs under STATS_STATEMENT_TIMEOUT_MS and returns at most
+        STATS_AGGREGATE_MAX_ROWS rows.
+
+        Raises:
+            ValueError: On unknown or disallowed dimensions and measures
+        """
+        if not measures:
+            raise ValueError("At least one measure is required")
+        unknown = [measure for measure in measures if measure not in MEASURES]
+        if unknown:
+            raise ValueError(f"Unknown measures: {', '.join(unknown)}")
+        dimensions = list(dict.fromkeys(group_by))
+        if (
+            any(measure != "count" for measure in measures)
+            and not currency
+            and "currency" not in dimensions
+            and f"{FIELD_PREFIX}currency" not in dimensions
+        ):
+            dimensions.append("currency")
+
+        columns = []
+        for index, dimension in enumerate(dimensions):
+            columns.append(
+                StatsService._dimension_column(dimension, granularity).label(
+                    f"d{index}"
+                )
+            )
+        group_columns = list(columns)
+        for index, measure in enumerate(measures):
+            columns.append(StatsService._measure_column(measure).label(f"m{index}"))
+
+        max_rows = settings.STATS_AGGREGATE_MAX_ROWS
+        row_limit = min(limit or max_rows, max_rows)
+        query = select(*columns)
+        if start:
+            query = query.where(Document.created_date >= start)
+        if end:
+            query = query.where(Document.created_date < end)
+        if document_type:
+            query = query.where(Document.document_type == document_type)
+        if currency:
+            query = query.where(currency_expression() == normalize_currency(currency))
+        if group_columns:
+            query = query.group_by(*group_columns).order_by(*group_columns)
+        # One extra row tells whether the result was truncated
+        query = query.limit(row_limit + 1)
+
+        logger.debug(
+            "Aggregating documents: group_by=%s, measures=%s", dimensions, measures
+        )
+        timeout_ms = int(settings.STATS_STATEMENT_TIMEOUT_MS)
+        await db.execute(text(f"SET LOCAL statement_timeout = {timeout_ms}"))
+        result = await db.execute(query)
+        raw_rows = result.fetchall()
+        # Reset in the caller's transaction so its later statements run under
+        # the default timeout. A failed query aborts the transaction instead,
+        # and the rollback that follows discards the SET LOCAL with it.
+        await db.execute(text("SET LOCAL statement_timeout TO DEFAULT"))
+
+        rows = []
+        for raw in raw_rows[:row_limit]:
+            row: Dict[str, Any] = {}
+            for index, dimension in enumerate(dimensions):
+                row[dimension] = raw[index]
+            for index, measure in enumerate(measures):
+                value = raw[len(dimensions) + index]
+                row[measure] = (
+                    value if measure == "count" or value is None else float(value)
+                )
+            rows.append(row)
+        logger.info("Aggregate returned %d rows", len(rows))
+        return {
+            "dimensions": dimensions,
+            "measures": measures,
+            "rows": rows,
+            "truncated": len(raw_rows) > row_limit,
+        }
+
+    @staticmethod
+    def _dimension_column(dimension: str, granularity: Optional[str]) -> Any:
+        """Compile a group_by dimension into a SQL expression."""
+        if dimension == "document_type":
+            return Document.document_type
+        if dimension == "currency":
+            return currency_expression()
+        if dimension == "period":
+            if granularity not in GRANULARITIES:
+                raise ValueError(
+                    f"The period dimension needs a granularity: {', '.join(GRANULARITIES)}"
+                )
+            return cast(truncate_date(granularity, Document.created_date), Date)
+        if dimension.startswith(FIELD_PREFIX):
+            key = dimension[len(FIELD_PREFIX) :]
+            if key not in settings.STATS_AGGREGATE_KEYS:
+                raise ValueError(f"Dynamic field is not allowed for grouping: {key}")
+            return Document.dynamic_fields[key].as_string()
+        raise ValueError(f"Unknown dimension: {dimension}")
+
+    @staticmethod
+    def _measure_column(measure: str) -> Any:
+        """Compile a measure name into an aggregate SQL expression."""
+        if measure == "count":
+            return func.count(Document.id)
+        if measure in PERCENTILES:
+            return func.percentile_cont(PERCENTILES[measure]).within_group(
+                Document.total_price
+            )
+        return AMOUNT_MEASURES[measure](Document.total_price)
+
+    @staticmethod
+    async def apply_delta(
+        db: AsyncSession,
+        document_type: str,
+        currency: str,
+        created_date: date,
+        count_delta: int,
+        amount_delta: Decimal,
+    ) -> None:
+        """Add a count/amount delta to a monthly bucket, creating it if needed."""
+        table = DocumentMonthlyStats.__table__
+        stmt = insert(table).values(
+            year=created_date.year,
+            month=created_date.month,
+            document_type=document_type,
+            currency=currency,
+            document_count=count_delta,
+            total_amount=amount_delta,
+        )
+        stmt = stmt.on_conflict_do_update(
+            constraint="uq_monthly_stats_bucket",
+            set_={
+                "document_count": table.c.document_count
+                + stmt.excluded.document_count,
+                "total_amount": table.c.total_amount + stmt.excluded.total_amount,
+                "updated_at": func.now(),
+            },
+        )
+        await db.execute(stmt)
+
+    @classmethod
+    @timed()
+    async def record_change(
+        cls,
+        db: AsyncSession,
+        before: Optional[DocumentSnapshot] = None,
+        after: Optional[DocumentSnapshot] = None,
+    ) -> None:
+        """
+        Update monthly buckets for a document create, update or delete.
+
+        Must run in the same transaction as the document write so the
+        aggregates never drift from the documents table.
+
+        Args:
+            db: Database session
+            before: Snapshot of the document before the change (None on create)
+            after: Snapshot of the document after the change (None on delete)
+        """
+        await cls._apply_snapshots(db, ((before, -1), (after, 1)))
+
+    @classmethod
+    async def _apply_snapshots(
+        cls,
+        db: AsyncSession,
+        signed: Iterable[Tuple[Optional[DocumentSnapshot], int]],
+    ) -> None:
+        """
+        Add signed snapshots to their monthly buckets.
+
+        Deltas are summed per bucket first, so each touched bucket gets one
+        upsert however many snapshots fall into it.
+        """
+        deltas: Dict[Tuple[str, str, int, int], List[Any]] = {}
+        for snapshot, sign in signed:
+            if snapshot is None:
+                continue
+            document_type, created_date, total_price, currency = snapshot
+            key = (
+                document_type,
+                normalize_currency(currency),
+                created_date.year,
+                created_date.month,
+            )
+            bucket = deltas.setdefault(key, [0, Decimal(0)])
+            bucket[0] += sign
+            bucket[1] += sign * parse_amount(total_price)
+        for (document_type, currency, year, month), (count, amount) in deltas.items():
+            if count == 0 and amount == 0:
+                continue
+            await cls.apply_delta(
+                db, document_type, currency, date(year, month, 1), count, amount
+            )
+
+    @staticmethod
+    async def invalidate(snapshots: Iterable[Optional[DocumentSnapshot]]) -> None:
+        """
+        Invalidate cached stats touched by changed documents.
+
+        Call after the write is committed, so no reader can cache the
+        pre-commit state under the new tag versions.
+        """
+        tags = set()
+        for snapshot in snapshots:
+            if snapshot is None:
+                continue
+            document_type, created_date = snapshot[0], snapshot[1]
+            tags.add(type_tag(document_type))
+            tags.add(month_tag(created_date.year, created_date.month))
+        await stats_cache.invalidate_tags(tags)
+
+    @classmethod
+    @timed()
+    async def record_bulk_removal(
+        cls, db: AsyncSession, snapshots: Iterable[DocumentSnapshot]
+    ) -> None:
+        """Subtract several removed documents, e.g. a deleted subtree."""
+        await cls._apply_snapshots(db, ((snapshot, -1) for snapshot in snapshots))
+
+    @staticmethod
+    @timed()
+    async def refresh_monthly_stats(
+        db: AsyncSession, year: Optional[int] = None, month: Optional[int] = None
+    ) -> None:
+        """
+        Rebuild monthly buckets from the documents table.
+
+        Rebuilds a single month when year and month are given, otherwise all
+        buckets. Used for backfills and to repair drift after manual edits.
+        """
+        period = truncate_date("month", Document.created_date)
+        currency = currency_expression()
+        source = select(
+            extract("year", period),
+            extract("month", period),
+            Document.document_type,
+            currency,
+            func.count(Document.id),
+            func.coalesce(func.sum(Document.total_price), 0),
+            func.now(),
+            func.now(),
+        ).group_by(period, Document.document_type, currency)
+        cleanup = delete(DocumentMonthlyStats)
+        if year is not None and month is not None:
+            start = date(year, month, 1)
+            end = date(year + month // 12, month % 12 + 1, 1)
+            source = source.where(
+                Document.created_date >= start, Document.created_date < end
+            )
+            cleanup = cleanup.where(
+                DocumentMonthlyStats.year == year, DocumentMonthlyStats.month == month
+            )
+        await db.execute(cleanup)
+        await db.execute(
+            insert(DocumentMonthlyStats).from_select(
+                [
+                    "year",
+                    "month",
+                    "document_type",
+                    "currency",
+                    "document_count",
+                    "total_amount",
+                    "created_at",
+                    "updated_at",
+                ],
+                source,
+            )
+        )
+        await db.commit()
+        if year is not None and month is not None:
+            await stats_cache.invalidate_tags([month_tag(year, month)])
+        else:
+            await stats_cache.invalidate_tags([REBUILD_TAG])
+        logger.info("Monthly stats refreshed (year=%s, month=%s)", year, month)
+
 
 # Create service instance
 stats_service = StatsService()
@@ -90,5 +681,7 @@ async def get_monthly_stats(db: AsyncSession, year: int, month: int) -> Dict[str
     return await stats_service.get_monthly_stats(db, year, month)
 
 
-async def get_total_amount_by_type(db: AsyncSession, document_type: str) -> float:
-    return await stats_service.get_total_amount_by_type(db, document_type)
+async def get_total_amount_by_type(
+    db: AsyncSession, document_type: str, currency: Optional[str] = None
+) -> float:
+    return await stats_service.get_total_amount_by_type(db, document_type, currency)
@@ -12,6 +12,7 @@ from fastapi import HTTPException, UploadFile
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select
 
+from app.core.profiler import io_span, timed
 from app.models.template import Template
 from app.services.field_extractor import extract_dynamic_fields
 
@@ -51,21 +52,27 @@ class TemplateManager:
     UPLOAD_DIR = "app/assets/templates"
 
     @staticmethod
+    @timed()
     async def read_json(file_path: Path, default: Optional[Dict] = None) -> Dict:
         if not file_path.exists():
             return default or {}
         try:
-            async with aiofiles.open(file_path, "r", encoding="utf-8") as f:
-                return json.loads(await f.read())
+            with io_span():
+                async with aiofiles.open(file_path, "r", encoding="utf-8") as f:
+                    content = await f.read()
+            return json.loads(content)
         except Exception as e:
             logger.error("Ошибка чтения JSON %s: %s", file_path, str(e))
             return default or {}
 
     @staticmethod
+    @timed()
     async def write_json(file_path: Path, data: Dict) -> None:
         try:
-            async with aiofiles.open(file_path, "w", encoding="utf-8") as f:
-                await f.write(json.dumps(data, ensure_ascii=False, indent=4))
+            content = json.dumps(data, ensure_ascii=False, indent=4)
+            with io_span():
+                async with aiofiles.open(file_path, "w", encoding="utf-8") as f:
+                    await f.write(content)
         except Exception as e:
             logger.error("Ошибка записи JSON %s: %s", file_path, str(e))
             raise HTTPException(status_code=500, detail="Ошибка сохранения данных")
@@ -102,6 +109,7 @@ class TemplateManager:
         return {"fields": fields}
 
     @classmethod
+    @timed()
     async def list_templates(cls, db: AsyncSession) -> List[Dict[str, Any]]:
         try:
             result = await db.execute(
@@ -126,6 +134,7 @@ class TemplateManager:
             raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
     @staticmethod
+    @timed()
     async def initialize_templates_for_user(user_id: int, db: AsyncSession) -> None:
         for tpl in REQUIRED_TEMPLATES:
             file_path = TEMPLATES_DIR / f"{tpl}.docx"
@@ -139,15 +148,15 @@ class TemplateManager:
             db.add(template_record)
             logger.info("Добавлен шаблон %s для пользователя %d", tpl, user_id)
         try:
-            await db.commit()
+            await db.flush()
         except Exception as e:
-            await db.rollback()
             logger.error(
                 "Ошибка инициализации шаблонов для пользователя %d: %s", user_id, str(e)
             )
             raise HTTPException(status_code=500, detail="Ошибка инициализации шаблонов")
 
     @classmethod
+    @timed()
     async def delete_template(cls, db: AsyncSession, template_id: int) -> None:
         try:
             logger.debug("Attempting to delete template: %d", template_id)
@@ -164,14 +173,14 @@ class TemplateManager:
                 except Exception as e:
                     logger.warning("Failed to delete template file: %s", str(e))
             await db.delete(template)
-            await db.commit()
+            await db.flush()
             logger.info("Successfully deleted template: %d", template_id)
         except Exception as e:
-            await db.rollback()
             logger.error("Failed to delete template: %s", str(e))
             raise
 
     @classmethod
+    @timed()
     async def create_template(
         cls, db: AsyncSession, template_data: Dict[str, Any]
     ) -> Template:
@@ -195,7 +204,7 @@ class TemplateManager:
                 user_id=template_data.get("user_id"),
             )
             db.add(new_template)
-            await db.commit()
+            await db.flush()
             await db.refresh(new_template)
             logger.info(
                 "Created template: %s (ID: %d)",
@@ -204,11 +213,11 @@ class TemplateManager:
             )
             return new_template
         except Exception as e:
-            await db.rollback()
             logger.error("Failed to create template: %s", str(e))
             raise
 
     @classmethod
+    @timed()
     async def _save_template_file(cls, file: UploadFile) -> str:
         try:
             logger.debug("Starting file save for: %s", file.filename)
@@ -220,10 +229,11 @@ class TemplateManager:
                 file.size if hasattr(file, "size") else -1,
                 file.content_type,
             )
-            content = await file.read()
-            logger.debug("Read %d bytes from uploaded file", len(content))
-            async with aiofiles.open(file_path, "wb") as f:
-                await f.write(content)
+            with io_span():
+                content = await file.read()
+                logger.debug("Read %d bytes from uploaded file", len(content))
+                async with aiofiles.open(file_path, "wb") as f:
+                    await f.write(content)
             logger.info("Successfully saved file to: %s", file_path)
             return str(file_path)
         except Exception as e:
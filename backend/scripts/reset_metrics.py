@@ -0,0 +1,31 @@
+"""
+Empty the multiprocess metrics directory before the server starts.
+
+Worker processes write their metric values to files in
+METRICS_MULTIPROC_DIR (or PROMETHEUS_MULTIPROC_DIR). Files of a previous
+run would be merged into the new run's totals, so start.sh runs this
+before uvicorn forks its workers. Does nothing when multiprocess metrics
+are not configured.
+
+Usage (from backend/, with no worker running):
+    python scripts/reset_metrics.py
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.core.metrics import registry  # noqa: E402
+
+
+def main() -> None:
+    if not registry.store.multiprocess:
+        print("Multiprocess metrics are not configured, nothing to reset")
+        return
+    removed = registry.store.reset()
+    print(f"Removed {removed} metrics files from {registry.store.directory}")
+
+
+if __name__ == "__main__":
+    main()
@@ -21,6 +21,10 @@ soffice --headless --accept='socket,host=localhost,port=8100;urp;' --nologo --no
 # Wait for LibreOffice to be ready
 sleep 2
 
+# Drop metrics of the previous run before uvicorn starts its workers
+log "Resetting multiprocess metrics..."
+python scripts/reset_metrics.py
+
 # Start uvicorn
 log "Starting FastAPI application..."
 exec uvicorn app.main:app --host 0.0.0.0 --port 8000 --reload
\ No newline at end of file
@@ -0,0 +1,103 @@
+"""
+Tests of the SQL compiled by StatsService.aggregate and the bucket upserts.
+"""
+
+import asyncio
+from datetime import date
+from typing import Any, List
+
+import pytest
+from sqlalchemy.dialects import postgresql
+
+from app.services.stats_service import StatsService
+
+
+class RecordingSession:
+    """Session double recording the statements it is asked to execute."""
+
+    def __init__(self, rows: List[Any]):
+        self.rows = rows
+        self.statements: List[Any] = []
+
+    async def execute(self, statement: Any) -> "RecordingSession":
+        self.statements.append(statement)
+        return self
+
+    def fetchall(self) -> List[Any]:
+        return self.rows
+
+
+def compile_sql(statement: Any) -> str:
+    return str(
+        statement.compile(
+            dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}
+        )
+    )
+
+
+def test_field_dimension_compiles_to_text_lookup():
+    column = StatsService._dimension_column("field:buyer", None)
+
+    assert compile_sql(column) == (
+        "CAST(documents.dynamic_fields ->> 'buyer' AS VARCHAR)"
+    )
+
+
+def test_aggregate_groups_by_field_dimension():
+    db = RecordingSession([("ACME", 3), ("Globex", 1)])
+
+    result = asyncio.run(
+        StatsService.aggregate(db, group_by=["field:buyer"], measures=["count"])
+    )
+
+    sql = compile_sql(db.statements[1])
+    lookup = "CAST(documents.dynamic_fields ->> 'buyer' AS VARCHAR)"
+    assert f"SELECT {lookup} AS d0" in sql
+    assert f"GROUP BY {lookup}" in sql
+    assert result["rows"] == [
+        {"field:buyer": "ACME", "count": 3},
+        {"field:buyer": "Globex", "count": 1},
+    ]
+    assert result["truncated"] is False
+
+
+def test_aggregate_resets_statement_timeout_without_commit():
+    db = RecordingSession([(2,)])
+
+    asyncio.run(StatsService.aggregate(db, group_by=[], measures=["count"]))
+
+    sql = [compile_sql(statement) for statement in db.statements]
+    assert sql[0].startswith("SET LOCAL statement_timeout = ")
+    assert sql[-1] == "SET LOCAL statement_timeout TO DEFAULT"
+
+
+def test_field_dimension_outside_allow_list_is_rejected():
+    with pytest.raises(ValueError):
+        StatsService._dimension_column("field:password", None)
+
+
+def test_bulk_removal_upserts_each_bucket_once():
+    db = RecordingSession([])
+    snapshots = [
+        ("invoice", date(2024, 3, 5), "10.50", "usd"),
+        ("invoice", date(2024, 3, 20), "4.50", "USD"),
+        ("invoice", date(2024, 4, 1), "7", "USD"),
+        ("contract", date(2024, 3, 9), "100", "EUR"),
+    ]
+
+    asyncio.run(StatsService.record_bulk_removal(db, snapshots))
+
+    params = [statement.compile().params for statement in db.statements]
+    buckets = {
+        (p["document_type"], p["currency"], p["year"], p["month"]): (
+            p["document_count"],
+            p["total_amount"],
+        )
+        for p in params
+    }
+    assert len(params) == 3
+    assert buckets == {
+        ("invoice", "USD", 2024, 3): (-2, -15),
+        ("invoice", "USD", 2024, 4): (-1, -7),
+        ("contract", "EUR", 2024, 3): (-1, -100),
+    }